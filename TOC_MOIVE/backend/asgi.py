@@ -0,0 +1,84 @@
+"""
+ASGI variant of the API: uvicorn asgi:app --port 8000
+
+Same routes and payloads as main.py. /movies/<id> is served natively so a movie
+whose details still have to be crawled is awaited instead of holding a worker
+thread for the whole IMDb round trip. The fetch itself is the crawler's, queued
+on its scheduler like the Flask route's: requests for the same movie, from either
+app or from the background crawl, share one download and one negative-cache
+entry. Every other route is the Flask app itself, mounted through a2wsgi and run
+in its thread pool; those are in-memory lookups anyway.
+"""
+import asyncio
+import contextlib
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.convertors import Convertor, register_url_convertor
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+from formatters import render_detail_doc
+from json_provider import dumps_bytes
+from main import app as flask_app, get_crawler, DETAIL_TIMEOUT
+from crawl_scheduler import INTERACTIVE
+
+
+class ImdbIdConvertor(Convertor):
+    # only tt1234567 goes to the native route, /movies/trending etc. fall through to flask
+    regex = r"tt\d+"
+
+    def convert(self, value: str) -> str:
+        return value
+
+    def to_string(self, value: str) -> str:
+        return value
+
+
+register_url_convertor("imdb_id", ImdbIdConvertor())
+
+def json_response(body: bytes, status_code: int = 200) -> Response:
+    return Response(body, status_code=status_code, media_type="application/json",
+                    headers={"Access-Control-Allow-Origin": "*"})  # flask_cors default
+
+
+async def get_movie(request):
+    crawler = get_crawler()
+    data = crawler.snapshot()
+    movie_id = request.path_params["movie_id"]
+
+    doc = data.detail_docs.get(movie_id)
+    if doc is not None:
+        return json_response(doc)
+
+    movie = data.movies_dict.get(movie_id)
+    if not movie:
+        return json_response(dumps_bytes({"error": "Movie not found"}), 404)
+
+    if not movie.get("details_fetched"):
+        # front of the crawl queue, shares a fetch already in flight for this id
+        future = asyncio.wrap_future(crawler.request_details(movie, INTERACTIVE))
+        try:
+            # shield: a client hanging up (or timing out) must not cancel the fetch others wait for
+            movie = await asyncio.wait_for(asyncio.shield(future), DETAIL_TIMEOUT)
+        except Exception as e:
+            print(f"Detail fetch for {movie_id} failed: {e!r}")
+
+    # fetch failed: render this once without caching it, a later request retries the fetch
+    doc = crawler.snapshot().detail_docs.get(movie_id) or render_detail_doc(movie)
+    return json_response(doc)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    await asyncio.to_thread(get_crawler)   # cold start may crawl, don't block the loop
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/movies/{movie_id:imdb_id}", get_movie),
+        Mount("/", WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
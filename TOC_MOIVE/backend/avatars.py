@@ -0,0 +1,38 @@
+import hashlib
+import html
+from functools import lru_cache
+from urllib.parse import quote
+
+from image_cache import PUBLIC_BASE_URL
+
+# bump when the svg below changes, the urls are cached as immutable by browsers
+AVATAR_VERSION = "1"
+
+SVG_TEMPLATE = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="150" height="150" viewBox="0 0 150 150">'
+    '<rect width="150" height="150" fill="#333"/>'
+    '<text x="50%" y="50%" dy=".35em" text-anchor="middle" fill="#fff" '
+    'font-family="Helvetica, Arial, sans-serif" font-size="60">{initials}</text>'
+    '</svg>'
+)
+
+
+def initials(name: str) -> str:
+    """'Noel Appleby' → 'NA', 'Cher' → 'C', '' → '?'"""
+    words = [w for w in html.unescape(name or "").split() if w[0].isalnum()]
+    if not words:
+        return "?"
+    letters = words[0][0] + (words[-1][0] if len(words) > 1 else "")
+    return letters.upper()
+
+
+def avatar_url(name: str) -> str:
+    """Local replacement for the old ui-avatars.com fallback."""
+    return f"{PUBLIC_BASE_URL}/avatar/{AVATAR_VERSION}/{quote(name or '', safe='')}.svg"
+
+
+@lru_cache(maxsize=4096)
+def avatar_svg(name: str) -> tuple:
+    """(svg bytes, etag) for a cast member without a photo, rendered once per name."""
+    svg = SVG_TEMPLATE.format(initials=html.escape(initials(name))).encode("utf-8")
+    return svg, hashlib.sha1(svg).hexdigest()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Load test: Flask (main.py on one gunicorn gthread worker) vs the ASGI variant (asgi.py on one uvicorn worker)
+
+Each server runs in its own process. A few movies are marked as not fetched and
+pointed at a fake IMDb that answers after IMDB_DELAY seconds with a 404, and the
+negative cache is off (NEGATIVE_TTL = 0), so every request for them goes through
+the slow on-demand detail path, like a slow IMDb would. A 404 because a 503 would
+be retried and then trip the circuit breaker, which measures the breaker instead.
+The rest of the traffic is normal cached reads.
+
+    python bench_asgi.py [--concurrency 64] [--duration 10]
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+FAKE_IMDB_PORT = 5901
+PORTS = {"flask": 5902, "asgi": 5903}
+IMDB_DELAY = 1.0
+COLD_MOVIES = 5      # movies whose details go through the fake IMDb
+THREADS = 4          # per-worker threads, gunicorn.conf.py default
+
+HOT_PATHS = ["/movies/tt0111161", "/movies/tt0068646", "/movies/trending",
+             "/movies/suggest?q=god", "/movies?genre=Drama"]
+
+
+def serve_fake_imdb():
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class SlowAndBroken(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(IMDB_DELAY)
+            self.send_response(404)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer(("127.0.0.1", FAKE_IMDB_PORT), SlowAndBroken).serve_forever()
+
+
+def cold_ids(crawler) -> list:
+    return [m["id"] for m in crawler.movies[-COLD_MOVIES:]]
+
+
+def serve(kind: str):
+    import imdb_movie_crawler
+    from main import get_crawler
+    imdb_movie_crawler.NEGATIVE_TTL = 0   # every cold request waits on IMDb, coalesced while one is in flight
+    crawler = get_crawler(background=False)
+    data = crawler.snapshot()
+    for movie_id in cold_ids(crawler):
+        movie = dict(data.movies_dict[movie_id], details_fetched=False,
+                     url=f"http://127.0.0.1:{FAKE_IMDB_PORT}/title/{movie_id}/")
+        data = data.with_movie(movie, None)
+    crawler.publish(data)
+
+    if kind == "flask":
+        # one gunicorn gthread worker, as configured in gunicorn.conf.py
+        from gunicorn.app.base import BaseApplication
+        from main import app
+
+        class Server(BaseApplication):
+            def load_config(self):
+                self.cfg.set("bind", f"127.0.0.1:{PORTS[kind]}")
+                self.cfg.set("workers", 1)
+                self.cfg.set("worker_class", "gthread")
+                self.cfg.set("threads", THREADS)
+
+            def load(self):
+                return app
+
+        Server().run()
+    else:
+        import uvicorn
+        from asgi import app
+        uvicorn.run(app, port=PORTS[kind], log_level="warning")
+
+
+def load(port: int, paths: list, concurrency: int, duration: float) -> list:
+    """`concurrency` clients on keep-alive connections, each firing its next request as soon as the last returns."""
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    def client(offset: int):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        i = offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            conn.request("GET", paths[i % len(paths)])
+            response = conn.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+            if response.will_close:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            i += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(0, concurrency * 7, 7)))
+    return latencies
+
+
+def wait_until_up(base: str, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(base + "/", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{base} did not start")
+
+
+def bench_asgi(concurrency: int, duration: float):
+    print("\n" + "="*90)
+    print(" " * 25 + "FLASK vs ASGI LOAD TEST")
+    print("="*90 + "\n")
+
+    from imdb_movie_crawler import IMDbMovieCrawler
+    crawler = IMDbMovieCrawler()
+    crawler.load_cache()
+    cold = [f"/movies/{i}" for i in cold_ids(crawler)]
+    paths = HOT_PATHS * 9 + cold   # 5 of every 50 requests take the slow path
+
+    print(f"concurrency {concurrency}, {duration:.0f}s per server, "
+          f"{len(cold) / len(paths):.0%} of requests wait on a {IMDB_DELAY:.1f}s IMDb\n")
+    print(f"{'server':<10}{'requests':>10}{'req/s':>10}{'p50 (ms)':>12}{'p99 (ms)':>12}")
+    print("─" * 54)
+
+    me = os.path.abspath(__file__)
+    fake = subprocess.Popen([sys.executable, me, "--serve", "fake-imdb"])
+    try:
+        for kind, port in PORTS.items():
+            server = subprocess.Popen([sys.executable, me, "--serve", kind],
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                base = f"http://127.0.0.1:{port}"
+                wait_until_up(base)
+                latencies = sorted(load(port, paths, concurrency, duration))
+                p50 = latencies[len(latencies) // 2] * 1000
+                p99 = latencies[int(len(latencies) * 0.99)] * 1000
+                print(f"{kind:<10}{len(latencies):>10}{len(latencies) / duration:>10.0f}{p50:>12.1f}{p99:>12.1f}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        fake.terminate()
+
+    print("\n" + "="*90 + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--serve", choices=["flask", "asgi", "fake-imdb"])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    if args.serve == "fake-imdb":
+        serve_fake_imdb()
+    elif args.serve:
+        serve(args.serve)
+    else:
+        try:
+            bench_asgi(args.concurrency, args.duration)
+        except KeyboardInterrupt:
+            print("\n\n✓ Benchmark interrupted by user.\n")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON serialization cost per endpoint:
+Flask's default provider (stdlib json) vs FastJSONProvider (orjson when installed)
+"""
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from main import app, get_crawler, filter_movies_from_args, facet_counts
+from formatters import format_movie_brief, format_movie_detail
+from json_provider import FastJSONProvider, orjson
+
+def endpoint_payloads(crawler) -> dict:
+    """The objects each route hands to the serializer"""
+    data = crawler.snapshot()
+    with app.test_request_context("/movies") as ctx:
+        everything = filter_movies_from_args(data, ctx.request.args)
+    top10   = sorted(crawler.movies, key=lambda x: x.get("rating") or 0, reverse=True)[:10]
+    detail  = crawler.movies_dict["tt0111161"]
+    return {
+        "/movies":               [format_movie_brief(m) for m in everything],
+        "/movies?facets=1":      {"results": [format_movie_brief(m) for m in everything],
+                                  "facets": facet_counts(data, everything)},
+        "/movies/trending":      [format_movie_brief(m) for m in top10],
+        "/movies/<id>":          format_movie_detail(detail),
+        "/movies/facets":        crawler.facet_index.counts(),
+    }
+
+def time_per_call(fn, payload, repeat: int = 200) -> float:
+    fn(payload)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(payload)
+    return (time.perf_counter() - start) / repeat * 1000
+
+def bench_json():
+    print("\n" + "="*90)
+    print(" " * 25 + "JSON SERIALIZATION BENCHMARK")
+    print("="*90 + "\n")
+    print(f"orjson installed: {'yes' if orjson else 'no (FastJSONProvider falls back to stdlib)'}\n")
+
+    crawler  = get_crawler()
+    payloads = endpoint_payloads(crawler)
+
+    before = DefaultJSONProvider(Flask("before"))
+    after  = FastJSONProvider(Flask("after"))
+
+    print(f"{'endpoint':<22}{'bytes':>10}{'before (ms)':>14}{'after (ms)':>14}{'speed-up':>10}")
+    print("─" * 70)
+    for name, payload in payloads.items():
+        size = len(after.dumps_bytes(payload))
+        t_before = time_per_call(before.dumps, payload)
+        t_after  = time_per_call(after.dumps_bytes, payload)
+        print(f"{name:<22}{size:>10}{t_before:>14.3f}{t_after:>14.3f}{t_before / t_after:>9.1f}x")
+
+    print("\n" + "="*90 + "\n")
+
+if __name__ == "__main__":
+    try:
+        bench_json()
+    except KeyboardInterrupt:
+        print("\n\n✓ Benchmark interrupted by user.\n")
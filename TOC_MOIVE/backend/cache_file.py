@@ -0,0 +1,91 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+try:
+    import fcntl  # not on Windows, where writers just aren't serialized across processes
+except ImportError:
+    fcntl = None
+
+
+def payload_checksum(data: dict) -> str:
+    """sha256 over the canonical json of everything but the checksum itself."""
+    body = {k: v for k, v in data.items() if k != "checksum"}
+    canonical = json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def write_json_atomic(path: str, data: dict) -> str:
+    """Write `data` plus its checksum so `path` is always either the old file or the whole new one.
+
+    Temp file in the same directory, fsync, then rename over the target. The file
+    being replaced is kept as <path>.bak (a hard link, so `path` never goes missing
+    in between) for when the new one turns out to be bad. Returns the checksum.
+    """
+    data = dict(data, checksum=payload_checksum(data))
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"   # concurrent writers don't share one
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            try:
+                os.link(path, tmp + ".bak")
+                os.replace(tmp + ".bak", path + ".bak")
+            except OSError:
+                pass   # no hard links here, just go without the backup
+        os.replace(tmp, path)
+        _fsync_dir(os.path.dirname(os.path.abspath(path)))
+        return data["checksum"]
+    finally:
+        for leftover in (tmp, tmp + ".bak"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+@contextlib.contextmanager
+def write_lock(path: str):
+    """Exclusive lock (<path>.write.lock) around a read-compare-write of `path`, so two processes
+    (the server, a crawl.py run) can't both decide the file is theirs and overwrite each other.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".write.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_json_verified(path: str) -> Optional[dict]:
+    """The file's json if it parses and its checksum (when it has one) matches, else None."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read {path}: {e}")
+        return None
+    if "checksum" in data and data["checksum"] != payload_checksum(data):
+        print(f"Checksum mismatch in {path}")
+        return None
+    return data
+
+
+def _fsync_dir(directory: str):
+    # makes the rename itself survive a power cut; not possible everywhere (Windows)
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+# the change log shares the file with the history samples (history_store.py), every worker reads it
+CHANGES_DB = os.environ.get("HISTORY_DB", os.path.join(os.path.dirname(__file__), "history.db"))
+
+# AUTOINCREMENT: a seq is never handed out twice, even after the oldest rows are trimmed
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    seq   INTEGER PRIMARY KEY AUTOINCREMENT,
+    at    INTEGER NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes_meta (epoch TEXT NOT NULL);
+"""
+
+
+def chart_ranks(movies: List[dict]) -> Dict[str, int]:
+    """id → chart position; falls back to list order when the chart gave no rank."""
+    return {m["id"]: (m.get("rank") or pos) for pos, m in enumerate(movies, 1) if m.get("id")}
+
+
+def diff_datasets(old: List[dict], new: List[dict]) -> List[dict]:
+    """What changed between two crawls: new entrants, dropped titles, rank moves and rating changes."""
+    old_by_id = {m["id"]: m for m in old if m.get("id")}
+    new_by_id = {m["id"]: m for m in new if m.get("id")}
+    old_ranks, new_ranks = chart_ranks(old), chart_ranks(new)
+
+    events = []
+    for movie_id, m in new_by_id.items():
+        prev = old_by_id.get(movie_id)
+        if prev is None:
+            events.append({"type": "new", "id": movie_id, "title": m.get("title"),
+                           "rank": new_ranks[movie_id], "rating": m.get("rating")})
+            continue
+        if old_ranks[movie_id] != new_ranks[movie_id]:
+            events.append({"type": "rank", "id": movie_id, "title": m.get("title"),
+                           "from": old_ranks[movie_id], "to": new_ranks[movie_id]})
+        if prev.get("rating") != m.get("rating"):
+            events.append({"type": "rating", "id": movie_id, "title": m.get("title"),
+                           "from": prev.get("rating"), "to": m.get("rating")})
+
+    for movie_id, m in old_by_id.items():
+        if movie_id not in new_by_id:
+            events.append({"type": "dropped", "id": movie_id, "title": m.get("title"),
+                           "rank": old_ranks[movie_id]})
+    return events
+
+
+class ChangeLog:
+    """Bounded, append-only log of catalog changes with increasing sequence numbers.
+
+    Clients remember the last `seq` they applied and ask for what came after it.
+    When they fall further behind than the log keeps, `truncated` tells them to
+    refetch the full list instead.
+
+    With a `path` the log is a table next to the history samples, so every gunicorn
+    worker serves the same seqs and they survive a restart; only the process that
+    owns the catalog (`writer`, the crawl lock holder) appends, the others reload the
+    same changes from movies_cache.json and would log them twice. Without one it's
+    an in-memory log for a single process (tests, crawl.py). `epoch` names the log
+    a cursor belongs to: a cursor from another epoch (the file was deleted) or one
+    ahead of `latest` is `truncated` too.
+    """
+
+    def __init__(self, path: Optional[str] = None, maxlen: int = 5000, writer: bool = True):
+        self.path = path
+        self.maxlen = maxlen
+        self.writer = writer
+        self._lock = threading.Lock()   # the in-memory connection is shared by every thread
+        self._local = threading.local()
+        self._memory: Optional[sqlite3.Connection] = None
+        self._epoch: Optional[str] = None
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        # the first process to create the table names the log
+        conn.execute("INSERT INTO changes_meta (epoch) SELECT ? WHERE NOT EXISTS (SELECT 1 FROM changes_meta)",
+                     (f"{int(time.time())}-{os.getpid()}",))
+        conn.commit()
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        if self.path is None:
+            if self._memory is None:
+                self._memory = self._connect(":memory:")
+            return self._memory
+        # same as HistoryStore: one connection per thread per process, none survives a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect(self.path)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @property
+    def epoch(self) -> str:
+        if self._epoch is None:
+            with self._lock:
+                self._epoch = self._conn().execute("SELECT epoch FROM changes_meta").fetchone()[0]
+        return self._epoch
+
+    @staticmethod
+    def _latest(conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+        return row[0] if row else 0
+
+    def append(self, events: List[dict]) -> int:
+        """Record one crawl's events; returns the latest sequence number."""
+        now = int(time.time())
+        with self._lock:
+            conn = self._conn()
+            if not self.writer or not events:
+                return self._latest(conn)
+            with conn:
+                conn.executemany("INSERT INTO changes (at, event) VALUES (?, ?)",
+                                 [(now, json.dumps(event)) for event in events])
+                latest = self._latest(conn)
+                conn.execute("DELETE FROM changes WHERE seq <= ?", (latest - self.maxlen,))
+            return latest
+
+    def since(self, seq: int, limit: Optional[int] = None, epoch: Optional[str] = None) -> dict:
+        with self._lock:
+            conn = self._conn()
+            latest = self._latest(conn)
+            oldest = conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0] or latest + 1
+            rows = conn.execute(
+                "SELECT seq, at, event FROM changes WHERE seq > ? AND seq <= ? ORDER BY seq LIMIT ?",
+                (seq, latest, limit if limit is not None else -1)).fetchall()
+        changes = [{**json.loads(event), "seq": n, "at": at} for n, at, event in rows]
+        # events between `seq` and the oldest one we still have were dropped, or
+        # the cursor is from another log and means nothing here
+        foreign = seq > latest or (epoch is not None and epoch != self.epoch)
+        return {
+            "latest":    latest,
+            "epoch":     self.epoch,
+            "changes":   [] if foreign else changes,
+            "truncated": foreign or seq < oldest - 1,
+        }
@@ -0,0 +1,57 @@
+import random
+import threading
+import time
+
+
+class CircuitBreaker:
+    """Stops calling a host that keeps failing.
+
+    Closed: requests go through. After `threshold` failures in a row it opens and
+    every request fails fast for `cooldown` seconds. Then one trial request is let
+    through (half-open): a success closes it again, a failure opens it for another
+    cooldown. One slow IMDb then costs a few timeouts instead of one per movie.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0          # in a row
+        self.opened_at = None
+        self._trial = False        # a half-open probe is out
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.time() - self.opened_at < self.cooldown else "half-open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.time() - self.opened_at < self.cooldown or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.time()
+
+    def status(self) -> dict:
+        return {"state": self.state, "failures": self.failures}
+
+
+def backoff(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Full-jitter exponential backoff: a random wait up to base * 2**attempt, so retrying threads spread out."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Non-interactive crawl tool, for warming the caches from a deploy pipeline or cron
+
+    python crawl.py chart [--charts top,popular] [--no-images]   re-crawl the chart list(s), keep cached details
+    python crawl.py details [--stale 86400] [--ids tt0111161,tt0068646]
+                            [--concurrency 10] [--rate 5] [--checkpoint crawl.ckpt]
+                            [--deadline 600] [--no-images]
+    python crawl.py export [--since N] [--gzip] [-o movies.ndjson]
+    python crawl.py bench [--pages 20] [--concurrency 10] [--rate 5]
+
+Progress goes to stderr, one json object per line with --progress json (the
+default when stderr isn't a terminal). A details run appends every finished
+movie to the checkpoint file, so re-running the same command after a crash or
+Ctrl-C picks up where it stopped. With --deadline it stops after that many
+seconds, saves what it fetched and exits with 75 (EX_TEMPFAIL), so the
+scheduler can simply run it again for the rest. chart and details also store the
+posters / cast photos of what they crawled in the image cache, so /img never
+fetches them cold (--no-images skips that).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from imdb_movie_crawler import CHARTS, IMDbMovieCrawler
+from crawl_scheduler import BACKGROUND
+from dataset import Dataset
+from image_cache import images
+
+
+class Progress:
+    """Progress lines on stderr: json objects for pipelines, a plain line for people."""
+
+    def __init__(self, mode: str, total: int = 0):
+        self.json = mode == "json" or (mode == "auto" and not sys.stderr.isatty())
+        self.total = total
+        self.done = self.failed = 0
+        self.started = time.time()
+
+    def emit(self, event: str, **fields):
+        if self.json:
+            print(json.dumps({"event": event, "t": round(time.time(), 3), **fields}), file=sys.stderr, flush=True)
+        else:
+            print(f"[{event}] " + " ".join(f"{k}={v}" for k, v in fields.items()), file=sys.stderr, flush=True)
+
+    def step(self, ok: bool, **fields):
+        self.done += 1
+        self.failed += 0 if ok else 1
+        elapsed = time.time() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else None
+        self.emit("progress", done=self.done, total=self.total, failed=self.failed,
+                  rate=round(rate, 2), eta=round(eta, 1) if eta is not None else None, **fields)
+
+
+def load_crawler(args) -> IMDbMovieCrawler:
+    crawler = IMDbMovieCrawler()
+    crawler.min_interval = 1.0 / args.rate if getattr(args, "rate", 0) else 0.0
+    crawler.load_cache()
+    return crawler
+
+
+def read_checkpoint(path: str) -> dict:
+    """id -> finished movie record from an earlier, interrupted run; a torn last line is ignored."""
+    done = {}
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            done[entry["id"]] = entry["movie"]
+    return done
+
+
+def prefetch_images(args, movies: list, progress: Progress):
+    """Posters / headshots of the records this run crawled, already cached ones are skipped."""
+    if args.no_images or not movies:
+        return
+    progress.emit("images", movies=len(movies), stored=images.prefetch_movies(movies))
+
+
+def cmd_chart(args) -> int:
+    crawler = load_crawler(args)
+    old = crawler.snapshot()
+    fresh = IMDbMovieCrawler()
+    fresh.generation = crawler.generation   # stamps above the cache's, or export --since misses them
+    fresh.min_interval = crawler.min_interval
+    names = args.charts.split(",")
+    unknown = [n for n in names if n not in CHARTS]
+    if unknown:
+        print(f"Unknown chart(s) {', '.join(unknown)}, pick from {', '.join(CHARTS)}", file=sys.stderr)
+        return 2
+    if not fresh.fetch_top_movies(use_cache=False, charts=names):
+        print("Could not fetch the chart", file=sys.stderr)
+        return 1
+
+    # new chart positions / ratings on top of the details we already have; `rank` is the primary
+    # chart's, a title that's only on the other charts now loses the one it had
+    primary = set(fresh.charts[fresh.snapshot().primary_chart])
+    merged = []
+    for m in fresh.movies:
+        record = dict(old.movies_dict[m["id"]], **m) if m.get("id") in old.movies_dict else dict(m)
+        if record.get("id") not in primary:
+            record.pop("rank", None)
+        merged.append(record)
+    events = crawler.apply_dataset(merged, fresh.charts)
+    crawler.save_cache()
+    crawler.record_history()   # a new sample per title: this is a crawl of the chart
+    progress = Progress(args.progress)
+    progress.emit("chart", movies=len(merged), changes=len(events),
+                  charts={name: len(ids) for name, ids in fresh.charts.items()},
+                  missing_details=sum(1 for m in merged if not m.get("details_fetched")))
+    prefetch_images(args, crawler.movies, progress)
+    return 0
+
+
+def cmd_details(args) -> int:
+    crawler = load_crawler(args)
+    if not crawler.movies:
+        print("No chart cached yet, run `crawl.py chart` first", file=sys.stderr)
+        return 1
+
+    # resume: records finished by the interrupted run go straight into the snapshot
+    finished = read_checkpoint(args.checkpoint)
+    if finished:
+        crawler.publish(Dataset([finished.get(m["id"], m) for m in crawler.movies], charts=crawler.charts))
+
+    if args.ids:
+        wanted = [crawler.movies_dict[i] for i in args.ids.split(",") if i in crawler.movies_dict]
+    else:
+        cutoff = time.time() - args.stale if args.stale is not None else None
+        wanted = [m for m in crawler.movies
+                  if not m.get("details_fetched") or (cutoff is not None and m.get("updated_at", 0) < cutoff)]
+    todo = [m for m in wanted if m["id"] not in finished]
+
+    progress = Progress(args.progress, total=len(todo))
+    progress.emit("start", todo=len(todo), resumed=len(finished),
+                  concurrency=args.concurrency, rate=args.rate or None, deadline=args.deadline)
+    if args.deadline:
+        crawler.deadline = time.time() + args.deadline   # no new IMDb requests after it
+
+    crawler.scheduler.ensure_workers(args.concurrency)
+    force = bool(args.ids) or args.stale is not None
+    futures = {crawler.scheduler.submit(m, lambda m: crawler.get_movie_details(m, force=force), BACKGROUND,
+                                        crawler.job_key(m["id"])): m
+               for m in todo}
+    timed_out = False
+    with open(args.checkpoint, "a", encoding="utf-8") as ckpt:
+        try:
+            # a little grace after the deadline for the requests already on the wire
+            for future in as_completed(futures, timeout=args.deadline + 15 if args.deadline else None):
+                movie_id = futures[future]["id"]
+                try:
+                    movie = future.result()
+                except Exception as e:
+                    progress.step(False, id=movie_id, error=str(e))
+                    continue
+                ok = bool(movie.get("details_fetched"))
+                if ok:
+                    ckpt.write(json.dumps({"id": movie_id, "movie": movie}, ensure_ascii=False) + "\n")
+                    ckpt.flush()
+                progress.step(ok, id=movie_id)
+        except FutureTimeout:
+            timed_out = True
+    timed_out = timed_out or (crawler.deadline is not None and time.time() >= crawler.deadline
+                              and (progress.failed or progress.done < progress.total))
+
+    crawler.build_indexes()
+    crawler.save_cache()
+    prefetch_images(args, [crawler.movies_dict[m["id"]] for m in todo if m["id"] in crawler.movies_dict], progress)
+    if timed_out:
+        # keep the checkpoint, the next run only does what's left
+        progress.emit("deadline", fetched=progress.done - progress.failed, failed=progress.failed,
+                      left=progress.total - progress.done + progress.failed,
+                      upstream=crawler.upstream_status()["breakers"])
+        return 75
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)   # finished, the next run starts fresh
+    progress.emit("done", fetched=progress.done - progress.failed, failed=progress.failed,
+                  seconds=round(time.time() - progress.started, 1))
+    return 1 if progress.failed else 0
+
+
+def cmd_export(args) -> int:
+    crawler = load_crawler(args)
+    crawler.build_indexes()
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    if args.gzip:
+        import gzip
+        out = gzip.GzipFile(fileobj=out, mode="wb")
+    count = 0
+    for line in crawler.export_ndjson(args.since):
+        out.write(line)
+        count += 1
+    if args.gzip or args.output:
+        out.close()
+    else:
+        out.flush()
+    Progress(args.progress).emit("export", movies=count, generation=crawler.generation)
+    return 0
+
+
+def cmd_bench(args) -> int:
+    """Detail page download throughput at a given concurrency / rate, nothing is saved."""
+    crawler = load_crawler(args)
+    urls = [m["url"] for m in crawler.movies if m.get("url")][:args.pages]
+    progress = Progress(args.progress, total=len(urls))
+    latencies = []
+
+    def timed(url):
+        start = time.perf_counter()
+        ok = crawler.fetch_page(url) is not None
+        latencies.append(time.perf_counter() - start)
+        return ok
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for ok in executor.map(timed, urls):
+            progress.step(ok)
+
+    latencies.sort()
+    elapsed = time.time() - progress.started
+    progress.emit("bench", pages=len(urls), failed=progress.failed,
+                  pages_per_s=round(len(urls) / elapsed, 2) if elapsed else None,
+                  p50_ms=round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+                  p99_ms=round(latencies[int(len(latencies) * 0.99)] * 1000, 1) if latencies else None)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="crawl.py", description="Warm the IMDb movie caches")
+    parser.add_argument("--progress", choices=["auto", "json", "text"], default="auto")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def crawl_options(p):
+        p.add_argument("--concurrency", type=int, default=10, help="parallel downloads")
+        p.add_argument("--rate", type=float, default=0, help="max IMDb requests per second, 0 = no limit")
+        p.add_argument("--no-images", action="store_true", help="don't prefetch posters / cast photos")
+
+    p = sub.add_parser("chart", help="re-crawl the chart list(s)")
+    crawl_options(p)
+    p.add_argument("--charts", default="top", help=f"comma separated, from {', '.join(CHARTS)}; the first is primary")
+    p.set_defaults(func=cmd_chart)
+
+    p = sub.add_parser("details", help="fetch detail pages")
+    crawl_options(p)
+    p.add_argument("--ids", help="comma separated ids to (re-)fetch")
+    p.add_argument("--stale", type=int, metavar="SECONDS", help="also re-fetch details older than this")
+    p.add_argument("--checkpoint", default="crawl.ckpt", help="resume file, removed when the run completes")
+    p.add_argument("--deadline", type=int, metavar="SECONDS", help="stop after this long, save progress, exit 75")
+    p.set_defaults(func=cmd_details)
+
+    p = sub.add_parser("export", help="dump the cached catalog as ndjson")
+    p.add_argument("--since", type=int, help="only records changed after this generation")
+    p.add_argument("--gzip", action="store_true")
+    p.add_argument("-o", "--output")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("bench", help="measure detail page download throughput")
+    crawl_options(p)
+    p.add_argument("--pages", type=int, default=20)
+    p.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        print("\nInterrupted, re-run the same command to resume", file=sys.stderr)
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
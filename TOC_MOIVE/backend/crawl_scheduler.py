@@ -0,0 +1,120 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, List, Optional
+
+# lower runs first
+INTERACTIVE = 0   # someone opened the detail page and is waiting
+VISIBLE = 1       # on a grid a user is looking at
+BACKGROUND = 2    # warm-up / refresh of the whole chart
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", VISIBLE: "visible", BACKGROUND: "background"}
+
+
+class CrawlScheduler:
+    """Priority queue of detail fetches worked off by a fixed set of threads.
+
+    Submitting a movie that is already queued only raises its priority (the
+    old heap entry is skipped when popped), so a user opening movie #140 moves
+    it ahead of the warm-up batch instead of starting a second download.
+    "Already queued" means the same key: the movie id by default, the crawler
+    passes one that also says which crawler the result is for.
+    """
+
+    def __init__(self, workers: int = 10):
+        self.workers = workers
+        self._heap: List[tuple] = []
+        self._jobs: Dict[Hashable, dict] = {}  # key -> queued or running job
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._pid = None
+        self.done: deque = deque(maxlen=500)  # recently finished jobs, for status()
+
+    def ensure_workers(self, n: int):
+        with self._cond:
+            if self._pid != os.getpid():
+                # forked (wsgi.py): the parent's threads don't exist here
+                self._threads, self._pid = [], os.getpid()
+            self.workers = max(self.workers, n)
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._work, daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, movie: dict, fetch: Callable[[dict], dict], priority: int = BACKGROUND,
+               key: Optional[Hashable] = None) -> Future:
+        """Queue a detail fetch, or bump the priority of the one already queued under `key`
+        (default the movie id); resolves to the movie."""
+        self.ensure_workers(self.workers)
+        key = movie["id"] if key is None else key
+        with self._cond:
+            job = self._jobs.get(key)
+            if job is None:
+                job = {"key": key, "movie": movie, "fetch": fetch, "priority": priority, "future": Future(),
+                       "submitted": time.time(), "started": None}
+                self._jobs[key] = job
+            elif job["started"] is None and priority < job["priority"]:
+                job["priority"] = priority
+            else:
+                return job["future"]
+            heapq.heappush(self._heap, (priority, next(self._counter), key))
+            self._cond.notify()
+            return job["future"]
+
+    def _next_job(self) -> dict:
+        with self._cond:
+            while True:
+                while not self._heap:
+                    self._cond.wait()
+                priority, _, key = heapq.heappop(self._heap)
+                job = self._jobs.get(key)
+                # stale entry left behind by a priority bump
+                if job is not None and job["started"] is None and job["priority"] == priority:
+                    job["started"] = time.time()
+                    return job
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            movie_id = job["movie"]["id"]
+            try:
+                job["future"].set_result(job["fetch"](job["movie"]))
+            except Exception as e:
+                job["future"].set_exception(e)
+            finally:
+                with self._cond:
+                    self._jobs.pop(job["key"], None)
+                    self.done.append({"id": movie_id, "priority": job["priority"],
+                                      "waited": job["started"] - job["submitted"],
+                                      "took": time.time() - job["started"]})
+
+    def status(self) -> dict:
+        """Queue depth per priority, what's running, and recent wait / time-to-detail per priority."""
+        now = time.time()
+        with self._cond:
+            jobs = list(self._jobs.values())
+            done = list(self.done)
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        running = []
+        for job in jobs:
+            if job["started"] is None:
+                queued[PRIORITY_NAMES[job["priority"]]] += 1
+            else:
+                running.append({"id": job["movie"]["id"], "priority": PRIORITY_NAMES[job["priority"]],
+                                "seconds": round(now - job["started"], 2)})
+
+        recent = {}
+        for priority, name in PRIORITY_NAMES.items():
+            jobs_done = [d for d in done if d["priority"] == priority]
+            if jobs_done:
+                recent[name] = {
+                    "count":           len(jobs_done),
+                    "avgWait":         round(sum(d["waited"] for d in jobs_done) / len(jobs_done), 3),
+                    "avgTimeToDetail": round(sum(d["waited"] + d["took"] for d in jobs_done) / len(jobs_done), 3),
+                }
+        return {"workers": len(self._threads), "queued": queued, "running": running, "recent": recent}
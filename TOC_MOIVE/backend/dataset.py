@@ -0,0 +1,112 @@
+from types import MappingProxyType
+from typing import Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from date_index import ReleaseDateIndex
+from facets import FacetIndex
+from formatters import render_detail_doc
+from search_index import MovieSearchIndex, PeopleIndex, SuggestIndex
+from similarity import SimilarMovies
+
+
+class Dataset:
+    """One immutable generation of the movie list, its indexes and pre-rendered docs.
+
+    The crawler never edits a published Dataset or the movie dicts inside it:
+    writers build a new one and swap `crawler.data` in a single assignment, so a
+    request that grabbed a snapshot sees one consistent catalog for its whole
+    lifetime, without taking a lock.
+
+    Every title is stored once in `movies`, whatever charts it is on; `charts`
+    maps a chart name to its ranked ids. The first chart is the primary one,
+    the one `rank` on the records, the change feed and trending refer to.
+    """
+
+    __slots__ = ("movies", "movies_dict", "_positions", "charts", "detail_docs", "search_index", "suggest_index",
+                 "people_index", "similar_movies", "facet_index", "release_index", "top_rated")
+
+    def __init__(self, movies: Iterable[dict] = (), detail_docs: Optional[Mapping[str, bytes]] = None,
+                 indexes: Optional[dict] = None, charts: Optional[Mapping[str, Sequence[str]]] = None):
+        movies = tuple(movies)
+        indexes = indexes or {}
+        self._set("movies", movies)
+        self._set("movies_dict", MappingProxyType({m["id"]: m for m in movies if m.get("id")}))
+        self._set("_positions", {m["id"]: pos for pos, m in enumerate(movies) if m.get("id")})  # for with_movies
+        # a plain movie list (old caches, tests) is a single Top chart in list order
+        if not charts:
+            charts = {"top": [m["id"] for m in movies if m.get("id")]}
+        self._set("charts", MappingProxyType({name: tuple(ids) for name, ids in charts.items()}))
+        self._set("detail_docs", MappingProxyType(dict(detail_docs or {})))  # id -> /movies/<id> json
+        for name in ("search_index", "suggest_index", "people_index", "similar_movies",
+                     "facet_index", "release_index"):
+            self._set(name, indexes.get(name))
+        self._set("top_rated", tuple(indexes.get("top_rated", ())))  # ids by rating, trending falls back to these
+
+    def _set(self, name, value):
+        object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Dataset is immutable, publish a new one instead")
+
+    @property
+    def primary_chart(self) -> str:
+        return next(iter(self.charts))
+
+    def chart_movies(self, name: Optional[str] = None) -> List[dict]:
+        """The records of one chart in chart order (the primary chart by default), [] for an unknown chart."""
+        ids = self.charts.get(name or self.primary_chart, ())
+        return [self.movies_dict[i] for i in ids if i in self.movies_dict]
+
+    @classmethod
+    def build(cls, movies: Iterable[dict], charts: Optional[Mapping[str, Sequence[str]]] = None) -> "Dataset":
+        """Full build: every index plus the detail docs of movies that have details."""
+        movies = tuple(movies)
+        indexes = {
+            "search_index":   MovieSearchIndex(movies),
+            "suggest_index":  SuggestIndex(movies),
+            "people_index":   PeopleIndex(movies),
+            "similar_movies": SimilarMovies(movies),
+            "facet_index":    FacetIndex(movies),
+            "release_index":  ReleaseDateIndex(movies),
+            "top_rated":      [m["id"] for m in sorted(movies, key=lambda x: float(x.get("rating") or 0), reverse=True)],
+        }
+        docs = {m["id"]: render_detail_doc(m) for m in movies if m.get("id") and m.get("details_fetched")}
+        return cls(movies, docs, indexes, charts)
+
+    def indexes(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__[5:]}
+
+    def with_movie(self, movie: dict, doc: Optional[bytes]) -> "Dataset":
+        """Copy with one record replaced (or appended) and its doc set; the indexes and charts
+        are shared until the next build(), same as when records used to change in place.
+        """
+        return self.with_movies([(movie, doc)])
+
+    def with_movies(self, changes: Iterable[Tuple[dict, Optional[bytes]]]) -> "Dataset":
+        """with_movie for a batch of (record, doc): one copy of the catalog however many records
+        change, and the copies are C-level list / dict copies, no per-record python loop.
+        """
+        movies = list(self.movies)
+        by_id = self.movies_dict.copy()   # the proxied dict's own copy, dict(proxy) goes key by key
+        positions = self._positions.copy()
+        docs = self.detail_docs.copy()
+        for movie, doc in changes:
+            pos = positions.get(movie["id"])
+            if pos is None:
+                positions[movie["id"]] = len(movies)
+                movies.append(movie)
+            else:
+                movies[pos] = movie
+            by_id[movie["id"]] = movie
+            if doc is None:
+                docs.pop(movie["id"], None)
+            else:
+                docs[movie["id"]] = doc
+        new = object.__new__(Dataset)   # nothing to re-derive: the charts and indexes are ours
+        new._set("movies", tuple(movies))
+        new._set("movies_dict", MappingProxyType(by_id))
+        new._set("_positions", positions)
+        new._set("charts", self.charts)
+        new._set("detail_docs", MappingProxyType(docs))
+        for name in self.__slots__[5:]:
+            new._set(name, getattr(self, name))
+        return new
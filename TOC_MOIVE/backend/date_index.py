@@ -0,0 +1,34 @@
+from bisect import bisect_right
+from typing import List, Optional
+
+
+def release_key(movie: dict) -> Optional[str]:
+    """ISO release date, or just the year when the date is unknown."""
+    if movie.get("release_date_iso"):
+        return movie["release_date_iso"]
+    return f"{int(movie['year']):04d}" if movie.get("year") else None
+
+
+class ReleaseDateIndex:
+    """Movie ids kept sorted by ISO release date ("1994-10-14"), built once per dataset.
+
+    ISO strings sort the same as the dates they hold, so a date window is two
+    bisects and newest-first is a reversed slice, no per-request sort.
+
+    A title without a parsed date (chart record before its details, or a page
+    with no usable date) is filed under its bare year, "1994", which sorts
+    before every "1994-..." date: listed after the dated titles of that year.
+    """
+
+    def __init__(self, movies: List[dict]):
+        dated = sorted((release_key(m), m["id"]) for m in movies if m.get("id") and release_key(m))
+        self.dates = [d for d, _ in dated]
+        self.ids = [i for _, i in dated]
+
+    def newest(self, limit: int = 10, after: Optional[str] = None,
+               before: Optional[str] = None) -> List[str]:
+        """Ids released strictly after `after` and up to `before` (both ISO dates), newest first."""
+        lo = bisect_right(self.dates, after) if after else 0
+        hi = bisect_right(self.dates, before) if before else len(self.dates)
+        start = max(lo, hi - limit)
+        return self.ids[start:hi][::-1]
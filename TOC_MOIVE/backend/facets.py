@@ -0,0 +1,72 @@
+import math
+from typing import Dict, Iterable, List, Optional
+
+FACETS = ("genre", "country", "decade", "certificate", "rating")
+
+
+def facet_values(m: dict) -> Dict[str, List[str]]:
+    """The facet buckets a single movie falls into."""
+    return {
+        "genre":       list(m.get("genres", [])),
+        "country":     [m["country"]] if m.get("country") else [],
+        "decade":      [f"{m['year'] // 10 * 10}s"] if m.get("year") else [],
+        "certificate": [m["certificate"]] if m.get("certificate") else [],
+        # half-point buckets: 8.7 → "8.5"
+        "rating":      [f"{math.floor(m['rating'] * 2) / 2:.1f}"] if m.get("rating") else [],
+    }
+
+
+class FacetIndex:
+    """One bitset (a python int, bit i = i-th movie) per facet value.
+
+    Counting a facet under any filter is then `(filter_mask & value_bits).bit_count()`
+    per value, instead of walking every movie's genre list per request.
+    """
+
+    def __init__(self, movies: List[dict]):
+        self.size = len(movies)
+        self.positions: Dict[str, int] = {}
+        # bits are set in bytearrays first, OR-ing growing ints one bit at a time is quadratic
+        raw: Dict[str, Dict[str, bytearray]] = {facet: {} for facet in FACETS}
+
+        for pos, m in enumerate(movies):
+            if m.get("id"):
+                self.positions[m["id"]] = pos
+            for facet, values in facet_values(m).items():
+                buckets = raw[facet]
+                for value in values:
+                    if value not in buckets:
+                        buckets[value] = self._empty()
+                    buckets[value][pos >> 3] |= 1 << (pos & 7)
+
+        self.bits: Dict[str, Dict[str, int]] = {
+            facet: {value: int.from_bytes(buf, "little") for value, buf in buckets.items()}
+            for facet, buckets in raw.items()
+        }
+        self.all_mask = (1 << self.size) - 1
+
+    def _empty(self) -> bytearray:
+        return bytearray((self.size + 7) // 8)
+
+    def mask_for(self, movie_ids: Iterable[str]) -> int:
+        """Bitset of the given movies (e.g. the current /movies result set)."""
+        buf = self._empty()
+        for movie_id in movie_ids:
+            pos = self.positions.get(movie_id)
+            if pos is not None:
+                buf[pos >> 3] |= 1 << (pos & 7)
+        return int.from_bytes(buf, "little")
+
+    def counts(self, mask: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+        """{facet: {value: count}} for the movies in `mask`, empty buckets left out."""
+        if mask is None:
+            mask = self.all_mask
+        result = {}
+        for facet, buckets in self.bits.items():
+            counts = {}
+            for value, bits in buckets.items():
+                n = (mask & bits).bit_count()
+                if n:
+                    counts[value] = n
+            result[facet] = counts
+        return result
@@ -0,0 +1,61 @@
+import re
+from typing import Iterable, List, Optional, Set
+
+from bs4 import SoupStrainer
+
+# what a title page gives us, by the part of the page it comes from.
+# title / rating / poster / url come with the chart list and aren't in any group
+FIELD_GROUPS = {
+    "core":      ("year", "runtime", "runtime_minutes", "release_date", "release_date_clean",
+                  "release_date_iso", "certificate", "metascore"),
+    "genres":    ("genres", "country", "plot", "language"),   # everything a grid card shows
+    "credits":   ("director", "cast"),
+    "boxoffice": ("budget", "budget_usd", "box_office", "box_office_usd"),
+    "awards":    ("awards", "oscar_wins", "total_wins", "total_nominations"),
+}
+ALL_GROUPS = tuple(FIELD_GROUPS)
+
+# data-testid of the page sections each group is read from; a partial parse only builds
+# these subtrees (so the class-name / <meta> fallbacks for the plot only run on a full parse)
+GROUP_SECTIONS = {
+    "core":      ("hero-title-block__metadata", "title-techspec_runtime", "title-details-releasedate",
+                  "title-details-certificate", "meta-score-box"),
+    "genres":    ("genres", "interests", "title-details-origin",
+                  "plot", "plot-xl", "plot-l", "plot-m", "plot-xs"),
+    "credits":   ("title-pc-principal-credit", "title-cast-item"),
+    "boxoffice": ("title-boxoffice-budget", "title-boxoffice-cumulativeworldwidegross"),
+    "awards":    ("award_information",),
+}
+
+
+def groups_of(movie: dict) -> Set[str]:
+    """Field groups a record already has; records from before groups existed have all or none."""
+    if movie.get("details_fetched"):
+        return set(ALL_GROUPS)
+    return set(movie.get("groups", ()))
+
+
+def missing_groups(movie: dict, groups: Optional[Iterable[str]] = None) -> List[str]:
+    """Which of `groups` (default: all of them) still have to be fetched, in ALL_GROUPS order."""
+    have = groups_of(movie)
+    wanted = set(groups) if groups is not None else set(ALL_GROUPS)
+    return [g for g in ALL_GROUPS if g in wanted and g not in have]
+
+
+def merge_groups(record: dict, fetched: dict, groups: Iterable[str]) -> dict:
+    """Copy of `record` with the fields of `groups` taken from `fetched`, groups / details_fetched updated."""
+    merged = dict(record)
+    for group in groups:
+        for field in FIELD_GROUPS[group]:
+            if field in fetched:
+                merged[field] = fetched[field]
+    have = groups_of(record) | set(groups)
+    merged["groups"] = [g for g in ALL_GROUPS if g in have]
+    merged["details_fetched"] = len(have) == len(ALL_GROUPS)
+    return merged
+
+
+def section_strainer(groups: Iterable[str]) -> SoupStrainer:
+    """parse_only filter keeping just the sections `groups` are read from."""
+    testids = sorted({t for g in groups for t in GROUP_SECTIONS[g]})
+    return SoupStrainer(attrs={"data-testid": re.compile("^(%s)$" % "|".join(map(re.escape, testids)))})
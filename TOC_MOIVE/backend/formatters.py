@@ -0,0 +1,71 @@
+from avatars import avatar_url
+from image_cache import images
+from json_provider import dumps_bytes
+
+# api payload shapes, shared by the flask routes and the crawler (pre-rendered detail docs)
+
+
+def format_movie_brief(m: dict) -> dict:
+    """Return the fields needed for the movie-grid cards."""
+    return {
+        "id":       m.get("id"),
+        "title":    m.get("title"),
+        "year":     m.get("year"),
+        "rating":   m.get("rating"),
+        "plot":     m.get("plot"),
+        "poster":   images.public_url(m.get("poster"), "thumb"),
+        "genres":   m.get("genres", []),
+        "language": m.get("country", ""), # "language" in the frontend actually means country of origin
+    }
+
+
+def format_movie_detail(movie: dict) -> dict:
+    """Return the full fields needed for DetailPage."""
+    directors = movie.get("director", [])
+    if isinstance(directors, list):
+        directors_str = ", ".join(directors)
+    else:
+        directors_str = str(directors)
+
+    # Cast may be stored as list of dicts {"name", "img"} (new crawler)
+    raw_cast = movie.get("cast", [])
+    cast_list = []
+    for actor in raw_cast:
+        if isinstance(actor, dict):
+            name    = actor.get("name", "")
+            img_url = actor.get("img", "")
+        else:
+            name    = str(actor)
+            img_url = ""
+
+        # Fall back to a locally rendered initials avatar if no real photo was scraped
+        if img_url:
+            img_url = images.public_url(img_url, "headshot")
+        else:
+            img_url = avatar_url(name)
+        cast_list.append({"name": name, "img": img_url})
+
+    return {
+        "id":          movie.get("id"),
+        "title":       movie.get("title"),
+        "year":        movie.get("year"),
+        "runtime":     movie.get("runtime"),
+        "rating":      movie.get("rating"),
+        "certificate": movie.get("certificate", "N/A"),
+        "director":    directors_str,
+        "genres":      movie.get("genres", []),
+        "budget":      movie.get("budget"),
+        "boxOffice":   movie.get("box_office"),
+        "releaseDate": movie.get("release_date"),
+        "releaseDateIso": movie.get("release_date_iso"),
+        "imdbScore":   f"{movie.get('rating', 'N/A')} / 10",
+        "awardsInfo":  movie.get("awards"),
+        "backdrop":    images.public_url(movie.get("poster"), "backdrop"),
+        "plot":        movie.get("plot"),
+        "cast":       cast_list,
+    }
+
+
+def render_detail_doc(movie: dict) -> bytes:
+    """format_movie_detail serialized once to compact json bytes, ready to be sent as-is."""
+    return dumps_bytes(format_movie_detail(movie))
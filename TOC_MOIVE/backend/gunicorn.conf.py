@@ -0,0 +1,21 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("THREADS", "4"))  # gthread worker, a slow detail fetch doesn't block the process
+worker_class = "gthread"
+
+# load wsgi.py (and the whole dataset) once in the master, then fork: workers share it copy-on-write
+preload_app = True
+
+# recycle workers now and then; a new one forks from the master again, with no crawl
+max_requests = 5000
+max_requests_jitter = 500
+timeout = 60
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.start_worker_sync()
@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import threading
+import time
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from change_feed import chart_ranks
+
+HISTORY_DB = os.environ.get("HISTORY_DB", os.path.join(os.path.dirname(__file__), "history.db"))
+
+# one row per title per crawl, all integers: tt0111161 → 111161, rating 9.3 → 93.
+# WITHOUT ROWID keeps rows clustered by (title, ts), so a range query is one index seek + scan
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    title      INTEGER NOT NULL,
+    ts         INTEGER NOT NULL,
+    rank       INTEGER,
+    rating     INTEGER,
+    metascore  INTEGER,
+    box_office INTEGER,
+    PRIMARY KEY (title, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+"""
+
+
+def title_key(movie_id: str) -> Optional[int]:
+    digits = (movie_id or "")[2:]
+    return int(digits) if digits.isdigit() else None
+
+
+def _int(value, scale: int = 1) -> Optional[int]:
+    try:
+        return round(float(value) * scale)
+    except (TypeError, ValueError):
+        return None
+
+
+class HistoryStore:
+    """Append-only rank / rating / metascore / box office time series, one sample per crawl.
+
+    Reads aggregate inside SQLite, so a long history is downsampled without
+    ever being loaded into Python.
+    """
+
+    def __init__(self, path: str = HISTORY_DB):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite connections can't be shared between threads or forked workers, keep one per thread per process
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def record(self, movies: List[dict], ts: Optional[int] = None) -> int:
+        """Append one crawl's values; returns the number of rows written."""
+        ts = int(ts if ts is not None else time.time())
+        ranks = chart_ranks(movies)
+        rows = [
+            (title_key(m["id"]), ts, ranks[m["id"]], _int(m.get("rating"), 10),
+             _int(m.get("metascore")), _int(m.get("box_office_usd")))
+            for m in movies if title_key(m.get("id")) is not None
+        ]
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def samples(self, movie_id: str, start: int = 0, end: Optional[int] = None) -> Iterator[dict]:
+        """Raw samples in [start, end], streamed from the cursor."""
+        end = end if end is not None else 2 ** 62
+        cursor = self._conn().execute(
+            "SELECT ts, rank, rating, metascore, box_office FROM samples "
+            "WHERE title = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+            (title_key(movie_id), start, end))
+        for row in cursor:
+            yield self._point(row)
+
+    def crawls(self, since: int = 0) -> Iterator[Tuple[int, Dict[str, Tuple[int, float]]]]:
+        """(ts, {id: (rank, rating)}) per crawl since `since`, oldest first; feeds the trending replay."""
+        cursor = self._conn().execute(
+            "SELECT ts, title, rank, rating FROM samples WHERE ts >= ? ORDER BY ts", (since,))
+        for ts, rows in groupby(cursor, key=lambda row: row[0]):
+            yield ts, {f"tt{title:07d}": (rank, rating / 10 if rating is not None else None)
+                       for _, title, rank, rating in rows}
+
+    def series(self, movie_id: str, start: int = 0, end: Optional[int] = None,
+               points: int = 500, step: Optional[int] = None) -> dict:
+        """At most `points` samples over [start, end], averaged per bucket of `step` seconds.
+
+        Box office is cumulative, so a bucket keeps its highest value instead of the mean.
+        """
+        key = title_key(movie_id)
+        conn = self._conn()
+        if end is None:
+            end = conn.execute("SELECT MAX(ts) FROM samples WHERE title = ?", (key,)).fetchone()[0] or start
+        if start == 0:
+            start = conn.execute("SELECT MIN(ts) FROM samples WHERE title = ?", (key,)).fetchone()[0] or 0
+        if not step:
+            step = max(1, -(-(end - start + 1) // max(1, points)))  # ceil division
+
+        cursor = conn.execute(
+            "SELECT MIN(ts), ROUND(AVG(rank)), ROUND(AVG(rating)), ROUND(AVG(metascore)), MAX(box_office) "
+            "FROM samples WHERE title = ? AND ts BETWEEN ? AND ? "
+            "GROUP BY (ts - ?) / ? ORDER BY 1",
+            (key, start, end, start, step))
+        return {
+            "id":     movie_id,
+            "from":   start,
+            "to":     end,
+            "step":   step,
+            "points": [self._point(row) for row in cursor],
+        }
+
+    @staticmethod
+    def _point(row) -> dict:
+        ts, rank, rating, metascore, box_office = row
+        return {
+            "t":         ts,
+            "rank":      int(rank) if rank is not None else None,
+            "rating":    rating / 10 if rating is not None else None,
+            "metascore": int(metascore) if metascore is not None else None,
+            "boxOffice": box_office,
+        }
+
+
+# written to after every crawl, read by /movies/<id>/history
+history = HistoryStore()
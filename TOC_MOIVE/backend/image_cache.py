@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+try:
+    from PIL import Image, ImageOps  # optional: re-encode variants as WebP
+except ImportError:
+    Image = None
+
+IMAGE_CACHE_DIR = os.path.join(os.path.dirname(__file__), "image_cache")
+# images are served by this backend, the React app lives on another origin so urls must be absolute
+PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "http://127.0.0.1:5000").rstrip("/")
+IMAGE_PROXY = os.environ.get("IMAGE_PROXY", "1") != "0"
+PREFETCH_BATCH = 2.0  # seconds published records pile up before their images are prefetched together
+
+# variant name -> (width, height); height None keeps the aspect ratio
+VARIANTS = {
+    "thumb":    (300, None),    # movie grid cards
+    "backdrop": (1280, None),   # detail page hero
+    "headshot": (140, 193),     # cast photos
+}
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+}
+
+
+def sized_source_url(url: str, variant: str) -> str:
+    """Ask the IMDb CDN for the variant size directly so we never download the full poster.
+    IMDb image urls carry a size token after _V1_, e.g. ..._V1_.jpg → ..._V1_UX300_.jpg
+    """
+    width, height = VARIANTS[variant]
+    token = f"_V1_UX{width}_CR0,0,{width},{height}_" if height else f"_V1_UX{width}_"
+    return re.sub(r'_V1_.*?\.(jpg|jpeg|png|webp)', token + r'.\1', url, flags=re.IGNORECASE) #<-- regular lang
+
+
+def download(url: str) -> Tuple[bytes, str]:
+    response = requests.get(url, headers=HEADERS, timeout=15)
+    response.raise_for_status()
+    return response.content, response.headers.get("Content-Type", "image/jpeg")
+
+
+class ImageCache:
+    """On-disk, content-addressed cache of resized posters and cast photos.
+
+    Public names look like `<key>-<variant>`, where key is a hash of the source
+    url. Only urls registered through public_url() can be fetched, so /img is
+    not an open proxy. Blobs are stored by the sha256 of their bytes, which is
+    also the ETag, so identical images are kept once.
+    """
+
+    def __init__(self, root: str = IMAGE_CACHE_DIR,
+                 fetch: Callable[[str], Tuple[bytes, str]] = download):
+        self.root = root
+        self.fetch = fetch
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.sources: Dict[str, str] = {}     # key -> source url
+        self.variants: Dict[str, dict] = {}   # "<key>-<variant>" -> {"sha", "type"}
+        self._lock = threading.Lock()
+        self._pending: List[dict] = []        # records waiting for prefetch_later's thread
+        self._wake = threading.Event()
+        self._pid = None
+        self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.sources = data.get("sources", {})
+            self.variants = data.get("variants", {})
+        except (OSError, ValueError):
+            pass
+
+    def save_manifest(self):
+        with self._lock:
+            data = {"sources": dict(self.sources), "variants": dict(self.variants)}
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{self.manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"  # workers share the dir
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.manifest_path)
+
+    @staticmethod
+    def key_for(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()[:20]
+
+    def public_url(self, url: Optional[str], variant: str) -> Optional[str]:
+        """Absolute /img url for a source image (registering it), or the url untouched if proxying is off."""
+        if not url or not IMAGE_PROXY:
+            return url
+        key = self.key_for(url)
+        if key not in self.sources:
+            with self._lock:
+                self.sources[key] = url
+        return f"{PUBLIC_BASE_URL}/img/{key}-{variant}"
+
+    def blob_path(self, sha: str, content_type: str) -> str:
+        ext = content_type.split("/")[-1].split(";")[0] or "bin"
+        return os.path.join(self.root, "blobs", sha[:2], f"{sha}.{ext}")
+
+    def lookup(self, name: str) -> Optional[Tuple[str, str, str]]:
+        """(file path, content type, sha256) for `<key>-<variant>`, fetching it on a miss."""
+        key, _, variant = name.partition("-")
+        if variant not in VARIANTS or key not in self.sources:
+            return None
+
+        entry = self.variants.get(name)
+        if entry:
+            path = self.blob_path(entry["sha"], entry["type"])
+            if os.path.exists(path):
+                return path, entry["type"], entry["sha"]
+
+        entry = self._fetch_and_store(key, variant)
+        self.save_manifest()
+        return self.blob_path(entry["sha"], entry["type"]), entry["type"], entry["sha"]
+
+    def _fetch_and_store(self, key: str, variant: str) -> dict:
+        data, content_type = self.fetch(sized_source_url(self.sources[key], variant))
+        if Image is not None:
+            data, content_type = self._to_webp(data, variant)
+
+        sha = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(sha, content_type)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+        entry = {"sha": sha, "type": content_type}
+        with self._lock:
+            self.variants[f"{key}-{variant}"] = entry
+        return entry
+
+    @staticmethod
+    def _to_webp(data: bytes, variant: str) -> Tuple[bytes, str]:
+        width, height = VARIANTS[variant]
+        img = Image.open(BytesIO(data)).convert("RGB")
+        if height:
+            img = ImageOps.fit(img, (width, height))
+        elif img.width > width:
+            img = img.resize((width, round(img.height * width / img.width)))
+        out = BytesIO()
+        img.save(out, "WEBP", quality=80)
+        return out.getvalue(), "image/webp"
+
+    def prefetch(self, jobs: List[Tuple[str, str]], max_workers: int = 8) -> int:
+        """Download (source url, variant) pairs that aren't cached yet; returns how many were stored."""
+        if not IMAGE_PROXY:
+            return 0
+
+        todo = {}   # a record published twice in one batch is fetched once
+        for url, variant in jobs:
+            self.public_url(url, variant)   # registers the source
+            key = self.key_for(url)
+            if f"{key}-{variant}" not in self.variants:
+                todo[key, variant] = True
+
+        stored = failed = 0
+        if todo:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            try:
+                futures = [executor.submit(self._fetch_and_store, k, v) for k, v in todo]
+            except RuntimeError:
+                # the process is exiting before the background prefetch got going
+                return 0
+            for future in futures:
+                try:
+                    future.result()
+                    stored += 1
+                except Exception:
+                    failed += 1
+                # nothing has worked so far, the CDN is unreachable: leave the rest to /img on demand
+                if failed >= max_workers * 2 and not stored:
+                    print("Image cache: CDN unreachable, skipping the rest of the prefetch")
+                    break
+            executor.shutdown(wait=True, cancel_futures=True)
+            print(f"Image cache: {stored} images stored, {failed} failed")
+        self.save_manifest()
+        return stored
+
+    def prefetch_movies(self, movies: List[dict], max_workers: int = 8) -> int:
+        """Warm the grid thumb + detail backdrop of every poster and the cast headshots."""
+        jobs = []
+        for m in movies:
+            if m.get("poster"):
+                jobs.append((m["poster"], "thumb"))
+                jobs.append((m["poster"], "backdrop"))
+            for actor in m.get("cast", []):
+                if isinstance(actor, dict) and actor.get("img"):
+                    jobs.append((actor["img"], "headshot"))
+        return self.prefetch(jobs, max_workers)
+
+    def prefetch_later(self, movies: Iterable[dict]):
+        """prefetch_movies on a background thread, for the crawler: publishing a record never waits on the CDN."""
+        if not IMAGE_PROXY:
+            return
+        with self._lock:
+            self._pending.extend(movies)
+            if self._pid != os.getpid():
+                # first call in this process (or after a fork): the parent's thread isn't here
+                self._pid = os.getpid()
+                threading.Thread(target=self._prefetch_forever, daemon=True).start()
+        self._wake.set()
+
+    def _prefetch_forever(self):
+        while True:
+            self._wake.wait()
+            time.sleep(PREFETCH_BATCH)   # a detail batch publishing one record at a time becomes one prefetch
+            self._wake.clear()
+            with self._lock:
+                movies, self._pending = self._pending, []
+            try:
+                self.prefetch_movies(movies)
+            except Exception as e:
+                print(f"Image prefetch failed: {e}")
+
+
+# shared by the API routes and the warm-up in get_crawler()
+images = ImageCache()
@@ -3,18 +3,82 @@ import requests
 from bs4 import BeautifulSoup
 import json
 import os
+import threading
 import time
-from typing import List, Dict, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Iterator, List, Dict, Optional
+from concurrent.futures import Future, TimeoutError as FutureTimeout, as_completed
+from urllib.parse import urlsplit
+from circuit_breaker import CircuitBreaker, backoff
+from shared_cache import SharedCatalog
+from cache_file import read_json_verified, write_json_atomic, write_lock
+from dataset import Dataset
+from formatters import render_detail_doc
+from change_feed import ChangeLog, diff_datasets
+from crawl_scheduler import CrawlScheduler, BACKGROUND, INTERACTIVE
+from field_groups import ALL_GROUPS, groups_of, merge_groups, missing_groups, section_strainer
+from history_store import history
+from trending import TrendingScores, snapshot as rank_snapshot
 
 CACHE_FILE = os.path.join(os.path.dirname(__file__), "movies_cache.json")
 CACHE_VERSION = "3"
+NEGATIVE_TTL = 60  # seconds a failed detail fetch (404, timeout) is not retried
+REQUEST_TIMEOUT = 15  # seconds per IMDb request
+RETRIES = 2  # extra attempts after a timeout / 429 / 5xx, with jittered backoff
+CRAWL_LEASE = 600  # seconds the shared-cache crawl lease lasts unless the holder renews it
+FAILURES_KEPT = 500  # urls in the failure ledger, the ones that failed longest ago are forgotten first
+HANDOFF_WAIT = 20  # seconds a process that doesn't crawl waits for the crawling one to fetch a title
+HANDOFF_POLL = 0.25  # seconds between its looks at the shared cache meanwhile
+
+# IMDb lists we know how to crawl, name -> chart page
+CHARTS = {
+    "top":       "https://www.imdb.com/chart/top/",
+    "popular":   "https://www.imdb.com/chart/moviemeter/",
+    "toptv":     "https://www.imdb.com/chart/toptv/",
+    "boxoffice": "https://www.imdb.com/chart/boxoffice/",
+}
+CHART_LIMIT = 150  # titles kept per chart
 
 class IMDbMovieCrawler:
     def __init__(self):
-        self.url = "https://www.imdb.com/chart/top/"
-        self.movies = []
-        self.movies_dict = {}  # Store movies by ID for quick lookup
+        self.url = CHARTS["top"]
+        self.chart_names = ["top"]  # charts fetch_top_movies / refresh crawl, the first one is primary
+        # movies, movies_dict, indexes and detail docs, swapped as a whole by publish()
+        self.data = Dataset()
+        self._publish_lock = threading.RLock()  # writers only, readers just read self.data
+        self._unpublished: List[tuple] = []  # (record, doc) waiting for the next publish_movie batch
+        self._unpublished_lock = threading.Lock()
+        self.generation = 0  # bumped on every record change, lets exports resume with since=
+        self._generation_lock = threading.Lock()
+        self.change_log = ChangeLog()  # rank / rating / entrant changes between refreshes
+        self.trending = TrendingScores()  # rank / rating velocity, updated once per crawl
+        self._inflight: Dict[str, Future] = {}  # movie id -> detail fetch in progress
+        self._inflight_lock = threading.Lock()
+        self._failed_until: Dict[str, float] = {}  # movie id -> don't retry before this time
+        self.scheduler = CrawlScheduler()  # detail fetches, interactive ones jump the queue
+        self.min_interval = 0.0  # seconds between two IMDb requests across all threads (crawl.py --rate)
+        self._next_request = 0.0
+        self._rate_lock = threading.Lock()
+        self.breakers: Dict[str, CircuitBreaker] = {}  # host -> breaker, see fetch_page
+        self._breakers_lock = threading.Lock()
+        self.failures: Dict[str, dict] = {}  # url -> {count, error, at} of fetches that are still failing
+        self._failures_lock = threading.Lock()  # fetch threads write it while /crawl/status reads it
+        self.deadline: Optional[float] = None  # unix time, fetch_page starts / retries nothing after it
+        self.shared: Optional[SharedCatalog] = None  # cache shared with other processes / hosts, SHARED_CACHE
+        self._shared_catalog: Optional[str] = None  # id of the catalog last loaded from / pushed to it
+        # False: never go to IMDb for details, hand the fetch to the process that crawls
+        # through self.shared and read the result back from there (wsgi.py's follower workers)
+        self.crawls_details = True
+        # write-behind of changed records to CACHE_FILE, None = off; only the process that owns
+        # the file turns it on (wsgi.py: the crawl lock holder), other workers just reload it
+        self.cache_flush_interval: Optional[float] = None
+        self.cache_checksum: Optional[str] = None  # of the CACHE_FILE we last wrote or loaded
+        self._dirty_ids: set = set()  # records changed since the last save_cache
+        self._dirty_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._writer_wake = threading.Event()
+        self._writer_pid = None
+        self.images = None  # ImageCache that gets the posters / headshots of every published record (main.py)
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept-Language': 'en-US,en;q=0.9',
@@ -23,45 +87,280 @@ class IMDbMovieCrawler:
     
     #I add to load and save the cache
     def load_cache(self) -> bool:
-        """Load movies from disk cache. Returns True if cache is valid."""
-        if not os.path.exists(CACHE_FILE):
+        """Load movies from disk cache. Returns True if cache is valid.
+        A torn or corrupted file (bad json / checksum) falls back to the previous one, CACHE_FILE.bak.
+        """
+        data = None
+        for path in (CACHE_FILE, CACHE_FILE + ".bak"):
+            if os.path.exists(path):
+                data = read_json_verified(path)
+                if data is not None:
+                    if path != CACHE_FILE:
+                        print(f"Using the previous cache {path}")
+                    break
+        if data is None:
             return False
         try:
-            with open(CACHE_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
             if data.get("version") != CACHE_VERSION:
                 print("Cache version mismatch re-crawling")
                 return False
             movies = data.get("movies", [])
             if not movies:
                 return False
-            self.movies = movies
-            self.movies_dict = {m["id"]: m for m in movies if m.get("id")}
+            for m in movies:
+                # caches written before dates were normalised only have the free-text date
+                if m.get('release_date_clean') and 'release_date_iso' not in m:
+                    m['release_date_iso'] = self.parse_release_date(m['release_date_clean'])
+            self.publish(Dataset(movies, charts=data.get("charts")))
+            self.generation = max((m.get("generation", 0) for m in movies), default=0)
+            self.cache_checksum = data.get("checksum")
             print(f"Loaded {len(self.movies)} movies from disk cache (instant!)")
             return True
         except Exception as e:
             print(f"Cache load failed ({e}) re-crawling")
             return False
 
-    def save_cache(self):
-        """Persist movies list to disk so next restart is instant."""
+    def load_shared(self) -> bool:
+        """Read-through: take the catalog another process already crawled. Returns True if there was one."""
+        if self.shared is None:
+            return False
+        try:
+            catalog = self.shared.catalog()
+            movies = self.shared.movies(catalog["ids"]) if catalog else []
+        except Exception as e:
+            print(f"Shared cache read failed ({e})")
+            return False
+        if not movies:
+            return False
+        self.publish(Dataset(movies, charts=catalog.get("charts")))
+        self.generation = max([self.generation, catalog["generation"]] + [m.get("generation", 0) for m in movies])
+        self._shared_catalog = catalog.get("id")
+        print(f"Loaded {len(movies)} movies from the shared cache")
+        return True
+    
+    def sync_shared(self) -> Optional[List[dict]]:
+        """Apply a newer catalog another process pushed; None if there's nothing new."""
+        catalog = self.shared.catalog() if self.shared else None
+        if not catalog or catalog.get("id") == self._shared_catalog:
+            return None
+        fresh = IMDbMovieCrawler()
+        fresh.shared = self.shared
+        if not fresh.load_shared():
+            return None
+        events = self.apply_dataset(fresh.movies, fresh.charts)
+        self._shared_catalog = fresh._shared_catalog
+        self.save_cache(push=False)  # this host's other workers reload from the file
+        return events
+    
+    def save_cache(self, push: bool = True):
+        """Persist movies list to disk so next restart is instant (and to the shared cache, push=True).
+        Atomic: a crash mid-write leaves the previous file, never a truncated one. A file someone
+        else wrote since we last read or wrote it (crawl.py while the server runs, or the reverse)
+        is merged in first, not overwritten.
+        """
+        with self._dirty_lock:
+            changed, self._dirty_ids = len(self._dirty_ids), set()
         try:
-            with open(CACHE_FILE, "w", encoding="utf-8") as f:
-                json.dump({"version": CACHE_VERSION, "movies": self.movies}, f,
-                          ensure_ascii=False, indent=2)
-            print(f"Cache saved {CACHE_FILE}")
+            with self._save_lock, write_lock(CACHE_FILE):
+                on_disk = read_json_verified(CACHE_FILE) if self.cache_checksum and os.path.exists(CACHE_FILE) else None
+                if on_disk is not None and on_disk.get("checksum") != self.cache_checksum:
+                    print(f"{CACHE_FILE} changed since we read it, merging it in before saving")
+                    self.reload_from_cache()
+                data = self.snapshot()
+                self.cache_checksum = write_json_atomic(
+                    CACHE_FILE, {"version": CACHE_VERSION, "movies": list(data.movies),
+                                 "charts": {name: list(ids) for name, ids in data.charts.items()}})
+            print(f"Cache saved {CACHE_FILE}" + (f" ({changed} changed records)" if changed else ""))
         except Exception as e:
             print(f"Could not save cache: {e}")
+        if push and self.shared is not None:
+            self._shared_catalog = self.shared.put_catalog(self.movies, self.charts, self.generation)
+    
+    # read-only views of the current snapshot; a request that needs several of them
+    # consistently should take `data = crawler.snapshot()` once instead
+    movies         = property(lambda self: self.data.movies)
+    movies_dict    = property(lambda self: self.data.movies_dict)
+    detail_docs    = property(lambda self: self.data.detail_docs)
+    search_index   = property(lambda self: self.data.search_index)
+    suggest_index  = property(lambda self: self.data.suggest_index)
+    people_index   = property(lambda self: self.data.people_index)
+    similar_movies = property(lambda self: self.data.similar_movies)
+    facet_index    = property(lambda self: self.data.facet_index)
+    release_index  = property(lambda self: self.data.release_index)
+    top_rated      = property(lambda self: self.data.top_rated)
+    charts         = property(lambda self: self.data.charts)
+    
+    def snapshot(self) -> Dataset:
+        return self.data
+    
+    def publish(self, data: Dataset):
+        """Make `data` the current snapshot, one reference swap.
+        A writer that derives `data` from the current snapshot takes _publish_lock around both.
+        """
+        with self._publish_lock:
+            self.data = data
+    
+    def build_indexes(self):
+        """(Re)build the lookup indexes once the movie list and details are loaded."""
+        with self._publish_lock:
+            self.publish(Dataset.build(self.data.movies, self.data.charts))
+    
+    def publish_movie(self, movie: dict, groups: Optional[List[str]] = None) -> dict:
+        """Publish a changed copy of one record: new generation stamp, re-rendered detail doc.
+        groups= (a detail fetch) only takes those field groups from `movie` and merges them onto the
+        record as the snapshot has it at publish time: a dataset swapped in while the page was being
+        fetched keeps its rank / rating, and a title it dropped isn't put back (`movie` is returned
+        unpublished). Returns the record as published.
+        """
+        entry = {"movie": movie, "groups": groups}
+        # group commit: whoever gets the lock publishes everything queued meanwhile in one copy,
+        # so a warm-up batch finishing 20 records at once doesn't copy the catalog 20 times
+        with self._unpublished_lock:
+            self._unpublished.append(entry)
+        with self._publish_lock:
+            with self._unpublished_lock:
+                batch, self._unpublished = self._unpublished, []
+            if batch:
+                self._publish_batch(batch)
+        if entry.get("published") is None:
+            return movie
+        movie = entry["published"]
+        if self.shared is not None:
+            self.shared.put_movie(movie, entry["doc"])  # write-behind, other processes read it through
+        self.mark_cache_dirty(movie.get('id'))
+        if self.images is not None:
+            self.images.prefetch_later([movie])  # headshots only exist once the details are in
+        return movie
+    
+    def _publish_batch(self, batch: List[dict]):
+        """publish_movie's part under _publish_lock: merge, stamp, render, one with_movies copy."""
+        published = {}  # id -> record already published by this batch, a later entry merges onto it
+        changes = []
+        for entry in batch:
+            movie, groups = entry["movie"], entry["groups"]
+            if groups is not None:
+                prev = published.get(movie.get('id')) or self.data.movies_dict.get(movie.get('id'))
+                if prev is None:
+                    continue  # dropped from the catalog since the fetch started
+                movie = merge_groups(prev, movie, groups)
+            self.touch(movie)
+            published[movie['id']] = entry["published"] = movie
+            entry["doc"] = render_detail_doc(movie) if movie.get('details_fetched') else None
+            changes.append((movie, entry["doc"]))
+        if changes:
+            self.publish(self.data.with_movies(changes))
+    
+    def mark_cache_dirty(self, movie_id: str):
+        """Queue a record for the write-behind thread; the caller (a request) never waits on disk."""
+        if not self.cache_flush_interval:
+            return
+        with self._dirty_lock:
+            self._dirty_ids.add(movie_id)
+            if self._writer_pid != os.getpid():
+                # first change in this process (or after a fork): the parent's thread isn't here
+                self._writer_pid = os.getpid()
+                threading.Thread(target=self._write_behind, daemon=True).start()
+        self._writer_wake.set()
+    
+    def _write_behind(self):
+        """Save the cache at most every cache_flush_interval seconds while records keep changing."""
+        while True:
+            self._writer_wake.wait()
+            time.sleep(self.cache_flush_interval)  # let a burst of changes pile up into one write
+            self._writer_wake.clear()
+            if self._dirty_ids:
+                self.save_cache(push=False)  # the shared cache has its own write-behind
+    
+    def touch(self, movie: dict):
+        """Stamp a changed record with the next generation number and the time."""
+        with self._generation_lock:
+            self.generation += 1
+            movie['generation'] = self.generation
+        movie['updated_at'] = int(time.time())
+    
+    def export_ndjson(self, since: Optional[int] = None, since_time: Optional[int] = None,
+                      data: Optional[Dataset] = None) -> Iterator[bytes]:
+        """Yield one json line per movie changed after generation `since` / unix time `since_time`.
+        Each line wraps the same pre-rendered detail doc that /movies/<id> serves.
+        data= exports that snapshot instead of the one current when the first line is pulled.
+        """
+        data = data or self.snapshot()
+        for m in data.movies:
+            if since is not None and m.get('generation', 0) <= since:
+                continue
+            if since_time is not None and m.get('updated_at', 0) < since_time:
+                continue
+            doc = data.detail_docs.get(m.get('id')) or render_detail_doc(m)
+            yield (
+                b'{"generation":%d,"updatedAt":%d,"movie":' % (m.get('generation', 0), m.get('updated_at', 0))
+                + doc + b'}\n'
+            )
     
     def fetch_page(self, url: str) -> Optional[str]:
-        """Fetch a web page with error handling"""
-        try:
-            response = requests.get(url, headers=self.headers, timeout=15)
-            response.raise_for_status()
-            return response.text
-        except requests.RequestException as e:
-            print(f"Error fetching {url}: {e}")
-            return None
+        """Fetch a web page with error handling: timeouts, 429 and 5xx are retried RETRIES times
+        with jittered backoff, a host that keeps failing is cut off by its circuit breaker,
+        and nothing is started or retried past self.deadline. None when there's no page.
+        """
+        breaker = self.breaker_for(url)
+        for attempt in range(RETRIES + 1):
+            remaining = self.deadline - time.time() if self.deadline else REQUEST_TIMEOUT
+            if remaining <= 0 or not breaker.allow():
+                return None
+            if self.min_interval > 0:
+                # hand out request slots min_interval apart, then sleep outside the lock until ours comes
+                with self._rate_lock:
+                    slot = max(time.time(), self._next_request)
+                    self._next_request = slot + self.min_interval
+                time.sleep(max(0.0, slot - time.time()))
+            try:
+                response = requests.get(url, headers=self.headers, timeout=min(REQUEST_TIMEOUT, remaining))
+            except requests.RequestException as e:  # timeout, connection refused / reset
+                error = str(e)
+            else:
+                if response.status_code < 400:
+                    breaker.success()
+                    with self._failures_lock:
+                        self.failures.pop(url, None)
+                    return response.text
+                error = f"HTTP {response.status_code}"
+                if response.status_code != 429 and response.status_code < 500:
+                    breaker.success()  # IMDb is fine, that page just isn't there
+                    self.record_failure(url, error)
+                    print(f"Error fetching {url}: {error}")
+                    return None
+            breaker.failure()
+            self.record_failure(url, error)
+            print(f"Error fetching {url} (attempt {attempt + 1}/{RETRIES + 1}): {error}")
+            if attempt < RETRIES:
+                time.sleep(backoff(attempt))
+        return None
+    
+    def breaker_for(self, url: str) -> CircuitBreaker:
+        host = urlsplit(url).netloc
+        with self._breakers_lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker()
+            return self.breakers[host]
+    
+    def record_failure(self, url: str, error: str):
+        """Failure ledger entry, cleared by the next successful fetch of the url.
+        Kept in the order the urls last failed, so the oldest one goes when it's full.
+        """
+        with self._failures_lock:
+            entry = self.failures.pop(url, None) or {"count": 0}
+            self.failures[url] = {"count": entry["count"] + 1, "error": error, "at": int(time.time())}
+            while len(self.failures) > FAILURES_KEPT:
+                del self.failures[next(iter(self.failures))]
+    
+    def upstream_status(self) -> dict:
+        """Breaker state per host and the urls that are currently failing, most recent first."""
+        with self._failures_lock:
+            failing = list(self.failures.items())[::-1]  # most recent first
+        return {
+            "breakers": {host: b.status() for host, b in list(self.breakers.items())},
+            "failing":  len(failing),
+            "recent":   [{"url": url, **entry} for url, entry in failing[:20]],
+        }
     
     def extract_movie_id(self, url: str) -> Optional[str]:
         """Extract IMDb movie ID from URL
@@ -74,6 +373,16 @@ class IMDbMovieCrawler:
         match = re.search(r'\b(19\d{2}|20\d{2})\b', text) #<-- this is regular lang
         return int(match.group(1)) if match else None
 
+    def parse_release_date(self, text: str) -> Optional[str]:
+        """'October 14, 1994' or '14 October 1994' → '1994-10-14'"""
+        text = re.sub(r',', '', text or '').strip() #<-- this is regular lang
+        for fmt in ('%B %d %Y', '%d %B %Y', '%b %d %Y', '%d %b %Y'):
+            try:
+                return datetime.strptime(text, fmt).date().isoformat()
+            except ValueError:
+                continue
+        return None
+    
     def extract_runtime_minutes(self, text: str) -> Optional[int]:
         """Convert '2 hours 22 minutes' or '142 minutes' or '2h 22m' → int minutes.
         Uses multiple named-group patterns to handle varied IMDb formats.
@@ -175,15 +484,95 @@ class IMDbMovieCrawler:
             return 'NR'
         return cert
     
-    def fetch_top_movies(self):
-        """Fetch IMDb Top 150 movies list"""
-        if self.load_cache(): #<-- this is for cache 
+    def fetch_top_movies(self, use_cache: bool = True, charts: Optional[List[str]] = None):
+        """Fetch IMDb Top 150 movies list (plus any other charts in self.chart_names)"""
+        if use_cache and (self.load_shared() or self.load_cache()): #<-- this is for cache 
+            if self.shared is not None and self._shared_catalog is None:
+                # first one up with a local cache seeds the shared one
+                self._shared_catalog = self.shared.put_catalog(self.movies, self.charts, self.generation)
             return True
-        
-        print("Fetching IMDb Top 150 movies...")
-        html = self.fetch_page(self.url)
-        if not html:
+        if use_cache and not self.holds_crawl_lease() and self.wait_for_shared():
+            return True  # another process crawled it for us
+        return self.fetch_charts(charts or self.chart_names)
+    
+    def holds_crawl_lease(self) -> bool:
+        """True without a shared cache; with one, only one process in the fleet crawls at a time."""
+        return self.shared is None or self.shared.try_lease("crawl", CRAWL_LEASE)
+    
+    def renew_crawl_lease(self) -> threading.Event:
+        """Keep the crawl lease ours while a crawl runs, however long it takes: renewed every
+        CRAWL_LEASE / 3 seconds until the caller sets the returned event.
+        """
+        done = threading.Event()
+        def renew():
+            while not done.wait(CRAWL_LEASE / 3):
+                try:
+                    if not self.shared.try_lease("crawl", CRAWL_LEASE):
+                        print("Lost the crawl lease to another process")
+                except Exception as e:
+                    print(f"Renewing the crawl lease failed ({e})")
+        if self.shared is not None:
+            threading.Thread(target=renew, daemon=True).start()
+        return done
+    
+    def shared_catalog_age(self) -> Optional[float]:
+        """Seconds since some process in the fleet last pushed a catalog, None without one."""
+        try:
+            catalog = self.shared.catalog() if self.shared else None
+        except Exception as e:
+            print(f"Shared cache read failed ({e})")
+            return None
+        return time.time() - catalog["saved_at"] if catalog and catalog.get("saved_at") else None
+    
+    def wait_for_shared(self, poll: float = 1.0) -> bool:
+        """Wait (until self.deadline, or a lease length) for the crawling process to publish its catalog."""
+        until = self.deadline or time.time() + CRAWL_LEASE
+        print("Another process is crawling, waiting for the shared cache...")
+        while time.time() < until:
+            if self.load_shared():
+                return True
+            time.sleep(poll)
+        return False
+    
+    def fetch_charts(self, names: List[str]) -> bool:
+        """Crawl several charts into one dataset: a title on more than one chart is stored
+        (and later detail-fetched) once, each chart only keeps its ranked ids.
+        """
+        movies, seen, charts = [], set(), {}
+        for name in names:
+            records = self.fetch_chart(name)
+            if not records:
+                continue
+            ids = []
+            for m in records:
+                if not m.get('id') or m['id'] in ids:
+                    continue
+                ids.append(m['id'])
+                if m['id'] in seen:
+                    continue  # already have it from an earlier chart
+                if charts:
+                    m.pop('rank', None)  # `rank` is the primary chart's, other positions live in charts
+                seen.add(m['id'])
+                movies.append(m)
+            charts[name] = ids
+        if not movies:
             return False
+        self.publish(Dataset(movies, charts=charts))
+        if self.images is not None:
+            self.images.prefetch_later(movies)  # posters of new entrants, cached ones are skipped
+        if self.shared is not None:
+            # the chart right away, processes waiting on us can serve it while we fetch the details
+            self._shared_catalog = self.shared.put_catalog(movies, charts, self.generation)
+        print(f"{len(movies)} titles on {len(charts)} chart(s): "
+              + ", ".join(f"{name} {len(ids)}" for name, ids in charts.items()) + "\n")
+        return True
+    
+    def fetch_chart(self, name: str) -> List[dict]:
+        """Basic records (rank, title, url, poster, rating, year) of one chart in CHARTS."""
+        print(f"Fetching IMDb chart '{name}'...")
+        html = self.fetch_page(CHARTS[name])
+        if not html:
+            return []
         
         soup = BeautifulSoup(html, 'html.parser')
         
@@ -193,20 +582,19 @@ class IMDbMovieCrawler:
             try:
                 data = json.loads(script.string)
                 if isinstance(data, dict) and 'itemListElement' in data:
-                    self._extract_from_json(data)
-                    return True
+                    return self._extract_from_json(data)[:CHART_LIMIT]
             except Exception:
                 continue
         
         # Fallback to HTML parsing
-        self._extract_from_html(soup)
-        return len(self.movies) > 0
+        return self._extract_from_html(soup)[:CHART_LIMIT]
     
-    def _extract_from_json(self, data: dict):
+    def _extract_from_json(self, data: dict) -> List[dict]:
         """Extract movies from JSON-LD structured data"""
         print("Found JSON-LD data. Extracting basic info...")
         
         items = data.get('itemListElement', [])
+        movies = []
         
         for item in items:
             try:
@@ -236,23 +624,22 @@ class IMDbMovieCrawler:
                     if year:
                         movie_data['year'] = year
                 
-                self.movies.append(movie_data)
-                if movie_data.get('id'):
-                    self.movies_dict[movie_data['id']] = movie_data
+                self.touch(movie_data)
+                movies.append(movie_data)
                 
             except Exception as e:
                 print(f"Error parsing movie: {e}")
                 continue
         
-        self.movies = self.movies[:150]
-        self.movies_dict = {m['id']: m for m in self.movies if m.get('id')}
-        print(f"Extracted {len(self.movies)} movies\n")
+        print(f"Extracted {len(movies)} movies")
+        return movies
     
-    def _extract_from_html(self, soup: BeautifulSoup):
+    def _extract_from_html(self, soup: BeautifulSoup) -> List[dict]:
         """Fallback HTML extraction method"""
         movie_items = soup.find_all('li', class_=re.compile(r'ipc-metadata-list-summary-item'))
         
         print(f"Found {len(movie_items)} movie items. Extracting...\n")
+        movies = []
         
         for idx, item in enumerate(movie_items, 1):
             try:
@@ -283,30 +670,161 @@ class IMDbMovieCrawler:
                         movie_data['rating'] = float(rm.group(1))
                 
                 if 'title' in movie_data:
-                    self.movies.append(movie_data)
-                    if movie_data.get('id'):
-                        self.movies_dict[movie_data['id']] = movie_data
+                    self.touch(movie_data)
+                    movies.append(movie_data)
                     
             except Exception as e:
                 print(f"Error parsing movie {idx}: {e}")
                 continue
         
-        self.movies = self.movies[:150]
-        self.movies_dict = {m['id']: m for m in self.movies if m.get('id')}
-        print(f"Extracted {len(self.movies)} movies\n")
+        print(f"Extracted {len(movies)} movies")
+        return movies
+    
+    def get_movie_details(self, movie: dict, force: bool = False, groups: Optional[List[str]] = None) -> dict:
+        """fetch_movie_details, but concurrent callers for one movie share a single fetch
+        and a failed fetch isn't retried for NEGATIVE_TTL seconds.
+        groups= limits it to the field groups the caller needs (default all of them).
+        force=True re-fetches a movie that already has (possibly stale) details.
+        """
+        movie_id = movie.get('id')
+        movie = self.movies_dict.get(movie_id, movie)  # the caller's copy may be from an older snapshot
+        if force:
+            movie = dict(movie, details_fetched=False, groups=[])
+        elif not missing_groups(movie, groups) or self.fetch_failed_recently(movie_id):
+            return movie
+        
+        with self._inflight_lock:
+            future = self._inflight.get(movie_id)
+            owner = future is None
+            if owner:
+                future = self._inflight[movie_id] = Future()
+        if not owner:
+            # somebody else is already downloading it, maybe for other groups than ours
+            movie = future.result()
+            return self.get_movie_details(movie, groups=groups) if missing_groups(movie, groups) else movie
+        
+        try:
+            movie = (None if force else self.read_through(movie, groups)) or self.fetch_movie_details(movie, groups)
+            if missing_groups(movie, groups):
+                self.mark_fetch_failed(movie_id)
+            future.set_result(movie)
+            return movie
+        except Exception as e:
+            self.mark_fetch_failed(movie_id)
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(movie_id, None)
+    
+    def read_through(self, movie: dict, groups: Optional[List[str]] = None) -> Optional[dict]:
+        """The record from the shared cache if another process already fetched the groups we need."""
+        if self.shared is None:
+            return None
+        try:
+            shared, doc = self.shared.movie_and_doc(movie['id'])
+            if shared is None or missing_groups(shared, groups):
+                return None
+        except Exception as e:
+            print(f"Shared cache read failed ({e})")
+            return None
+        if shared.get('details_fetched') and doc is None:
+            doc = render_detail_doc(shared)
+        with self._publish_lock:
+            self.publish(self.data.with_movie(shared, doc))  # as is, with the generation its writer gave it
+        with self._generation_lock:
+            self.generation = max(self.generation, shared.get('generation', 0))
+        return shared
+    
+    def request_details(self, movie: dict, priority: int = BACKGROUND) -> Future:
+        """Queue a detail fetch on the scheduler (or move a queued one up); resolves to the movie.
+        A process that doesn't crawl only waits for the ones someone waits on, the rest it just hands off.
+        """
+        if not self.crawls_details and priority != INTERACTIVE:
+            self.hand_off(movie['id'], priority)
+            future = Future()
+            future.set_result(movie)
+            return future
+        return self.scheduler.submit(movie, self.get_movie_details, priority, self.job_key(movie['id']))
+    
+    def hand_off(self, movie_id: str, priority: int):
+        """Ask the crawling process for a title's details, it picks it up in serve_hand_offs."""
+        try:
+            self.shared.want_details(movie_id, priority)
+        except Exception as e:
+            print(f"Handing {movie_id} to the crawler failed ({e})")
+    
+    def wait_for_crawler(self, movie: dict, groups: Optional[List[str]] = None) -> dict:
+        """fetch_movie_details of a process that doesn't crawl: hand the fetch off and poll the
+        shared cache until the record shows up there, as we have it after HANDOFF_WAIT.
+        """
+        self.hand_off(movie['id'], INTERACTIVE)
+        give_up = time.time() + HANDOFF_WAIT
+        while time.time() < give_up:
+            time.sleep(HANDOFF_POLL)
+            shared = self.read_through(movie, groups)
+            if shared is not None:
+                return shared
+        return movie
+    
+    def serve_hand_offs(self) -> int:
+        """Crawling side: queue the detail fetches other processes handed us; returns how many."""
+        wanted = self.shared.wanted()
+        for want in wanted:
+            movie = self.movies_dict.get(want.get('id'))
+            if movie is not None:
+                self.request_details(movie, want.get('priority', BACKGROUND))
+        return len(wanted)
+    
+    def job_key(self, movie_id: str, groups: Optional[List[str]] = None):
+        """Scheduler key of our fetches: refresh() shares the scheduler with a fresh crawler,
+        a get_movie here must not get (and publish) the result of the fresh one's job, or the reverse.
+        The groups are part of it too, a genres-only job in flight doesn't answer a full-detail request.
+        """
+        return id(self), movie_id, tuple(sorted(groups or ALL_GROUPS))
+    
+    def fetch_failed_recently(self, movie_id: str) -> bool:
+        return self._failed_until.get(movie_id, 0) > time.time()
+    
+    def mark_fetch_failed(self, movie_id: str):
+        self._failed_until[movie_id] = time.time() + NEGATIVE_TTL
     
     # this is fetch for detail page
-    def fetch_movie_details(self, movie: dict) -> dict:
-        """Fetch detailed information for a specific movie"""
-        if not movie.get('url') or movie.get('details_fetched'):
+    def fetch_movie_details(self, movie: dict, groups: Optional[List[str]] = None) -> dict:
+        """Fetch detailed information for a specific movie, only the missing `groups` are parsed"""
+        missing = missing_groups(movie, groups)
+        if not movie.get('url') or not missing:
             return movie
+        if not self.crawls_details:
+            return self.wait_for_crawler(movie, missing)
 
         html = self.fetch_page(movie['url'])
         if not html:
             return movie
 
-        soup = BeautifulSoup(html, 'html.parser')
-        
+        movie = self.parse_movie_details(movie, html, missing)
+        time.sleep(0.3)   # <--delay
+        return movie
+    
+    def parse_movie_details(self, movie: dict, html: str, groups: Optional[List[str]] = None) -> dict:
+        """Fill a movie from its title page html, split out so asgi.py can download it asynchronously.
+        Only the field `groups` asked for are parsed (default all), from just their page sections.
+        Works on a copy and publishes it, readers never see a half-filled record.
+        """
+        movie = dict(movie)
+        wanted = [g for g in ALL_GROUPS if groups is None or g in groups]
+        if len(wanted) == len(ALL_GROUPS):
+            soup = BeautifulSoup(html, 'html.parser')
+        else:
+            soup = BeautifulSoup(html, 'html.parser', parse_only=section_strainer(wanted))
+        
+        for group in wanted:
+            getattr(self, f'_parse_{group}')(movie, soup)
+        
+        # only the parsed groups go onto the record, the chart fields stay whatever the snapshot has by then
+        return self.publish_movie(movie, wanted)
+    
+    def _parse_core(self, movie: dict, soup: BeautifulSoup):
         # Extract year
         if not movie.get('year'):
             year_elem = soup.select_one('[data-testid="hero-title-block__metadata"] a')
@@ -315,6 +833,51 @@ class IMDbMovieCrawler:
                 if y:
                     movie['year'] = y
         
+        # Extract runtime
+        runtime_elem = soup.select_one(
+            '[data-testid="title-techspec_runtime"] .ipc-metadata-list-item__list-content-item'
+        )
+        if runtime_elem:
+            raw_rt = runtime_elem.get_text(strip=True)
+            movie['runtime'] = raw_rt
+            mins = self.extract_runtime_minutes(raw_rt)
+            if mins:
+                movie['runtime_minutes'] = mins
+        
+        # Extract release date
+        rel_elem = soup.select_one(
+            '[data-testid="title-details-releasedate"] .ipc-metadata-list-item__list-content-item'
+        )
+        if rel_elem:
+            raw_date = rel_elem.get_text(strip=True)
+            movie['release_date'] = raw_date
+            date_m = re.search(
+                r'(\d{1,2}\s+\w+\s+\d{4}|\w+\s+\d{1,2},?\s+\d{4})',
+                raw_date
+            ) #re: extract clean date dd mm yy
+            if date_m:
+                movie['release_date_clean'] = date_m.group(1)
+                movie['release_date_iso'] = self.parse_release_date(date_m.group(1))
+            if not movie.get('year'):
+                y = self.extract_year(raw_date)
+                if y:
+                    movie['year'] = y
+        
+        # Extract rating certificate 
+        cert_elem = soup.select_one(
+            '[data-testid="title-details-certificate"] .ipc-metadata-list-item__list-content-item'
+        )
+        if cert_elem:
+            movie['certificate'] = self.normalize_certificate(cert_elem.get_text(strip=True))
+        
+        # Extract Metascore
+        meta_elem = soup.select_one('[data-testid="meta-score-box"]')
+        if meta_elem:
+            sm = re.search(r'(\d+)', meta_elem.get_text(strip=True)) #<-- here also regular lang
+            if sm:
+                movie['metascore'] = int(sm.group(1))
+    
+    def _parse_genres(self, movie: dict, soup: BeautifulSoup):
         # Extract genres
         genres = []
         for chip in soup.select('a.ipc-chip span.ipc-chip__text')[:10]:
@@ -351,6 +914,8 @@ class IMDbMovieCrawler:
                 detected = self.extract_language_from_text(movie['plot'])
                 if detected:
                     movie['language'] = detected
+    
+    def _parse_credits(self, movie: dict, soup: BeautifulSoup):
         # Extract director
         directors = []
         dir_section = soup.select_one('[data-testid="title-pc-principal-credit"]')
@@ -388,36 +953,8 @@ class IMDbMovieCrawler:
 
         if cast:
             movie['cast'] = cast
-        
-        # Extract runtime
-        runtime_elem = soup.select_one(
-            '[data-testid="title-techspec_runtime"] .ipc-metadata-list-item__list-content-item'
-        )
-        if runtime_elem:
-            raw_rt = runtime_elem.get_text(strip=True)
-            movie['runtime'] = raw_rt
-            mins = self.extract_runtime_minutes(raw_rt)
-            if mins:
-                movie['runtime_minutes'] = mins
-        
-        # Extract release date
-        rel_elem = soup.select_one(
-            '[data-testid="title-details-releasedate"] .ipc-metadata-list-item__list-content-item'
-        )
-        if rel_elem:
-            raw_date = rel_elem.get_text(strip=True)
-            movie['release_date'] = raw_date
-            date_m = re.search(
-                r'(\d{1,2}\s+\w+\s+\d{4}|\w+\s+\d{1,2},?\s+\d{4})',
-                raw_date
-            ) #re: extract clean date dd mm yy
-            if date_m:
-                movie['release_date_clean'] = date_m.group(1)
-            if not movie.get('year'):
-                y = self.extract_year(raw_date)
-                if y:
-                    movie['year'] = y
-        
+    
+    def _parse_boxoffice(self, movie: dict, soup: BeautifulSoup):
         # Extract budget
         budget_elem = soup.select_one(
             '[data-testid="title-boxoffice-budget"] .ipc-metadata-list-item__list-content-item'
@@ -440,21 +977,8 @@ class IMDbMovieCrawler:
             amt = self.extract_money_usd(raw_bo)
             if amt:
                 movie['box_office_usd'] = amt
-        
-        # Extract rating certificate 
-        cert_elem = soup.select_one(
-            '[data-testid="title-details-certificate"] .ipc-metadata-list-item__list-content-item'
-        )
-        if cert_elem:
-            movie['certificate'] = self.normalize_certificate(cert_elem.get_text(strip=True))
-        
-        # Extract Metascore
-        meta_elem = soup.select_one('[data-testid="meta-score-box"]')
-        if meta_elem:
-            sm = re.search(r'(\d+)', meta_elem.get_text(strip=True)) #<-- here also regular lang
-            if sm:
-                movie['metascore'] = int(sm.group(1))
-        
+    
+    def _parse_awards(self, movie: dict, soup: BeautifulSoup):
         # Extract awards
         awards_elem = soup.select_one('[data-testid="award_information"]')
         if awards_elem:
@@ -467,46 +991,166 @@ class IMDbMovieCrawler:
                 movie['total_wins'] = int(wins_m.group(1))
             if noms_m:
                 movie['total_nominations'] = int(noms_m.group(1))
-
-        movie['details_fetched'] = True
-        time.sleep(0.3)   # <--delay
-        return movie
     
-    def fetch_movies_details_parallel(self, movies: List[dict], max_workers: int = 10) -> None:
-        """Fetch details for multiple movies in parallel using multithreading"""
-        movies_to_fetch = [m for m in movies if not m.get('details_fetched')]
+    def fetch_movies_details_parallel(self, movies: List[dict], max_workers: int = 10,
+                                      groups: Optional[List[str]] = None,
+                                      deadline: Optional[float] = None,
+                                      record_history: bool = False) -> List[dict]:
+        """Fetch details for multiple movies in parallel using multithreading, groups= as in get_movie_details.
+        With a deadline (unix time) it stops waiting then and saves what it has; the rest stay queued on
+        the scheduler and the cache is saved again once they are done. Returns the movies still missing details.
+        record_history=True for a crawl of the chart (warm-up, refresh), not for a few movies' genres.
+        """
+        movies_to_fetch = [m for m in movies if missing_groups(m, groups)]
         
         if not movies_to_fetch:
-            return
+            return []
         
         total = len(movies_to_fetch)
         print(f"\nFetching details for {total} movies using {max_workers} parallel threads...")
         
+        # background priority: get_movie / the grid can still jump ahead while this runs
+        self.scheduler.ensure_workers(max_workers)
+        if groups is None:
+            futures = [self.request_details(movie, BACKGROUND) for movie in movies_to_fetch]
+        else:
+            fetch = lambda m: self.get_movie_details(m, groups=groups)
+            futures = [self.scheduler.submit(movie, fetch, BACKGROUND, self.job_key(movie['id'], groups))
+                       for movie in movies_to_fetch]
+        
         completed = 0
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all tasks
-            future_to_movie = {executor.submit(self.fetch_movie_details, movie): movie for movie in movies_to_fetch}
-            
-            # Process results as they complete
-            for future in as_completed(future_to_movie):
+        timeout = max(0.0, deadline - time.time()) if deadline else None
+        try:
+            for future in as_completed(futures, timeout=timeout):
                 completed += 1
                 if completed % 10 == 0 or completed == total:
                     print(f"Progress: {completed}/{total} movies fetched ({int(completed/total*100)}%)")
+        except FutureTimeout:
+            pending = [f for f in futures if not f.done()]
+            print(f"Deadline reached: {completed}/{total} fetched, {len(pending)} left to the background queue")
+            self._save_when_done(pending)
         
-        print(f"Completed fetching details for {total} movies\n")
+        missing = [m for m in (self.movies_dict.get(m['id'], m) for m in movies_to_fetch) if missing_groups(m, groups)]
+        print(f"Completed fetching details for {total - len(missing)}/{total} movies\n")
         self.save_cache() #<-- save to disk so next run is instant
+        if record_history:
+            self.record_history()
+        return missing
+    
+    def record_history(self):
+        """One time-series sample per title of the primary chart, taken once per chart crawl.
+        Only that chart's titles have a rank the series (and the trending replay) can use.
+        """
+        history.record(self.data.chart_movies())
+    
+    def _save_when_done(self, futures: List[Future]):
+        """Rebuild the indexes and save the cache once the last of `futures` finishes."""
+        left = [len(futures)]
+        lock = threading.Lock()
+        def done(_):
+            with lock:
+                left[0] -= 1
+                last = left[0] == 0
+            if last:
+                self.build_indexes()
+                self.save_cache()
+        for future in futures:
+            future.add_done_callback(done)
+    
+    def refresh(self, max_workers: int = 20, interval: float = 0) -> List[dict]:
+        """Re-crawl the chart and details, swap the new dataset in and log what changed.
+        With a shared cache only the holder of the crawl lease crawls, the rest pick up its catalog,
+        and nobody crawls while the fleet's catalog is younger than `interval` (every host refreshes
+        on its own timer, the lease alone would let each of them crawl once per interval).
+        """
+        age = self.shared_catalog_age()
+        if (age is not None and age < interval) or not self.holds_crawl_lease():
+            return self.sync_shared() or []
+        renewing = self.renew_crawl_lease()
+        try:
+            return self._refresh(max_workers)
+        finally:
+            renewing.set()
+    
+    def _refresh(self, max_workers: int) -> List[dict]:
+        fresh = IMDbMovieCrawler()
+        fresh.generation = self.generation
+        fresh.scheduler = self.scheduler  # same worker threads, user requests still go first
+        # and the same view of IMDb's health, with the locks that go with it
+        fresh.breakers, fresh._breakers_lock = self.breakers, self._breakers_lock
+        fresh.failures, fresh._failures_lock = self.failures, self._failures_lock
+        if not fresh.fetch_top_movies(use_cache=False, charts=self.chart_names):
+            return []
+        fresh.fetch_movies_details_parallel(fresh.movies, max_workers=max_workers, record_history=True)
+        events = self.apply_dataset(fresh.movies, fresh.charts)
+        self.save_cache()
+        print(f"Refresh done: {len(events)} changes")
+        return events
+    
+    def reload_from_cache(self) -> Optional[List[dict]]:
+        """Pick up a dataset another process crawled and saved; None if the cache can't be read yet.
+        Our own write (same checksum) is skipped. Details we have that the file doesn't, or that we
+        fetched after the file's copy of the record was written, go onto the file's record: the
+        chart fields are always the file's.
+        """
+        fresh = IMDbMovieCrawler()
+        if not fresh.load_cache():
+            return None
+        if fresh.cache_checksum is not None and fresh.cache_checksum == self.cache_checksum:
+            return []
+        current = self.movies_dict
+        movies = []
+        for m in fresh.movies:
+            mine = current.get(m.get('id'))
+            if mine is not None:
+                newer = mine.get('updated_at', 0) > m.get('updated_at', 0)
+                take = groups_of(mine) if newer else groups_of(mine) - groups_of(m)
+                if take:
+                    m = merge_groups(m, mine, [g for g in ALL_GROUPS if g in take])
+            movies.append(m)
+        events = self.apply_dataset(movies, fresh.charts)
+        self.cache_checksum = fresh.cache_checksum
+        return events
+    
+    def apply_dataset(self, movies: List[dict], charts: Optional[Dict[str, List[str]]] = None) -> List[dict]:
+        """Swap in a new movie list: log the changes, update trending, rebuild the indexes.
+        The change feed and trending follow the primary chart.
+        """
+        old_generation = self.generation
+        # diffed against, built from and swapped for one snapshot: a publish_movie waits until
+        # we're done instead of landing in between and being dropped from both
+        with self._publish_lock:
+            # unchanged records keep their generation, so export ?since= only returns real changes
+            volatile = ('generation', 'updated_at')
+            kept = []
+            for m in movies:
+                prev = self.movies_dict.get(m.get('id'))
+                if prev and all(prev.get(k) == v for k, v in m.items() if k not in volatile):
+                    m = dict(m, generation=prev.get('generation', 0), updated_at=prev.get('updated_at', 0))
+                kept.append(m)
+            new = Dataset.build(kept, charts)
+            
+            events = diff_datasets(self.data.chart_movies(), new.chart_movies())
+            self.change_log.append(events)
+            self.trending.update(rank_snapshot(new.chart_movies()))
+            self.publish(new)
+        self.generation = max([self.generation] + [m.get('generation', 0) for m in movies])
+        if self.images is not None:
+            self.images.prefetch_later(m for m in kept if m.get('generation', 0) > old_generation)
+        return events
     
     def filter_movies(self, filters: dict) -> List[dict]:
         """Filter movies based on user criteria"""
-        filtered = self.movies.copy()
+        filtered = list(self.movies)
         
         # Filter by genres using regex
         if filters.get('genres'):
             target_genres = filters['genres']
             genre_pattern = re.compile(r'\b(' + '|'.join(target_genres) + r')\b', re.IGNORECASE)
             
-            # Fetch details in parallel for genre filtering
-            self.fetch_movies_details_parallel(filtered, max_workers=15)
+            # genres only: the title page is parsed just for its genre / country sections
+            self.fetch_movies_details_parallel(filtered, max_workers=15, groups=['genres'])
+            filtered = [self.movies_dict.get(m.get('id'), m) for m in filtered]  # the filled-in copies
             
             filtered = [
                 m for m in filtered 
@@ -564,10 +1208,11 @@ class IMDbMovieCrawler:
         # Sort alphabetically
         sorted_movies = self.sort_alphabetically(movies)
         
-        # Fetch missing country info in parallel if needed
-        movies_needing_country = [m for m in sorted_movies if not m.get('country') and not m.get('details_fetched')]
+        # Fetch missing country info in parallel if needed, nothing else off the title page
+        movies_needing_country = [m for m in sorted_movies if not m.get('country') and missing_groups(m, ['genres'])]
         if movies_needing_country:
-            self.fetch_movies_details_parallel(movies_needing_country, max_workers=10)
+            self.fetch_movies_details_parallel(movies_needing_country, max_workers=10, groups=['genres'])
+            sorted_movies = [self.movies_dict.get(m.get('id'), m) for m in sorted_movies]
         
         print("\n{'='*88}")
         print(f"{'FILTERED MOVIES (A-Z)':^88}")
@@ -575,10 +1220,6 @@ class IMDbMovieCrawler:
         print(f"Found {len(sorted_movies)} movie(s)\n")
         
         for idx, movie in enumerate(sorted_movies, 1):
-            # Ensure country is fetched
-            if not movie.get('country') and not movie.get('details_fetched'):
-                self.fetch_movie_details(movie)
-            
             print(f"{idx}. {movie.get('title', 'N/A')}")
             print(f"ID: {movie.get('id', 'N/A')}")
             print(f"Country: {movie.get('country', 'N/A')}")
@@ -678,20 +1319,23 @@ class IMDbMovieCrawler:
         return self.movies_dict.get(movie_id)
     
     def search_by_name(self, search_term: str) -> List[dict]:
-        """Search movies by name using regex pattern matching"""
+        """Typo-tolerant search over titles, directors and cast, best match first"""
         if not search_term:
             return []
         
-        # Create case-insensitive regex pattern
+        if self.search_index is None:
+            self.build_indexes()
+        
+        # Exact substring hits inside a word (e.g. 'odfath') have no padded trigrams, keep the regex too
         pattern = re.compile(re.escape(search_term), re.IGNORECASE)
+        ranked = dict(self.search_index.search(search_term))
         
-        # Search through all movies
         matches = []
         for movie in self.movies:
-            title = movie.get('title', '')
-            if pattern.search(title):
+            if movie.get('id') in ranked or pattern.search(movie.get('title', '')):
                 matches.append(movie)
         
+        matches.sort(key=lambda m: ranked.get(m.get('id'), 0), reverse=True)
         return matches
     
     def get_user_filters(self) -> dict:
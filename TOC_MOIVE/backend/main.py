@@ -1,119 +1,171 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
-from imdb_movie_crawler import IMDbMovieCrawler
+from imdb_movie_crawler import CACHE_VERSION, CHARTS, IMDbMovieCrawler
+from change_feed import CHANGES_DB, ChangeLog
+from dataset import Dataset
+from image_cache import images
+from avatars import avatar_svg
+from formatters import format_movie_brief, render_detail_doc
+from json_provider import FastJSONProvider
+from history_store import history
+from crawl_scheduler import INTERACTIVE, VISIBLE
+from shared_cache import open_shared
+import os
 import threading
+import time
+import zlib
 
 # we need to set up the crawler and fetch movies before we can serve them through the API
 app = Flask(__name__)
+app.json = FastJSONProvider(app)   # orjson when installed, stdlib json otherwise
 CORS(app)
 
 #only crawl imdb once per server run
 _cache_lock   = threading.Lock()
 _crawler_cache: IMDbMovieCrawler | None = None
 
-def get_crawler() -> IMDbMovieCrawler:
-    """Return a fully-initialised crawler, fetching from IMDb only on first call."""
+# seconds between background re-crawls of the chart (0 = never, data stays as loaded)
+REFRESH_INTERVAL = int(os.environ.get("REFRESH_INTERVAL", "0"))
+# movies on the first screen of the grid, their details are crawled with VISIBLE priority
+GRID_PAGE = 24
+# seconds get_movie waits for an on-demand detail fetch before answering with what it has
+DETAIL_TIMEOUT = 20
+# crawls older than this are replayed into the trending scores on start-up (they've decayed away anyway)
+TRENDING_WINDOW = 30 * 86400
+# seconds a cold start waits for the chart and the detail warm-up before serving what it has,
+# the unfinished details keep crawling in the background (bounds start-up when IMDb is slow)
+STARTUP_DEADLINE = int(os.environ.get("STARTUP_DEADLINE", "60"))
+# cache shared by every backend process, so a fleet crawls IMDb once:
+# sqlite:///shared_cache.db (one host), redis://host:6379/0 (many hosts), unset = each process on its own
+shared = open_shared(os.environ.get("SHARED_CACHE"), CACHE_VERSION)
+# seconds between checks for a catalog another process pushed to the shared cache
+SHARED_SYNC = 10
+# seconds the write-behind thread lets detail fetches pile up before rewriting movies_cache.json, 0 = off
+CACHE_WRITE_BEHIND = float(os.environ.get("CACHE_WRITE_BEHIND", "5"))
+# IMDb charts to crawl, comma separated names from CHARTS; the first one is what /movies shows by default
+CHART_NAMES = [n.strip() for n in os.environ.get("CHARTS", "top").split(",") if n.strip() in CHARTS] or ["top"]
+
+def refresh_forever(crawler: IMDbMovieCrawler, interval: int):
+    while True:
+        time.sleep(interval)
+        try:
+            crawler.refresh(interval=interval)
+        except Exception as e:
+            print(f"Refresh failed: {e}")
+
+def sync_shared_forever(crawler: IMDbMovieCrawler, interval: int = SHARED_SYNC):
+    while True:
+        time.sleep(interval)
+        try:
+            events = crawler.sync_shared()
+            if events is not None:
+                print(f"Synced from the shared cache: {len(events)} changes")
+        except Exception as e:
+            print(f"Shared cache sync failed: {e}")
+
+def warm_details(crawler: IMDbMovieCrawler, deadline: float | None = None):
+    if not crawler.holds_crawl_lease():
+        # someone else in the fleet is crawling: details come in through the shared cache
+        crawler.build_indexes()
+        return
+    renewing = crawler.renew_crawl_lease()   # a slow IMDb can keep the warm-up going past CRAWL_LEASE
+    try:
+        crawler.fetch_movies_details_parallel(crawler.movies, max_workers=20, deadline=deadline,
+                                              record_history=True)          # all details
+    finally:
+        renewing.set()
+    crawler.build_indexes()                                      # search index etc.
+
+def get_crawler(background: bool = True) -> IMDbMovieCrawler:
+    """Return a fully-initialised crawler, fetching from IMDb only on first call.
+    background=False only loads the snapshot (cache, shared cache or the chart itself) and starts
+    no thread at all: wsgi.py calls it in the gunicorn master, before it forks the workers.
+    """
     global _crawler_cache
     with _cache_lock:
         if _crawler_cache is None:
             print("Cold-start: fetching IMDb Top 150 …")
             c = IMDbMovieCrawler()
-            c.fetch_top_movies()                                   # list of 150
-            c.fetch_movies_details_parallel(c.movies, max_workers=20)# all details
+            c.chart_names = CHART_NAMES
+            c.shared = shared
+            # one log every worker reads; under gunicorn only the crawl lock holder appends (wsgi.py)
+            c.change_log = ChangeLog(CHANGES_DB, writer=background)
+            if shared is not None:
+                shared.threads = background   # the master flushes by hand below
+            deadline = time.time() + STARTUP_DEADLINE
+            c.deadline = deadline                                  # no retrying a dead IMDb past it
+            c.fetch_top_movies()                                   # list of 150 per chart
+            c.deadline = None
+            # serve the chart right away, details arrive in the background while
+            # get_movie / the grid push the titles users look at to the front of the queue
+            c.build_indexes()
+            if background:
+                # a single process owns movies_cache.json; under gunicorn only the crawl lock holder does (wsgi.py)
+                c.cache_flush_interval = CACHE_WRITE_BEHIND or None
+                threading.Thread(target=warm_details, args=(c,), daemon=True).start()
+            elif shared is not None:
+                shared.flush()          # nothing queued is left to be flushed again by every worker
+                shared.threads = True
+            c.trending.replay(history.crawls(int(time.time()) - TRENDING_WINDOW))
+            if background:
+                # posters / headshots into the local image cache, already-cached ones are skipped;
+                # from here on every published record (details, refresh, new entrants) is prefetched too
+                c.images = images
+                images.prefetch_later(c.movies)
+                if REFRESH_INTERVAL > 0:
+                    threading.Thread(target=refresh_forever, args=(c, REFRESH_INTERVAL), daemon=True).start()
+                if shared is not None:
+                    threading.Thread(target=sync_shared_forever, args=(c,), daemon=True).start()
             _crawler_cache = c
             print(f"Cache ready — {len(c.movies)} movies loaded")
         return _crawler_cache
 
 
-def format_movie_brief(m: dict) -> dict:
-    """Return the fields needed for the movie-grid cards."""
-    return {
-        "id":       m.get("id"),
-        "title":    m.get("title"),
-        "year":     m.get("year"),
-        "rating":   m.get("rating"),
-        "plot":     m.get("plot"),
-        "poster":   m.get("poster"),
-        "genres":   m.get("genres", []),
-        "language": m.get("country", ""), # "language" in the frontend actually means country of origin
-    }
-
-
-def format_movie_detail(movie: dict) -> dict:
-    """Return the full fields needed for DetailPage."""
-    directors = movie.get("director", [])
-    if isinstance(directors, list):
-        directors_str = ", ".join(directors)
-    else:
-        directors_str = str(directors)
-
-    # Cast may be stored as list of dicts {"name", "img"} (new crawler)
-    raw_cast = movie.get("cast", [])
-    cast_list = []
-    for actor in raw_cast:
-        if isinstance(actor, dict):
-            name    = actor.get("name", "")
-            img_url = actor.get("img", "")
-        else:
-            name    = str(actor)
-            img_url = ""
-
-        # Fall back to generated avatar if no real photo was scraped
-        if not img_url:
-            img_url = (
-                f"https://ui-avatars.com/api/"
-                f"?name={name.replace(' ', '+')}&background=333&color=fff&size=150"
-            )
-        cast_list.append({"name": name, "img": img_url})
-
-    return {
-        "id":          movie.get("id"),
-        "title":       movie.get("title"),
-        "year":        movie.get("year"),
-        "runtime":     movie.get("runtime"),
-        "rating":      movie.get("rating"),
-        "certificate": movie.get("certificate", "N/A"),
-        "director":    directors_str,
-        "genres":      movie.get("genres", []),
-        "budget":      movie.get("budget"),
-        "boxOffice":   movie.get("box_office"),
-        "releaseDate": movie.get("release_date"),
-        "imdbScore":   f"{movie.get('rating', 'N/A')} / 10",
-        "awardsInfo":  movie.get("awards"),
-        "backdrop":    movie.get("poster"),
-        "plot":        movie.get("plot"),
-        "cast":       cast_list,
-    }
-
-
 # to fix 404 error while go to the root route
 @app.route("/")
 def home():
     return jsonify({"message": "Backend is running successfully!"})
 
-# all movies route
-@app.route("/movies")
-def get_movies():
-    crawler = get_crawler()
-
-    search      = (request.args.get("search")      or "").strip().lower()
-    genre_filter= (request.args.get("genre")       or "").strip()
-    year_exact  = (request.args.get("year")        or "").strip()
-    year_from   = request.args.get("year_from",  type=int)
-    year_to     = request.args.get("year_to",    type=int)
-    min_rating  = request.args.get("min_rating", type=float)
-    sort_mode   = (request.args.get("sort")        or "").strip()   # "imdb_top10"
+def filter_movies_from_args(data: Dataset, args) -> list:
+    """Apply the /movies query-string filters and sort, shared by /movies and /movies/facets.
+    ?chart= picks the list (default the primary chart), the records themselves are shared.
+    """
+    search      = (args.get("search")      or "").strip().lower()
+    genre_filter= (args.get("genre")       or "").strip()
+    year_exact  = (args.get("year")        or "").strip()
+    year_from   = args.get("year_from",  type=int)
+    year_to     = args.get("year_to",    type=int)
+    min_rating  = args.get("min_rating", type=float)
+    sort_mode   = (args.get("sort")        or "").strip()   # "imdb_top10"
+    director    = (args.get("director")    or "").strip()
+    actor       = (args.get("actor")       or "").strip()
+
+    # fuzzy title / director / cast hits from the trigram index, {id: relevance}
+    relevance = data.search_index.scores(search) if search else {}
+
+    # people filters are set lookups in the people index, no per-movie cast scan
+    people_ids = None
+    if director:
+        people_ids = set(data.people_index.movie_ids(director, "directed"))
+    if actor:
+        acted = set(data.people_index.movie_ids(actor, "acted"))
+        people_ids = acted if people_ids is None else people_ids & acted
 
     results = []
-    for m in crawler.movies:
-        # search (title, genres, country) 
+    for m in data.chart_movies(args.get("chart")):
+        # search (title, people, genres, country) 
         if search:
             title    = (m.get("title")   or "").lower()
             genres   = " ".join(m.get("genres", [])).lower()
             language = (m.get("country") or "").lower()
-            if search not in title and search not in genres and search not in language:
+            if (m.get("id") not in relevance and search not in title
+                    and search not in genres and search not in language):
                 continue
 
+        # director / actor filter
+        if people_ids is not None and m.get("id") not in people_ids:
+            continue
+
         # genre filter
         if genre_filter:
             movie_genres = [g.lower() for g in m.get("genres", [])]
@@ -137,43 +189,256 @@ def get_movies():
     # Top-10 by rating mode (genre cards on home page)
     if sort_mode == "imdb_top10":
         results = sorted(results, key=lambda x: x.get("rating") or 0, reverse=True)[:10]
+    elif relevance:
+        # best match first, genre/country-only hits keep their chart order at the end
+        results.sort(key=lambda x: relevance.get(x.get("id"), 0), reverse=True)
+
+    return results
+
+
+def unknown_chart(data: Dataset):
+    """404 response for a ?chart= that isn't loaded, None when it's fine (or not given)."""
+    chart = request.args.get("chart")
+    if chart and chart not in data.charts:
+        return jsonify({"error": "Unknown chart", "charts": list(data.charts)}), 404
+    return None
+
+def facet_counts(data: Dataset, results: list) -> dict:
+    """Genre / country / decade / certificate / rating counts over a result set."""
+    index = data.facet_index
+    return index.counts(index.mask_for(m.get("id") for m in results))
 
-    return jsonify([format_movie_brief(m) for m in results])
+# all movies route
+@app.route("/movies")
+def get_movies():
+    crawler = get_crawler()
+    data    = crawler.snapshot()   # one consistent generation for the whole request
+    error   = unknown_chart(data)
+    if error:
+        return error
+    results = filter_movies_from_args(data, request.args)
+
+    # first screen of the grid: fetch those details before the rest of the warm-up batch
+    # (a gunicorn follower worker only hands them to the crawler worker, see wsgi.py)
+    for m in results[:GRID_PAGE]:
+        if not m.get("details_fetched"):
+            crawler.request_details(m, VISIBLE)
+
+    # ?facets=1 wraps the list so the filters can show counts without a second request
+    if request.args.get("facets"):
+        briefs = [format_movie_brief(m) for m in results]
+        return jsonify({"results": briefs, "facets": facet_counts(data, results)})
+    return app.json.list_response(results, format_movie_brief)
+
+# which charts are loaded and how long they are, for the chart picker
+@app.route("/charts")
+def get_charts():
+    data = get_crawler().snapshot()
+    return jsonify([{"name": name, "count": len(ids), "primary": name == data.primary_chart}
+                    for name, ids in data.charts.items()])
+
+# counts for building the filter UI, under the same filters as /movies
+@app.route("/movies/facets")
+def get_facets():
+    data = get_crawler().snapshot()
+    error = unknown_chart(data)
+    if error:
+        return error
+    if not request.args and len(data.charts[data.primary_chart]) == len(data.movies):
+        return jsonify(data.facet_index.counts())   # the default list is the whole catalog, no mask needed
+    # no filters still means the primary chart, the list /movies shows next to these counts
+    return jsonify(facet_counts(data, filter_movies_from_args(data, request.args)))
+
+def gzip_stream(chunks, flush_every: int = 64):
+    """Gzip a byte stream on the fly, flushing every few chunks so the client gets data early."""
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits=31 → gzip container
+    for n, chunk in enumerate(chunks, 1):
+        out = gz.compress(chunk)
+        if n % flush_every == 0:
+            out += gz.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield gz.flush()
+
+# full catalog dump for downstream jobs, one movie per line
+@app.route("/movies/export")
+def export_movies():
+    crawler    = get_crawler()
+    since      = request.args.get("since",      type=int)   # generation
+    since_time = request.args.get("since_time", type=int)   # unix seconds
+
+    # taken now, not when the stream starts: the header and the body must be the same generation
+    data = crawler.snapshot()
+    lines = crawler.export_ndjson(since, since_time, data)
+    use_gzip = request.args.get("gzip") == "1" or request.accept_encodings["gzip"] > 0   # gzip;q=0 is a no
+    response = app.response_class(
+        stream_with_context(gzip_stream(lines) if use_gzip else lines),
+        mimetype="application/x-ndjson",
+    )
+    if use_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    # resume point: pass this back as ?since= to get only what changed afterwards
+    response.headers["X-Generation"] = str(max((m.get("generation", 0) for m in data.movies), default=0))
+    return response
+
+# delta sync: what changed (rank moves, rating changes, new / dropped titles) since a client's last seq;
+# pass back the epoch too, truncated=true means refetch the list (fell behind, or history.db was reset)
+@app.route("/movies/changes")
+def get_changes():
+    crawler = get_crawler()
+    since = request.args.get("since", default=0, type=int)
+    limit = request.args.get("limit", type=int)
+    if limit is not None and limit < 0:
+        return jsonify({"error": "limit must be >= 0"}), 400
+    return jsonify(crawler.change_log.since(since, limit, request.args.get("epoch")))
+
+# typeahead for the navbar search box, cheap enough to call on every keystroke
+@app.route("/movies/suggest")
+def get_suggestions():
+    crawler = get_crawler()
+    q     = (request.args.get("q") or "").strip()
+    limit = request.args.get("limit", default=8, type=int)
+    suggestions = [
+        {**s, "poster": images.public_url(s["poster"], "thumb")} if s.get("poster") else s
+        for s in crawler.suggest_index.suggest(q, limit)
+    ]
+    return jsonify(suggestions)
 
 # this is for specific movie route
 @app.route("/movies/<movie_id>")
 def get_movie(movie_id):
     crawler = get_crawler()
+    data    = crawler.snapshot()
 
-    # movies_dict is built during fetch_top_movies,_extract_from_json
-    movie = crawler.movies_dict.get(movie_id)
+    # detail json is rendered once when the details are fetched, so this is just a lookup
+    doc = data.detail_docs.get(movie_id)
+    if doc is not None:
+        return Response(doc, mimetype="application/json")
 
-    #fallback to linear search if not found in movies_dict (in case some movies were missed during dict construction)
-    if not movie:
-        movie = next((m for m in crawler.movies if m.get("id") == movie_id), None)
+    # movies_dict is built with every snapshot, from the same list
+    movie = data.movies_dict.get(movie_id)
 
     if not movie:
         return jsonify({"error": "Movie not found"}), 404
 
     # details might not have been fetched for all movies during initial crawl to save time
     if not movie.get("details_fetched"):
-        movie = crawler.fetch_movie_details(movie)
+        # front of the crawl queue, shares a fetch already in flight for this id
+        try:
+            movie = crawler.request_details(movie, INTERACTIVE).result(timeout=DETAIL_TIMEOUT)
+        except Exception as e:
+            print(f"Detail fetch for {movie_id} failed: {e}")
+
+    # fetch failed: render this once without caching it, a later request retries the fetch
+    doc = crawler.snapshot().detail_docs.get(movie_id) or render_detail_doc(movie)
+    return Response(doc, mimetype="application/json")
+
+# what the detail crawler is doing: queue depth per priority, running fetches, recent wait times,
+# and how IMDb is doing: circuit breaker per host, urls that keep failing
+@app.route("/crawl/status")
+def crawl_status():
+    crawler = get_crawler()
+    return jsonify({**crawler.scheduler.status(), "upstream": crawler.upstream_status()})
+
+# "more like this" for the detail page, served from the precomputed neighbour table
+@app.route("/movies/<movie_id>/similar")
+def get_similar(movie_id):
+    data = get_crawler().snapshot()
+    if movie_id not in data.movies_dict:
+        return jsonify({"error": "Movie not found"}), 404
 
-    return jsonify(format_movie_detail(movie))
+    limit = request.args.get("limit", default=10, type=int)
+    results = []
+    for other_id, score in data.similar_movies.get(movie_id, limit):
+        brief = format_movie_brief(data.movies_dict[other_id])
+        brief["similarity"] = score
+        results.append(brief)
+    return jsonify(results)
+
+# rank / rating / metascore / box office over time, downsampled to at most ?points= samples
+@app.route("/movies/<movie_id>/history")
+def get_movie_history(movie_id):
+    if movie_id not in get_crawler().movies_dict:
+        return jsonify({"error": "Movie not found"}), 404
+    start = request.args.get("from", default=0, type=int)   # unix seconds
+    end   = request.args.get("to", type=int)
+    if request.args.get("raw") == "1":
+        return app.response_class(stream_with_context(app.json.stream_list(history.samples(movie_id, start, end))),
+                                  mimetype="application/json")
+    points = request.args.get("points", default=500, type=int)
+    step   = request.args.get("step", type=int)             # bucket width in seconds, overrides points
+    return jsonify(history.series(movie_id, start, end, points, step))
+
+# everything a director / actor is credited on in the catalog
+@app.route("/people/<name>")
+def get_person(name):
+    data = get_crawler().snapshot()
+    person = data.people_index.get(name)
+    if not person:
+        return jsonify({"error": "Person not found"}), 404
+
+    def briefs(ids):
+        return [format_movie_brief(data.movies_dict[i]) for i in ids if i in data.movies_dict]
+
+    return jsonify({
+        "name":     person["name"],
+        "directed": briefs(person["directed"]),
+        "acted":    briefs(person["acted"]),
+    })
+
+# posters and cast photos from the local image cache, urls are content-hashed so they never change
+@app.route("/img/<name>")
+def get_image(name):
+    try:
+        found = images.lookup(name)
+    except Exception as e:
+        print(f"Image fetch failed for {name}: {e}")
+        return jsonify({"error": "Image unavailable"}), 502
+    if not found:
+        return jsonify({"error": "Image not found"}), 404
+
+    path, content_type, sha = found
+    response = send_file(path, mimetype=content_type, etag=sha, max_age=31536000, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+# initials avatar for cast members without a photo, the svg only depends on the name;
+# path: because a "/" in a name arrives decoded (AC%2FDC → AC/DC)
+@app.route("/avatar/<version>/<path:name>.svg")
+def get_avatar(version, name):
+    svg, etag = avatar_svg(name)
+    response = Response(svg, mimetype="image/svg+xml")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
 
 #trending movie
 @app.route("/movies/trending")
 def get_trending():
     crawler = get_crawler()
-    top = sorted(crawler.movies, key=lambda x: x.get("rating") or 0, reverse=True)[:10]
-    return jsonify([format_movie_brief(m) for m in top])
+    data    = crawler.snapshot()
+    limit = request.args.get("limit", default=10, type=int)
+    ids = [movie_id for movie_id, _ in crawler.trending.trending(limit)]
+    # not enough crawls yet to see movement: pad with the best rated titles
+    for movie_id in data.top_rated:
+        if len(ids) >= limit:
+            break
+        if movie_id not in ids:
+            ids.append(movie_id)
+    return jsonify([format_movie_brief(data.movies_dict[i]) for i in ids if i in data.movies_dict])
 
 #new arrival
 @app.route("/movies/new-arrivals")
 def get_new_arrivals():
-    crawler = get_crawler()
-    recent = sorted(crawler.movies, key=lambda x: x.get("year") or 0, reverse=True)[:10]
-    return jsonify([format_movie_brief(m) for m in recent])
+    data   = get_crawler().snapshot()
+    limit  = request.args.get("limit", default=10, type=int)
+    after  = request.args.get("released_after")    # ISO date, e.g. 2010-01-01
+    before = request.args.get("released_before")
+    ids = data.release_index.newest(limit, after, before)
+    return jsonify([format_movie_brief(data.movies_dict[i]) for i in ids])
 
 if __name__ == "__main__":
     get_crawler()
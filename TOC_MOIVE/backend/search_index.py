@@ -0,0 +1,306 @@
+import bisect
+import heapq
+import html
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# weight per field so a title hit beats the same name in the cast list
+FIELD_WEIGHTS = {"title": 1.0, "director": 0.9, "cast": 0.8}
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case, strip accents / html entities and collapse punctuation to single spaces.
+    'Schindler&apos;s List' → 'schindler s list', 'Amélie' → 'amelie'
+    """
+    text = html.unescape(text or "")
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip() #<-- this is regular lang
+
+
+def trigrams(text: str) -> set:
+    """Split normalized text into padded word trigrams (same idea as postgres pg_trgm).
+    'dark' → {'  d', ' da', 'dar', 'ark', 'rk '}
+    """
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class MovieSearchIndex:
+    """Typo-tolerant search over titles, directors and cast names.
+
+    Two levels, both built once from the loaded movie list:
+      * trigram index over the vocabulary, so a misspelt word ('godfathr') is
+        mapped to the real words it resembles ('godfather') without a scan
+      * word → doc postings, so only docs containing those words are scored
+
+    Query words are idf-weighted, so 'the' in 'the dark' barely counts and the
+    doc candidates only come from the posting lists of the informative words.
+    """
+
+    def __init__(self, movies: List[dict], min_score: float = 0.5, min_word_sim: float = 0.5):
+        self.min_score = min_score
+        self.min_word_sim = min_word_sim
+        self.docs: List[Tuple[str, str, str]] = []   # (movie id, field, normalized text)
+        self.word_postings: Dict[str, List[int]] = defaultdict(list)
+        self.ratings: Dict[str, float] = {}
+
+        for m in movies:
+            movie_id = m.get("id")
+            if not movie_id:
+                continue
+            self.ratings[movie_id] = m.get("rating") or 0
+            self._add(movie_id, "title", m.get("title", ""))
+
+            directors = m.get("director", [])
+            if not isinstance(directors, list):
+                directors = [directors]
+            for name in directors:
+                self._add(movie_id, "director", str(name))
+
+            for actor in m.get("cast", []):
+                name = actor.get("name", "") if isinstance(actor, dict) else str(actor)
+                self._add(movie_id, "cast", name)
+
+        self.word_postings = dict(self.word_postings)
+        self.word_grams: Dict[str, frozenset] = {}
+        self.vocab_grams: Dict[str, List[str]] = defaultdict(list)
+        for word in self.word_postings:
+            grams = frozenset(trigrams(word))
+            self.word_grams[word] = grams
+            for g in grams:
+                self.vocab_grams[g].append(word)
+        self.vocab_grams = dict(self.vocab_grams)
+        self.max_idf = math.log(1 + len(self.docs))
+
+    def _add(self, movie_id: str, field: str, text: str):
+        norm = normalize_text(text)
+        if not norm:
+            return
+        doc_idx = len(self.docs)
+        self.docs.append((movie_id, field, norm))
+        for word in set(norm.split()):
+            self.word_postings[word].append(doc_idx)
+
+    def idf(self, word: str) -> float:
+        df = len(self.word_postings.get(word, ()))
+        return math.log(1 + len(self.docs) / df) if df else self.max_idf
+
+    def similar_words(self, word: str) -> Dict[str, float]:
+        """Vocabulary words resembling `word` → trigram dice similarity (1.0 = exact)."""
+        if len(word) <= 3:
+            # 'the' / 'of' / 'x': a typo there is indistinguishable from another word
+            return {word: 1.0} if word in self.word_postings else {}
+
+        grams = trigrams(word)
+        n = len(grams)
+        # dice >= min_word_sim needs at least this many shared trigrams (pigeonhole on the rarest lists)
+        need = max(1, math.ceil(self.min_word_sim * n / 2))
+        rarest = sorted((self.vocab_grams.get(g, ()) for g in grams), key=len)[:n - need + 1]
+        candidates = set()
+        for posting in rarest:
+            candidates.update(posting)
+
+        # dice can only reach min_word_sim if the trigram counts are close enough
+        s = self.min_word_sim
+        min_len, max_len = n * s / (2 - s), n * (2 - s) / s
+
+        similar = {}
+        for cand in candidates:
+            cand_grams = self.word_grams[cand]
+            m = len(cand_grams)
+            if m < min_len or m > max_len:
+                continue
+            sim = 2 * len(grams & cand_grams) / (n + m)
+            if sim >= s:
+                similar[cand] = sim
+        return similar
+
+    def scores(self, query: str) -> Dict[str, float]:
+        """Return {movie id: relevance in 0..1} for every movie above min_score."""
+        norm = normalize_text(query)
+        qwords = list(dict.fromkeys(norm.split()))
+        if not qwords:
+            return {}
+
+        matches = {qw: self.similar_words(qw) for qw in qwords}
+        # weight = idf of the closest vocabulary word, unknown words count as the rarest
+        weights = {
+            qw: self.idf(max(matches[qw], key=matches[qw].get)) if matches[qw] else self.max_idf
+            for qw in qwords
+        }
+        total = sum(weights.values())
+
+        # a doc reaching min_score must contain a match for at least one of the
+        # heaviest words, the rest together weigh too little to get there alone
+        probe, rest = [], total
+        for qw in sorted(qwords, key=weights.get, reverse=True):
+            if rest < self.min_score * total:
+                break
+            probe.append(qw)
+            rest -= weights[qw]
+
+        candidates = set()
+        for qw in probe:
+            for w in matches[qw]:
+                candidates.update(self.word_postings[w])
+
+        best: Dict[str, float] = {}
+        for doc_idx in candidates:
+            movie_id, field, text = self.docs[doc_idx]
+            doc_words = text.split()
+            got = 0.0
+            for qw in qwords:
+                sims = matches[qw]
+                got += weights[qw] * max((sims.get(w, 0) for w in doc_words), default=0)
+            score = got / total
+            if score < self.min_score:
+                continue
+            if norm in text:
+                score = 1.0
+            score *= FIELD_WEIGHTS[field]
+            if score > best.get(movie_id, 0):
+                best[movie_id] = score
+        return best
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Relevance-ranked [(movie id, score)], ties broken by IMDb rating."""
+        ranked = sorted(
+            self.scores(query).items(),
+            key=lambda kv: (kv[1], self.ratings.get(kv[0], 0)),
+            reverse=True,
+        )
+        return ranked[:limit] if limit else ranked
+
+
+class PeopleIndex:
+    """Normalized person name → ids of the movies they directed / acted in."""
+
+    def __init__(self, movies: List[dict]):
+        self.people: Dict[str, dict] = {}
+        for m in movies:
+            movie_id = m.get("id")
+            if not movie_id:
+                continue
+            directors = m.get("director", [])
+            if not isinstance(directors, list):
+                directors = [directors]
+            for name in directors:
+                self._add(str(name), "directed", movie_id)
+            for actor in m.get("cast", []):
+                name = actor.get("name", "") if isinstance(actor, dict) else str(actor)
+                self._add(name, "acted", movie_id)
+
+    def _add(self, name: str, role: str, movie_id: str):
+        norm = normalize_text(name)
+        if not norm:
+            return
+        person = self.people.setdefault(norm, {"name": name, "directed": [], "acted": []})
+        if movie_id not in person[role]:
+            person[role].append(movie_id)
+
+    def get(self, name: str) -> Optional[dict]:
+        return self.people.get(normalize_text(name))
+
+    def movie_ids(self, name: str, role: str) -> List[str]:
+        """Ids for one role ('directed' or 'acted'), empty if the person is unknown."""
+        person = self.get(name)
+        return person[role] if person else []
+
+
+class SuggestIndex:
+    """Sorted-prefix array for typeahead over titles and people.
+
+    Every word start of a normalized name is a key ('the dark knight', 'dark knight',
+    'knight'), so typing any word of a title finds it. A prefix lookup is a bisect
+    on the sorted keys; the 1-2 character prefixes, whose ranges cover a big slice
+    of the catalog, get their top matches precomputed so no keystroke is slow.
+    """
+
+    def __init__(self, movies: List[dict], max_limit: int = 20, short_prefix: int = 2):
+        self.max_limit = max_limit
+        self.short_prefix = short_prefix
+        self.entries: List[dict] = []     # payloads returned to the client
+        self.weights: List[float] = []
+
+        pairs: List[Tuple[str, int]] = []
+        people: Dict[str, dict] = {}
+
+        for m in movies:
+            if not m.get("id"):
+                continue
+            idx = self._add_entry({
+                "type":   "movie",
+                "id":     m.get("id"),
+                "title":  html.unescape(m.get("title") or ""),
+                "year":   m.get("year"),
+                "rating": m.get("rating"),
+                "poster": m.get("poster"),
+            }, m.get("rating") or 0)
+            pairs.extend((key, idx) for key in self._word_starts(m.get("title", "")))
+
+            directors = m.get("director", [])
+            if not isinstance(directors, list):
+                directors = [directors]
+            names = [str(d) for d in directors]
+            names += [a.get("name", "") if isinstance(a, dict) else str(a) for a in m.get("cast", [])]
+            for name in names:
+                norm = normalize_text(name)
+                if not norm:
+                    continue
+                person = people.setdefault(norm, {"name": name, "movies": 0, "best": 0})
+                person["movies"] += 1
+                person["best"] = max(person["best"], m.get("rating") or 0)
+
+        for norm, person in people.items():
+            # people rank by their best-rated movie, prolific ones slightly ahead
+            idx = self._add_entry(
+                {"type": "person", "name": person["name"], "movies": person["movies"]},
+                person["best"] + 0.01 * person["movies"],
+            )
+            pairs.extend((key, idx) for key in self._word_starts(norm))
+
+        pairs.sort()
+        self.keys = [k for k, _ in pairs]
+        self.refs = [i for _, i in pairs]
+
+        short: Dict[str, set] = defaultdict(set)
+        for key, idx in pairs:
+            for n in range(1, min(len(key), short_prefix) + 1):
+                short[key[:n]].add(idx)
+        self.short_top = {prefix: self._top(idxs, max_limit) for prefix, idxs in short.items()}
+
+    def _add_entry(self, payload: dict, weight: float) -> int:
+        self.entries.append(payload)
+        self.weights.append(weight)
+        return len(self.entries) - 1
+
+    @staticmethod
+    def _word_starts(text: str) -> List[str]:
+        words = normalize_text(text).split()
+        return [" ".join(words[i:]) for i in range(len(words))]
+
+    def _top(self, idxs, limit: int) -> List[int]:
+        return heapq.nlargest(limit, idxs, key=self.weights.__getitem__)
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[dict]:
+        """Top `limit` movies / people whose title or name has a word starting with `prefix`."""
+        prefix = normalize_text(prefix)
+        if not prefix:
+            return []
+        limit = max(1, min(limit, self.max_limit))
+
+        if len(prefix) <= self.short_prefix:
+            top = self.short_top.get(prefix, [])[:limit]
+        else:
+            lo = bisect.bisect_left(self.keys, prefix)
+            hi = bisect.bisect_left(self.keys, prefix + "\x7f", lo)
+            top = self._top(set(self.refs[lo:hi]), limit)
+        return [self.entries[i] for i in top]
@@ -0,0 +1,356 @@
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import redis  # optional: only needed for SHARED_CACHE=redis://...
+except ImportError:
+    redis = None
+
+DOC_TTL = 7 * 86400  # rendered detail docs, old versions just expire
+
+
+def record_digest(raw: bytes) -> str:
+    """Names a doc after the exact record bytes it was rendered from."""
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key     TEXT PRIMARY KEY,
+    value   BLOB NOT NULL,
+    expires REAL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS queue (
+    id      INTEGER PRIMARY KEY,
+    key     TEXT NOT NULL,
+    value   BLOB NOT NULL
+);
+"""
+
+
+class SQLiteBackend:
+    """Key-value table in a local SQLite file, shared by every process on one host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        # same as history_store: one connection per thread per process
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(keys)
+        out = {}
+        for i in range(0, len(keys), 500):   # sqlite's bound parameter limit
+            chunk = keys[i:i + 500]
+            rows = self._conn().execute(
+                "SELECT key, value FROM kv WHERE key IN (%s) AND (expires IS NULL OR expires > ?)"
+                % ",".join("?" * len(chunk)), chunk + [time.time()])
+            out.update(rows)
+        return out
+
+    def set_many(self, items: Dict[str, bytes], ttl: Optional[int] = None):
+        expires = time.time() + ttl if ttl else None
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)",
+                             [(k, v, expires) for k, v in items.items()])
+            conn.execute("DELETE FROM kv WHERE expires <= ?", (time.time(),))
+
+    def add(self, key: str, value: bytes, ttl: int) -> bool:
+        """Set only if absent (or expired); True if we set it."""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO kv VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE "
+                "SET value = excluded.value, expires = excluded.expires WHERE kv.expires <= ?",
+                (key, value, now + ttl, now))
+        return cursor.rowcount == 1
+
+    def push(self, key: str, value: bytes):
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT INTO queue (key, value) VALUES (?, ?)", (key, value))
+
+    def drain(self, key: str) -> List[bytes]:
+        """Everything pushed under `key` so far, oldest first, and empty the queue."""
+        conn = self._conn()
+        with conn:
+            rows = conn.execute("SELECT id, value FROM queue WHERE key = ? ORDER BY id", (key,)).fetchall()
+            if rows:
+                conn.execute("DELETE FROM queue WHERE key = ? AND id <= ?", (key, rows[-1][0]))
+        return [value for _, value in rows]
+
+
+class RedisBackend:
+    """Same calls on a redis client, for a fleet of hosts."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(keys)
+        out = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            out.update((k, v) for k, v in zip(chunk, self.client.mget(chunk)) if v is not None)
+        return out
+
+    def set_many(self, items: Dict[str, bytes], ttl: Optional[int] = None):
+        pipe = self.client.pipeline()
+        for k, v in items.items():
+            pipe.set(k, v, ex=ttl)
+        pipe.execute()
+
+    def add(self, key: str, value: bytes, ttl: int) -> bool:
+        return bool(self.client.set(key, value, ex=ttl, nx=True))
+
+    def push(self, key: str, value: bytes):
+        self.client.rpush(key, value)
+
+    def drain(self, key: str) -> List[bytes]:
+        pipe = self.client.pipeline()   # MULTI: nothing pushed in between is deleted unread
+        pipe.lrange(key, 0, -1)
+        pipe.delete(key)
+        return pipe.execute()[0]
+
+
+class FakeRedis:
+    """In-process stand-in for the redis client calls RedisBackend makes; SHARED_CACHE=memory:// and tests."""
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}   # key -> (value, expires or None)
+        self._lock = threading.RLock()
+
+    def _live(self, key: str):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        with self._lock:
+            return [self.get(k) for k in keys]
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None, nx: bool = False):
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            self._data[key] = (value, time.time() + ex if ex else None)
+            return True
+
+    def rpush(self, key: str, value: bytes):
+        with self._lock:
+            entry = self._live(key)
+            self._data[key] = ((entry[0] if entry else []) + [value], None)
+
+    def lrange(self, key: str, start: int, end: int) -> List[bytes]:
+        with self._lock:
+            entry = self._live(key)
+            items = entry[0] if entry else []
+            return items[start:None if end == -1 else end + 1]
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client, self.calls = client, []
+
+    def set(self, *args, **kwargs):
+        self.calls.append(("set", args, kwargs))
+
+    def lrange(self, *args):
+        self.calls.append(("lrange", args, {}))
+
+    def delete(self, *args):
+        self.calls.append(("delete", args, {}))
+
+    def execute(self):
+        with self.client._lock:
+            return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def open_backend(url: str):
+    """sqlite:///relative.db or sqlite:////abs/path.db, redis://host:6379/0, memory:// (this process only)."""
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        if redis is None:
+            raise RuntimeError("SHARED_CACHE=redis://... needs the redis package (pip install redis)")
+        return RedisBackend(redis.Redis.from_url(url))
+    if url.startswith("memory://"):
+        return RedisBackend(FakeRedis())
+    raise ValueError(f"Unknown SHARED_CACHE url {url!r}")
+
+
+class SharedCatalog:
+    """The crawled catalog in a cache every backend process can see, so a fleet crawls once.
+
+    Keys carry the cache schema version (a format change never reads old values):
+        <prefix>catalog              {id, generation, charts, ids}, written after its records
+        <prefix>movie:<id>           the record
+        <prefix>doc:<id>:<digest>    its rendered /movies/<id> json, keyed by a hash of the record
+                                     bytes it goes with, so a stale (or another record's) doc is never served
+        <prefix>wanted               queue of detail fetches handed to the crawling process
+    Reads go straight to the backend. Writes are queued and flushed in batches by a
+    background thread (write-behind), the request path never waits on the network.
+    """
+
+    def __init__(self, backend, version: str, flush_interval: float = 0.5):
+        self.backend = backend
+        self.prefix = f"imdb:{version}:"
+        self.flush_interval = flush_interval
+        self._dirty: Dict[str, bytes] = {}
+        self._dirty_docs: Dict[str, bytes] = {}
+        self._catalog: Optional[bytes] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self.threads = True  # False: writes just queue up until flush(), nothing starts a thread (wsgi.py's master)
+
+    @property
+    def owner(self) -> bytes:
+        # per call, not per init: forked workers are different lease holders
+        return f"{socket.gethostname()}:{os.getpid()}".encode()
+
+    def key(self, *parts) -> str:
+        return self.prefix + ":".join(str(p) for p in parts)
+
+    # read-through
+    def catalog(self) -> Optional[dict]:
+        raw = self.backend.get(self.key("catalog"))
+        return json.loads(raw) if raw else None
+
+    def movies(self, ids: Iterable[str]) -> List[dict]:
+        ids = list(ids)
+        found = self.backend.get_many(self.key("movie", i) for i in ids)
+        return [json.loads(found[self.key("movie", i)]) for i in ids if self.key("movie", i) in found]
+
+    def movie(self, movie_id: str) -> Optional[dict]:
+        raw = self.backend.get(self.key("movie", movie_id))
+        return json.loads(raw) if raw else None
+
+    def movie_and_doc(self, movie_id: str) -> Tuple[Optional[dict], Optional[bytes]]:
+        """The record and the doc rendered from exactly that record (None if it has none yet)."""
+        raw = self.backend.get(self.key("movie", movie_id))
+        if not raw:
+            return None, None
+        return json.loads(raw), self.backend.get(self.key("doc", movie_id, record_digest(raw)))
+
+    # write-behind
+    def put_movie(self, movie: dict, doc: Optional[bytes] = None):
+        raw = json.dumps(movie, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._dirty[self.key("movie", movie["id"])] = raw
+            if doc is not None:
+                self._dirty_docs[self.key("doc", movie["id"], record_digest(raw))] = doc
+        self._kick()
+
+    def put_catalog(self, movies: Iterable[dict], charts: Dict[str, Iterable[str]], generation: int) -> str:
+        """Queue a new catalog; returns its id. Generations are per process (each one counts its
+        own), so readers tell catalogs apart by this id, not by comparing generations.
+        """
+        movies = list(movies)
+        catalog_id = f"{self.owner.decode()}:{time.time_ns()}"
+        catalog = {"id": catalog_id, "generation": generation, "ids": [m["id"] for m in movies if m.get("id")],
+                   "charts": {name: list(ids) for name, ids in charts.items()}, "saved_at": int(time.time())}
+        with self._lock:
+            for m in movies:
+                if m.get("id"):
+                    self._dirty[self.key("movie", m["id"])] = json.dumps(m, ensure_ascii=False).encode("utf-8")
+            self._catalog = json.dumps(catalog).encode("utf-8")
+        self._kick()
+        return catalog_id
+
+    def flush(self):
+        """Write everything queued so far; the catalog goes last so readers never see ids without records."""
+        with self._lock:
+            dirty, docs, catalog = self._dirty, self._dirty_docs, self._catalog
+            self._dirty, self._dirty_docs, self._catalog = {}, {}, None
+        try:
+            if dirty:
+                self.backend.set_many(dirty)
+            if docs:
+                self.backend.set_many(docs, ttl=DOC_TTL)
+            if catalog is not None:
+                self.backend.set_many({self.key("catalog"): catalog})
+        except Exception:
+            # back in the queue under anything newer queued meanwhile, the next flush retries
+            with self._lock:
+                self._dirty = {**dirty, **self._dirty}
+                self._dirty_docs = {**docs, **self._dirty_docs}
+                self._catalog = self._catalog or catalog
+            raise
+
+    def _kick(self):
+        if not self.threads:
+            return
+        if self._pid != os.getpid():
+            # first write in this process (or after a fork): the parent's thread isn't here
+            self._pid = os.getpid()
+            threading.Thread(target=self._flush_forever, daemon=True).start()
+        self._wake.set()
+
+    def _flush_forever(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.flush_interval)   # let a burst of publishes pile up into one batch
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Shared cache flush failed, retrying: {e}")
+                time.sleep(5)
+                self._wake.set()
+
+    # detail fetches a process that doesn't crawl hands to the one that does (wsgi.py followers)
+    def want_details(self, movie_id: str, priority: int):
+        self.backend.push(self.key("wanted"), json.dumps({"id": movie_id, "priority": priority}).encode())
+
+    def wanted(self) -> List[dict]:
+        return [json.loads(raw) for raw in self.backend.drain(self.key("wanted"))]
+
+    def try_lease(self, name: str, ttl: int) -> bool:
+        """Fleet-wide lock that expires by itself: True if this process holds (or just took) it."""
+        key = self.key("lease", name)
+        if self.backend.add(key, self.owner, ttl):
+            return True
+        if self.backend.get(key) == self.owner:
+            self.backend.set_many({key: self.owner}, ttl=ttl)   # ours, extend it
+            return True
+        return False
+
+
+def open_shared(url: Optional[str], version: str) -> Optional[SharedCatalog]:
+    return SharedCatalog(open_backend(url), version) if url else None
@@ -0,0 +1,89 @@
+import heapq
+import math
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from search_index import normalize_text
+
+# how much each kind of shared feature counts towards "more like this"
+FEATURE_WEIGHTS = {
+    "genre":    1.0,
+    "director": 2.0,
+    "cast":     1.0,
+    "decade":   0.5,
+    "rating":   0.5,
+}
+
+# a feature on more than this share of the catalog (drama, the 8.5 rating bucket, ...) still adds
+# to the score of a pair but doesn't make two movies candidates; otherwise nearly every pair is one
+COMMON_FEATURE_SHARE = 0.2
+COMMON_FEATURE_MIN = 20  # small catalogs (tests) keep every feature
+
+
+def movie_features(m: dict) -> Dict[str, float]:
+    """Sparse feature vector of a movie, L2-normalized so dot product = cosine similarity."""
+    vec: Dict[str, float] = {}
+    for g in m.get("genres", []):
+        vec[f"genre:{g.lower()}"] = FEATURE_WEIGHTS["genre"]
+
+    directors = m.get("director", [])
+    if not isinstance(directors, list):
+        directors = [directors]
+    for name in directors:
+        vec[f"director:{normalize_text(str(name))}"] = FEATURE_WEIGHTS["director"]
+
+    for actor in m.get("cast", []):
+        name = actor.get("name", "") if isinstance(actor, dict) else str(actor)
+        vec[f"cast:{normalize_text(name)}"] = FEATURE_WEIGHTS["cast"]
+
+    if m.get("year"):
+        vec[f"decade:{m['year'] // 10 * 10}"] = FEATURE_WEIGHTS["decade"]
+    if m.get("rating"):
+        vec[f"rating:{round(m['rating'] * 2) / 2}"] = FEATURE_WEIGHTS["rating"]
+
+    norm = math.sqrt(sum(w * w for w in vec.values()))
+    return {f: w / norm for f, w in vec.items()} if norm else {}
+
+
+class SimilarMovies:
+    """Top-k neighbour table for every movie, computed once per dataset load.
+
+    The similarity matrix is the sparse product A·Aᵀ of the feature vectors,
+    done row by row through a feature → movies inverted index, so only movie
+    pairs that share at least one uncommon feature are ever touched. A movie
+    with nothing but common features (no cast or director yet) has no neighbours.
+    """
+
+    def __init__(self, movies: List[dict], k: int = 12):
+        self.k = k
+        ids = [m["id"] for m in movies if m.get("id")]
+        vectors = [movie_features(m) for m in movies if m.get("id")]
+
+        postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for i, vec in enumerate(vectors):
+            for f, w in vec.items():
+                postings[f].append((i, w))
+
+        cutoff = max(COMMON_FEATURE_MIN, COMMON_FEATURE_SHARE * len(vectors))
+        common = {f for f, posting in postings.items() if len(posting) > cutoff}
+
+        self.neighbours: Dict[str, List[Tuple[str, float]]] = {}
+        for i, vec in enumerate(vectors):
+            scores: Dict[int, float] = defaultdict(float)
+            shared_common = []
+            for f, w in vec.items():
+                if f in common:
+                    shared_common.append((f, w))
+                    continue
+                for j, wj in postings[f]:
+                    scores[j] += w * wj
+            scores.pop(i, None)
+            for j in scores:
+                other = vectors[j]
+                scores[j] += sum(w * other[f] for f, w in shared_common if f in other)
+            top = heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+            self.neighbours[ids[i]] = [(ids[j], round(s, 4)) for j, s in top]
+
+    def get(self, movie_id: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """Precomputed [(movie id, cosine similarity)], best first."""
+        return self.neighbours.get(movie_id, [])[:limit]
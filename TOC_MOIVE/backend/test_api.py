@@ -0,0 +1,831 @@
+#!/usr/bin/env python3
+"""
+Test the Flask API routes against the cached movie list
+"""
+import sys
+import os
+import gzip
+import json
+import tempfile
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("CACHE_WRITE_BEHIND", "0")   # tests never rewrite the real movies_cache.json
+
+import main
+import image_cache
+from main import app
+from formatters import format_movie_detail
+from avatars import avatar_url
+from json_provider import FastJSONProvider
+from change_feed import ChangeLog, diff_datasets
+from history_store import HistoryStore
+from trending import TrendingScores
+from crawl_scheduler import CrawlScheduler, BACKGROUND, VISIBLE, INTERACTIVE
+import imdb_movie_crawler
+from imdb_movie_crawler import CHARTS, RETRIES, IMDbMovieCrawler
+from dataset import Dataset
+from similarity import SimilarMovies
+from date_index import ReleaseDateIndex, release_key
+from cache_file import payload_checksum, read_json_verified
+from field_groups import ALL_GROUPS, missing_groups
+
+client = app.test_client()
+
+def test_people():
+    """People index: /people/<name> and the director= / actor= filters"""
+    print("\nTEST: /people/<name> ...")
+    res = client.get("/people/christopher nolan")
+    assert res.status_code == 200
+    person = res.get_json()
+    print(f"   {person['name']}: directed {[m['title'] for m in person['directed']]}")
+    assert person["directed"] and not person["acted"]
+
+    # lookup is on the normalized name, case and spacing don't matter
+    assert client.get("/people/CHRISTOPHER%20%20NOLAN").get_json()["name"] == "Christopher Nolan"
+    assert client.get("/people/nobody at all").status_code == 404
+
+    print("TEST: /movies?director=&actor= ...")
+    both = client.get("/movies?director=Christopher Nolan&actor=Michael Caine").get_json()
+    print(f"   Nolan + Caine: {[m['title'] for m in both]}")
+    assert both and all(m["id"] in {d["id"] for d in person["directed"]} for m in both)
+    assert client.get("/movies?actor=nobody at all").get_json() == []
+    print("✓ PASSED\n")
+
+def test_similar():
+    """/movies/<id>/similar comes from the precomputed neighbour table"""
+    print("\nTEST: /movies/<id>/similar ...")
+    similar = client.get("/movies/tt0468569/similar?limit=3").get_json()   # The Dark Knight
+    print(f"   {[(m['title'], m['similarity']) for m in similar]}")
+    assert len(similar) == 3
+    assert "tt0468569" not in [m["id"] for m in similar]
+    assert similar[0]["similarity"] >= similar[-1]["similarity"]
+    assert client.get("/movies/tt0000000/similar").status_code == 404
+
+    # a genre every movie has doesn't make candidates, but still counts for the ones that are
+    movies = [{"id": f"tt{i:07d}", "genres": ["Drama"], "director": f"d{i}"} for i in range(40)]
+    movies[1]["director"] = movies[0]["director"]
+    table = SimilarMovies(movies)
+    assert [j for j, _ in table.get("tt0000000")] == ["tt0000001"] and table.get("tt0000002") == []
+    assert table.get("tt0000000")[0][1] == 1.0
+    print("✓ PASSED\n")
+
+def test_facets():
+    """/movies/facets counts follow the same filters as /movies"""
+    print("\nTEST: /movies/facets ...")
+    everything = client.get("/movies/facets").get_json()
+    assert sum(everything["decade"].values()) == len(client.get("/movies").get_json())
+
+    drama = client.get("/movies?genre=Drama&year_from=2000&facets=1").get_json()
+    facets = drama["facets"]
+    print(f"   Drama since 2000: {len(drama['results'])} movies, decades {facets['decade']}")
+    assert facets["genre"]["Drama"] == len(drama["results"])
+    assert set(facets["decade"]) <= {"2000s", "2010s", "2020s"}
+    assert client.get("/movies/facets?genre=Drama&year_from=2000").get_json() == facets
+    print("✓ PASSED\n")
+
+def test_image_proxy():
+    """/img/<key> serves registered images from the local cache with immutable caching"""
+    print("\nTEST: /img/<key> ...")
+    fetched = []
+    def fake_fetch(url):
+        fetched.append(url)
+        return b"fake-jpeg-bytes", "image/jpeg"
+
+    original = main.images
+    main.images = image_cache.ImageCache(tempfile.mkdtemp(), fetch=fake_fetch)
+    try:
+        poster = "https://m.media-amazon.com/images/M/abc@._V1_.jpg"
+        url = main.images.public_url(poster, "thumb")
+        name = url.rsplit("/", 1)[-1]
+
+        res = client.get(f"/img/{name}")
+        assert res.status_code == 200 and res.data == b"fake-jpeg-bytes"
+        assert "immutable" in res.headers["Cache-Control"]
+        # the CDN is asked for the small variant, not the full-size poster
+        assert fetched == ["https://m.media-amazon.com/images/M/abc@._V1_UX300_.jpg"]
+
+        # second hit comes from disk, and the ETag revalidates
+        res = client.get(f"/img/{name}", headers={"If-None-Match": res.headers["ETag"]})
+        assert res.status_code == 304 and len(fetched) == 1
+
+        # unregistered keys are not proxied
+        assert client.get("/img/0123456789abcdef0123-thumb").status_code == 404
+
+        # a record published by the crawler gets its poster and headshots prefetched in the background
+        crawler = IMDbMovieCrawler()
+        crawler.images = main.images
+        real_batch, image_cache.PREFETCH_BATCH = image_cache.PREFETCH_BATCH, 0.05
+        fetched.clear()
+        crawler.publish_movie({"id": "tt0000001", "title": "x", "poster": "https://m.media-amazon.com/images/M/p@._V1_.jpg",
+                               "cast": [{"name": "a", "img": "https://m.media-amazon.com/images/M/a@._V1_.jpg"}]})
+        deadline = time.time() + 3
+        while len(fetched) < 3 and time.time() < deadline:
+            time.sleep(0.05)
+        image_cache.PREFETCH_BATCH = real_batch
+        assert sorted(u.split("/")[-1] for u in fetched) == [
+            "a@._V1_UX140_CR0,0,140,193_.jpg", "p@._V1_UX1280_.jpg", "p@._V1_UX300_.jpg"]
+    finally:
+        main.images = original
+    print("✓ PASSED\n")
+
+def test_avatars():
+    """Cast members without a photo get a local initials svg instead of ui-avatars.com"""
+    print("\nTEST: /avatar/... ...")
+    detail = client.get("/movies/tt0167260").get_json()   # Noel Appleby has no photo
+    noel = next(c for c in detail["cast"] if c["name"] == "Noel Appleby")
+    assert "ui-avatars.com" not in noel["img"] and "/avatar/" in noel["img"]
+
+    path = urlsplit(noel["img"]).path
+    res = client.get(path)
+    assert res.status_code == 200 and res.mimetype == "image/svg+xml"
+    assert b">NA<" in res.data and "immutable" in res.headers["Cache-Control"]
+    res = client.get(path, headers={"If-None-Match": res.headers["ETag"]})
+    assert res.status_code == 304
+
+    # a "/" in the name is %2F in the url, which is decoded before routing
+    res = client.get(urlsplit(avatar_url("AC/DC Tribute")).path)
+    assert res.status_code == 200 and b">AT<" in res.data
+    print("✓ PASSED\n")
+
+def test_detail_docs():
+    """/movies/<id> sends the detail json rendered at crawl time"""
+    print("\nTEST: /movies/<id> pre-rendered ...")
+    crawler = main.get_crawler()
+    res = client.get("/movies/tt0111161")
+    assert res.status_code == 200 and res.mimetype == "application/json"
+    assert res.data == crawler.detail_docs["tt0111161"]
+    assert res.get_json() == format_movie_detail(crawler.movies_dict["tt0111161"])
+    # same bytes as the record sent through the app's provider, key order included
+    assert res.data == app.json.dumps_bytes(format_movie_detail(crawler.movies_dict["tt0111161"]))
+    assert client.get("/movies/tt0000000").status_code == 404
+    print("✓ PASSED\n")
+
+def test_json_provider():
+    """Fast and stdlib providers produce the same json, streamed lists included"""
+    print("\nTEST: FastJSONProvider ...")
+    movies = client.get("/movies").get_json()
+    fast   = FastJSONProvider(app)
+    stdlib = FastJSONProvider(app, use_orjson=False)
+    assert fast.loads(fast.dumps(movies)) == stdlib.loads(stdlib.dumps(movies)) == movies
+
+    # a long list goes out as a stream, the client sees the same array
+    for provider in (fast, stdlib):
+        with app.test_request_context():
+            res = provider.list_response(movies * 5)
+            assert res.is_streamed
+            assert provider.loads(b"".join(res.response)) == movies * 5
+    print("✓ PASSED\n")
+
+def test_export():
+    """/movies/export streams every movie as ndjson, optionally gzipped, resumable with since="""
+    print("\nTEST: /movies/export ...")
+    crawler = main.get_crawler()
+    res = client.get("/movies/export")
+    assert res.is_streamed and res.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in res.data.splitlines()]
+    assert len(lines) == len(crawler.movies)
+    assert lines[0]["movie"] == json.loads(crawler.detail_docs[lines[0]["movie"]["id"]])
+
+    zipped = client.get("/movies/export?gzip=1")
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(zipped.data) == res.data
+    assert client.get("/movies/export", headers={"Accept-Encoding": "gzip;q=0"}).headers.get("Content-Encoding") is None
+
+    # after a change only the touched record comes back
+    movie = crawler.publish_movie(dict(crawler.movies[3]))
+    changed = client.get(f"/movies/export?since={int(res.headers['X-Generation'])}").data.splitlines()
+    assert [json.loads(line)["movie"]["id"] for line in changed] == [movie["id"]]
+
+    # a publish between the response and its first line doesn't move the header off the body
+    pending = client.get("/movies/export")
+    crawler.publish_movie(dict(crawler.movies[5]))
+    body = [json.loads(line) for line in pending.data.splitlines()]
+    assert int(pending.headers["X-Generation"]) == max(line["generation"] for line in body)
+    print("✓ PASSED\n")
+
+def test_changes():
+    """diff between two crawls lands in the change log, /movies/changes pages through it"""
+    print("\nTEST: /movies/changes ...")
+    old = [{"id": "a", "title": "A", "rating": 8.0}, {"id": "b", "title": "B", "rating": 7.5},
+           {"id": "c", "title": "C", "rating": 7.0}]
+    new = [{"id": "b", "title": "B", "rating": 7.5}, {"id": "a", "title": "A", "rating": 8.2},
+           {"id": "d", "title": "D", "rating": 9.0}]
+    events = diff_datasets(old, new)
+    kinds = sorted((e["type"], e["id"]) for e in events)
+    assert kinds == [("dropped", "c"), ("new", "d"), ("rank", "a"), ("rank", "b"), ("rating", "a")], kinds
+    assert diff_datasets(old, old) == []
+
+    log = ChangeLog(maxlen=3)
+    log.append(events)
+    page = log.since(0)
+    assert page["latest"] == 5 and page["truncated"] and [e["seq"] for e in page["changes"]] == [3, 4, 5]
+    assert not log.since(3)["truncated"] and [e["seq"] for e in log.since(3)["changes"]] == [4, 5]
+    assert log.since(5)["changes"] == [] and not log.since(5, epoch=log.epoch)["truncated"]
+    # a cursor from another log (or a deleted one): resync, not an empty page
+    assert ChangeLog().since(5)["truncated"]
+    assert log.since(3, epoch="0-1") == {"latest": 5, "epoch": log.epoch, "changes": [], "truncated": True}
+
+    # on disk every worker reads the same log, only the writer appends to it
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.db")
+        crawler_log, worker_log = ChangeLog(path), ChangeLog(path, writer=False)
+        assert crawler_log.append(events) == 5 and worker_log.append(events) == 5
+        assert worker_log.epoch == crawler_log.epoch and worker_log.since(3) == crawler_log.since(3)
+        assert [e["seq"] for e in worker_log.since(3, epoch=crawler_log.epoch)["changes"]] == [4, 5]
+        assert ChangeLog(path).since(5, epoch=crawler_log.epoch) == {
+            "latest": 5, "epoch": crawler_log.epoch, "changes": [], "truncated": False}   # after a restart
+
+    crawler = main.get_crawler()
+    latest = crawler.change_log.append(events)
+    res = client.get(f"/movies/changes?since={latest - 2}&limit=1").get_json()
+    assert res["latest"] == latest and len(res["changes"]) == 1
+    assert res["changes"][0]["seq"] == latest - 1
+    assert client.get("/movies/changes?limit=-1").status_code == 400
+    print("✓ PASSED\n")
+
+def test_history():
+    """one sample per crawl, /movies/<id>/history downsamples into buckets"""
+    print("\nTEST: /movies/<id>/history ...")
+    crawler = main.get_crawler()
+    movies = [dict(m) for m in crawler.movies[:3]]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(os.path.join(tmp, "history.db"))
+        for day in range(10):
+            movies[0]["rating"] = 8.0 + day / 10
+            store.record(movies, ts=1_000_000 + day * 86400)
+        movie_id = movies[0]["id"]
+
+        raw = list(store.samples(movie_id))
+        assert len(raw) == 10 and raw[0]["rating"] == 8.0 and raw[-1]["rating"] == 8.9
+        assert raw[0]["rank"] == 1 and raw[0]["boxOffice"] == int(movies[0]["box_office_usd"])
+        assert len(list(store.samples(movie_id, 1_000_000 + 2 * 86400, 1_000_000 + 4 * 86400))) == 3
+
+        saved, main.history = main.history, store
+        try:
+            res = client.get(f"/movies/{movie_id}/history?points=5").get_json()
+            assert len(res["points"]) == 5 and res["step"] * 5 > res["to"] - res["from"]
+            res = client.get(f"/movies/{movie_id}/history?step={2 * 86400}").get_json()
+            assert [p["rating"] for p in res["points"]] == [8.1, 8.3, 8.5, 8.7, 8.9]  # pairs averaged, rounded up
+            raw_res = client.get(f"/movies/{movie_id}/history?raw=1").get_json()
+            assert raw_res == raw
+            assert client.get("/movies/tt0000000/history").status_code == 404   # like every /movies/<id>/... route
+            assert client.get("/movies/bogus/history?raw=1").status_code == 404
+        finally:
+            main.history = saved
+    print("✓ PASSED\n")
+
+def test_trending():
+    """climbers and rating gains score, the score decays, /movies/trending serves the top-k"""
+    print("\nTEST: /movies/trending ...")
+    engine = TrendingScores(k=5, half_life=86400)
+    engine.update({"a": (1, 8.0), "b": (2, 8.0), "c": (3, 8.0)}, ts=0)
+    assert engine.trending() == []      # one crawl, no movement yet
+    engine.update({"c": (1, 8.0), "a": (2, 8.1), "b": (3, 8.0), "d": (4, 7.0)}, ts=86400)
+    top = dict(engine.trending())
+    assert list(top)[0] == "d" and top["c"] == 2.0 and "b" not in top
+    assert abs(top["a"] - 1.0) < 1e-9   # -1 place, +0.1 rating
+    engine.update({"c": (1, 8.0), "a": (2, 8.1), "b": (3, 8.0), "d": (4, 7.0)}, ts=2 * 86400)
+    assert dict(engine.trending())["c"] == 1.0   # nothing moved, half a day-old climb is left
+
+    # replaying the stored crawls gives the same scores
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(os.path.join(tmp, "history.db"))
+        movies = [dict(m) for m in main.get_crawler().movies[:3]]
+        store.record(movies, ts=0)
+        movies[0], movies[2] = movies[2], movies[0]
+        store.record(movies, ts=3600)
+        replayed = TrendingScores()
+        replayed.replay(store.crawls())
+        assert replayed.trending(1)[0] == (movies[0]["id"], 2.0)
+
+    crawler = main.get_crawler()
+    saved = crawler.trending
+    crawler.trending = replayed
+    try:
+        ids = [m["id"] for m in client.get("/movies/trending").get_json()]
+        assert len(ids) == 10 and ids[0] == movies[0]["id"]
+        assert ids[1:] == [i for i in crawler.top_rated if i != ids[0]][:9]
+    finally:
+        crawler.trending = saved
+    print("✓ PASSED\n")
+
+def test_new_arrivals():
+    """release dates parsed to ISO, /movies/new-arrivals is newest-first and takes a date window"""
+    print("\nTEST: /movies/new-arrivals ...")
+    crawler = main.get_crawler()
+    assert crawler.parse_release_date("October 14, 1994") == "1994-10-14"
+    assert crawler.parse_release_date("4 July 2003") == "2003-07-04"
+    assert crawler.parse_release_date("sometime in 2003") is None
+    assert all(m.get("release_date_iso") for m in crawler.movies if m.get("release_date_clean"))
+
+    dates = sorted((release_key(m) for m in crawler.movies if release_key(m)), reverse=True)
+    res = client.get("/movies/new-arrivals").get_json()
+    assert [release_key(crawler.movies_dict[m["id"]]) for m in res] == dates[:10]
+
+    res = client.get("/movies/new-arrivals?released_after=1990-01-01&released_before=1994-12-31&limit=100").get_json()
+    window = [release_key(crawler.movies_dict[m["id"]]) for m in res]
+    assert window == [d for d in dates if "1990-01-01" < d <= "1994-12-31"] and window
+
+    # chart records before their details have a year only: listed after that year's dated titles
+    index = ReleaseDateIndex([{"id": "a", "year": 2024}, {"id": "b", "year": 2024, "release_date_iso": "2024-01-01"},
+                              {"id": "c", "year": 2023, "release_date_iso": "2023-12-31"}, {"id": "d"}])
+    assert index.newest() == ["b", "a", "c"] and index.newest(after="2023-12-31") == ["b", "a"]
+    print("✓ PASSED\n")
+
+def test_apply_dataset():
+    """a dataset crawled by another worker is swapped in with its changes logged and indexes rebuilt"""
+    print("\nTEST: apply_dataset / reload_from_cache ...")
+    crawler = main.get_crawler()
+    original = crawler.movies
+    changed = [dict(m) for m in original]
+    changed[0]["rating"] = 1.0
+    try:
+        events = crawler.apply_dataset(changed)
+        assert [(e["type"], e["id"]) for e in events] == [("rating", changed[0]["id"])]
+        assert crawler.movies_dict[changed[0]["id"]]["rating"] == 1.0
+        assert changed[0]["id"] != crawler.top_rated[0] and crawler.top_rated[-1] == changed[0]["id"]
+        assert crawler.reload_from_cache() is not None   # back to what's on disk
+        assert crawler.movies_dict[changed[0]["id"]]["rating"] == original[0]["rating"]
+    finally:
+        crawler.apply_dataset(original)
+    print("✓ PASSED\n")
+
+def test_single_flight():
+    """concurrent /movies/<id> calls for an un-fetched movie share one download, failures are cached briefly"""
+    print("\nTEST: single-flight detail fetch ...")
+    crawler = main.get_crawler()
+    saved = crawler.snapshot()
+    movie = dict(crawler.movies[-1], details_fetched=False)
+    crawler.publish(saved.with_movie(movie, None))
+    calls = []
+
+    def slow_page(url, html=None):
+        calls.append(url)
+        time.sleep(0.2)
+        return html
+
+    try:
+        crawler.fetch_page = slow_page   # IMDb is down
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(executor.map(lambda _: client.get(f"/movies/{movie['id']}"), range(8)))
+        assert all(r.status_code == 200 for r in responses) and len(calls) == 1
+        client.get(f"/movies/{movie['id']}")
+        assert len(calls) == 1          # negative-cached, not retried yet
+
+        crawler._failed_until.clear()   # TTL over, IMDb is back
+        crawler.fetch_page = lambda url: slow_page(url, "<html></html>")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: client.get(f"/movies/{movie['id']}"), range(8)))
+        assert len(calls) == 2 and crawler.movies_dict[movie["id"]]["details_fetched"]
+        assert movie["id"] in crawler.detail_docs and not movie["details_fetched"]   # published as a copy
+    finally:
+        del crawler.fetch_page
+        crawler._failed_until.clear()
+        crawler.publish(saved)
+    print("✓ PASSED\n")
+
+def test_crawl_priority():
+    """interactive and visible fetches jump the background batch, /crawl/status shows the queue"""
+    print("\nTEST: crawl scheduler priorities ...")
+    order = []
+    gate = threading.Event()
+
+    def fetch(movie):
+        gate.wait()
+        order.append(movie["id"])
+        return movie
+
+    scheduler = CrawlScheduler(workers=1)
+    first = scheduler.submit({"id": "m0"}, fetch)        # occupies the only worker
+    time.sleep(0.05)
+    background = [scheduler.submit({"id": f"m{i}"}, fetch) for i in range(1, 10)]
+    scheduler.submit({"id": "m5"}, fetch, VISIBLE)
+    urgent = scheduler.submit({"id": "m9"}, fetch, INTERACTIVE)
+    assert scheduler.submit({"id": "m9"}, fetch, BACKGROUND) is urgent   # no duplicate, no downgrade
+
+    status = scheduler.status()
+    assert status["queued"] == {"interactive": 1, "visible": 1, "background": 7}
+    assert status["running"][0]["id"] == "m0"
+
+    gate.set()
+    for future in [first, urgent] + background:
+        future.result(timeout=5)
+    assert order[:3] == ["m0", "m9", "m5"] and len(order) == 10
+    recent = scheduler.status()["recent"]
+    assert recent["interactive"]["avgTimeToDetail"] < recent["background"]["avgTimeToDetail"]
+
+    # refresh() hands its scheduler to a fresh crawler: same movie, separate jobs, each result to its own crawler
+    live, fresh = IMDbMovieCrawler(), IMDbMovieCrawler()
+    fresh.scheduler = live.scheduler
+    movie = {"id": "tt0000001", "title": "x", "url": "https://x/title/tt0000001/"}
+    for c in (live, fresh):
+        c.publish(Dataset([movie]))
+        c.fetch_page = lambda url, c=c: time.sleep(0.1) or TITLE_PAGE
+    queued = fresh.request_details(movie)
+    asked = live.request_details(movie, INTERACTIVE)
+    assert asked is not queued and asked.result(timeout=5) is not queued.result(timeout=5)
+    assert live.movies_dict["tt0000001"]["details_fetched"] and fresh.movies_dict["tt0000001"]["details_fetched"]
+
+    res = client.get("/crawl/status").get_json()
+    assert set(res) == {"workers", "queued", "running", "recent", "upstream"}
+    print("✓ PASSED\n")
+
+def test_snapshots():
+    """writers publish new snapshots, a reader's snapshot never changes under it"""
+    print("\nTEST: immutable snapshots ...")
+    crawler = main.get_crawler()
+    before = crawler.snapshot()
+    try:
+        movie = dict(before.movies[0], rating=1.0)
+        crawler.publish_movie(movie)
+        after = crawler.snapshot()
+        assert after is not before and after.movies_dict[movie["id"]]["rating"] == 1.0
+        assert before.movies_dict[movie["id"]]["rating"] != 1.0          # old readers unaffected
+        assert json.loads(after.detail_docs[movie["id"]])["rating"] == 1.0
+        try:
+            before.movies = ()
+            assert False, "snapshot was writable"
+        except AttributeError:
+            pass
+        try:
+            before.detail_docs[movie["id"]] = b"{}"
+            assert False, "detail docs were writable"
+        except TypeError:
+            pass
+
+        # readers hammering the api while a writer keeps publishing never see a half-built catalog
+        stop = threading.Event()
+        def writer():
+            n = 0
+            while not stop.is_set():
+                crawler.publish_movie(dict(crawler.movies[n % 20]))
+                n += 1
+        t = threading.Thread(target=writer)
+        t.start()
+        try:
+            for _ in range(50):
+                res = client.get("/movies?facets=1").get_json()
+                assert len(res["results"]) == len(before.movies)
+        finally:
+            stop.set()
+            t.join()
+    finally:
+        crawler.publish(before)
+
+    # a batch replaces records in place and appends new ones, in one copy
+    data = Dataset.build(before.movies[:3])
+    batch = data.with_movies([(dict(data.movies[1], rating=1.0), None), ({"id": "tt0000001", "title": "new"}, b"{}")])
+    assert [m["id"] for m in batch.movies] == [m["id"] for m in data.movies] + ["tt0000001"]
+    assert batch.movies[1]["rating"] == 1.0 and batch.movies_dict["tt0000001"]["title"] == "new"
+    assert data.movies[1]["id"] not in batch.detail_docs and batch.search_index is data.search_index
+
+    # a record published while apply_dataset is building isn't dropped by its swap
+    other = IMDbMovieCrawler()
+    other.publish(Dataset.build(before.movies[:3]))
+    real_build = Dataset.build
+    def slow_build(*args, **kwargs):
+        time.sleep(0.2)
+        return real_build(*args, **kwargs)
+    Dataset.build = slow_build
+    try:
+        t = threading.Thread(target=other.apply_dataset, args=([dict(m) for m in before.movies[:3]],))
+        t.start()
+        time.sleep(0.05)
+        other.publish_movie(dict(other.movies[0], rating=1.0))
+        t.join()
+    finally:
+        Dataset.build = real_build
+    assert other.movies_dict[before.movies[0]["id"]]["rating"] == 1.0
+
+    # a detail fetch that started before a refresh only adds its groups to the refreshed record,
+    # and a title the refresh dropped isn't put back
+    first, second = (dict(m, details_fetched=False, groups=[]) for m in before.movies[:2])
+    other.publish(Dataset.build([first, second]))
+    fetched = [dict(first, rating=1.0, rank=99, genres=["Western"]), dict(second, genres=["Western"])]
+    other.apply_dataset([dict(first, rating=9.9, rank=1)])
+    merged = other.publish_movie(fetched[0], ["genres"])
+    assert merged["rating"] == 9.9 and merged["rank"] == 1 and merged["genres"] == ["Western"]
+    assert merged["groups"] == ["genres"] and other.movies_dict[first["id"]] is merged
+    assert other.publish_movie(fetched[1], ["genres"]) is fetched[1] and second["id"] not in other.movies_dict
+    print("✓ PASSED\n")
+
+def test_charts():
+    """Several charts in one dataset: overlapping titles stored and fetched once, ?chart= picks a list"""
+    print("\nTEST: multiple charts ...")
+    crawler = main.get_crawler()
+    saved = crawler.snapshot()
+    top, popular = list(saved.movies[:5]), [saved.movies[3], saved.movies[0], saved.movies[40]]
+
+    def chart_page(movies):
+        items = [{"position": pos, "item": {"name": m["title"], "url": f"/title/{m['id']}/",
+                                            "aggregateRating": {"ratingValue": m["rating"]}}}
+                 for pos, m in enumerate(movies, 1)]
+        return ('<script type="application/ld+json">%s</script>'
+                % json.dumps({"itemListElement": items}))
+    pages = {CHARTS["top"]: chart_page(top), CHARTS["popular"]: chart_page(popular)}
+
+    fresh = IMDbMovieCrawler()
+    fresh.fetch_page = pages.get
+    assert fresh.fetch_top_movies(use_cache=False, charts=["top", "popular"])
+    assert len(fresh.movies) == 6                                      # 5 + 1 title only on popular
+    assert fresh.charts["popular"] == tuple(m["id"] for m in popular)
+    assert fresh.movies_dict[top[3]["id"]]["rank"] == 4                # rank stays the primary chart's
+    assert "rank" not in fresh.movies_dict[saved.movies[40]["id"]]
+
+    # details of the union, each title once
+    fetched = []
+    fresh.fetch_movie_details = lambda m, groups=None: fetched.append(m["id"]) or fresh.publish_movie(dict(m, details_fetched=True))
+    for f in [fresh.request_details(fresh.movies_dict[i]) for ids in fresh.charts.values() for i in ids]:
+        f.result(timeout=5)
+    assert sorted(fetched) == sorted(fresh.movies_dict)
+
+    try:
+        crawler.apply_dataset([dict(saved.movies_dict[i]) for i in fresh.movies_dict], fresh.charts)
+        data = crawler.snapshot()
+        assert data.chart_movies("popular")[0] is data.chart_movies()[3]   # one record, two lists
+        res = client.get("/movies?chart=popular").get_json()
+        assert [m["id"] for m in res] == list(fresh.charts["popular"])
+        assert len(client.get("/movies").get_json()) == 5
+        assert client.get("/movies?chart=nope").status_code == 404
+        assert client.get("/movies/facets?chart=nope").status_code == 404
+        # facets without filters count the list /movies shows by default, the primary chart
+        facets = client.get("/movies/facets").get_json()
+        assert facets == client.get("/movies?facets=1").get_json()["facets"]
+        assert sum(facets["decade"].values()) == 5
+
+        # history samples rank the primary chart's titles only, not list positions past its end
+        store = HistoryStore(os.path.join(tempfile.mkdtemp(), "history.db"))
+        real_history, imdb_movie_crawler.history = imdb_movie_crawler.history, store
+        try:
+            crawler.record_history()
+        finally:
+            imdb_movie_crawler.history = real_history
+        (_, sample), = store.crawls()
+        assert sample == {m["id"]: (pos, m["rating"]) for pos, m in enumerate(data.chart_movies(), 1)}
+        charts = client.get("/charts").get_json()
+        assert charts == [{"name": "top", "count": 5, "primary": True},
+                          {"name": "popular", "count": 3, "primary": False}]
+        print(f"  charts: {charts}")
+    finally:
+        crawler.apply_dataset(list(saved.movies), saved.charts)
+    print("✓ PASSED\n")
+
+TITLE_PAGE = """<html><head><meta name="description" content="meta plot"></head><body>
+<div data-testid="hero-title-block__metadata"><a>1999</a></div>
+<div data-testid="genres"><a class="ipc-chip"><span class="ipc-chip__text">Drama</span></a>
+  <a class="ipc-chip"><span class="ipc-chip__text">Crime</span></a></div>
+<span data-testid="plot-xl">A banker goes to prison.</span>
+<div data-testid="title-pc-principal-credit"><a class="ipc-metadata-list-item__list-content-item">Frank Darabont</a></div>
+<div data-testid="title-cast-item"><a data-testid="title-cast-item__actor">Tim Robbins</a></div>
+<li data-testid="title-details-releasedate"><a class="ipc-metadata-list-item__list-content-item">October 14, 1994 (United States)</a></li>
+<li data-testid="title-details-origin"><a>United States</a></li>
+<li data-testid="title-boxoffice-budget"><span class="ipc-metadata-list-item__list-content-item">$25,000,000 (estimated)</span></li>
+<div data-testid="award_information"><a>Nominated for 7 Oscars</a><span>21 wins &amp; 43 nominations</span></div>
+<li data-testid="title-techspec_runtime"><div class="ipc-metadata-list-item__list-content-item">2h 22m</div></li>
+</body></html>"""
+
+def test_field_groups():
+    """Lazy detail fetching: only the field groups asked for are parsed, later requests fill in the rest"""
+    print("\nTEST: field groups ...")
+    crawler = IMDbMovieCrawler()
+    movie = {"id": "tt0111161", "title": "The Shawshank Redemption", "rating": 9.3,
+             "url": "https://www.imdb.com/title/tt0111161/"}
+    crawler.publish(Dataset([movie]))
+    pages = []
+    crawler.fetch_page = lambda url: pages.append(url) or TITLE_PAGE
+
+    m = crawler.get_movie_details(movie, groups=["genres"])
+    assert m["genres"] == ["Drama", "Crime"] and m["country"] == "United States"
+    assert m["plot"] == "A banker goes to prison."
+    assert "cast" not in m and "budget" not in m and "runtime" not in m
+    assert m["groups"] == ["genres"] and not m["details_fetched"]
+    assert crawler.get_movie_details(m, groups=["genres"]) is m and len(pages) == 1   # nothing missing
+
+    m = crawler.get_movie_details(m, groups=["credits", "genres"])
+    assert m["director"] == ["Frank Darabont"] and m["cast"][0]["name"] == "Tim Robbins"
+    assert m["groups"] == ["genres", "credits"] and len(pages) == 2
+    assert missing_groups(m) == ["core", "boxoffice", "awards"]
+
+    # the rest: the record ends up the same as one parsed in full, and gets its detail doc
+    m = crawler.get_movie_details(m)
+    other = IMDbMovieCrawler()
+    other.publish(Dataset([movie]))
+    full = other.parse_movie_details(movie, TITLE_PAGE)
+    assert m["details_fetched"] and m["groups"] == list(ALL_GROUPS) and len(pages) == 3
+    volatile = ("generation", "updated_at")
+    assert {k: v for k, v in m.items() if k not in volatile} == {k: v for k, v in full.items() if k not in volatile}
+    assert m["id"] in crawler.detail_docs
+    print(f"  {len(pages)} page fetches, groups {m['groups']}")
+
+    # a full-detail request while a genres-only job is queued or running gets the full record
+    crawler = IMDbMovieCrawler()
+    crawler.publish(Dataset([movie]))
+    crawler.fetch_page = lambda url: time.sleep(0.1) or TITLE_PAGE
+    crawler.save_cache = lambda push=True: None
+    partial = crawler.fetch_movies_details_parallel  # the CLI genre filter's path
+    genres_only = threading.Thread(target=partial, args=([movie],), kwargs={"groups": ["genres"]})
+    genres_only.start()
+    time.sleep(0.02)
+    assert crawler.request_details(movie, INTERACTIVE).result(timeout=5)["details_fetched"]
+    genres_only.join()
+    print("✓ PASSED\n")
+
+class FakeResponse:
+    def __init__(self, status_code, text=""):
+        self.status_code, self.text = status_code, text
+
+def test_fetch_resilience():
+    """retries with backoff, per-host circuit breaker, failure ledger, deadline-bounded detail crawl"""
+    print("\nTEST: fetch retries / circuit breaker / deadline ...")
+    calls = []
+    status = {"code": 503}
+    def fake_get(url, headers=None, timeout=None):
+        if urlsplit(url).netloc != "www.imdb.com":
+            return FakeResponse(404)   # the image prefetch of records other tests published, not ours
+        calls.append(url)
+        return FakeResponse(status["code"], "<html></html>")
+    real_get, real_backoff, real_history = imdb_movie_crawler.requests.get, imdb_movie_crawler.backoff, imdb_movie_crawler.history
+    imdb_movie_crawler.requests.get = fake_get
+    imdb_movie_crawler.backoff = lambda attempt: 0
+    try:
+        crawler = IMDbMovieCrawler()
+        url = "https://www.imdb.com/title/tt0111161/"
+        assert crawler.fetch_page(url) is None and len(calls) == RETRIES + 1
+        assert crawler.failures[url]["count"] == RETRIES + 1 and crawler.failures[url]["error"] == "HTTP 503"
+        crawler.fetch_page(url)                           # 5 failures in a row: breaker opens
+        breaker = crawler.breaker_for(url)
+        assert breaker.state == "open"
+        calls.clear()
+        assert crawler.fetch_page("https://www.imdb.com/title/tt0068646/") is None and calls == []  # fails fast
+
+        # cooldown over: one trial request, it works, the breaker closes and the ledger entry goes
+        breaker.cooldown = 0.05
+        time.sleep(0.06)
+        status["code"] = 200
+        assert crawler.fetch_page(url) == "<html></html>" and breaker.state == "closed"
+        assert url not in crawler.failures and len(calls) == 1
+
+        # a 404 isn't retried and doesn't count against the host
+        status["code"] = 404
+        calls.clear()
+        assert crawler.fetch_page(url) is None and len(calls) == 1 and breaker.failures == 0
+        assert crawler.upstream_status()["breakers"] == {"www.imdb.com": {"state": "closed", "failures": 0}}
+
+        # the ledger is bounded, and /crawl/status can read it while fetch threads write it
+        stop = threading.Event()
+        def reader():
+            while not stop.is_set():
+                crawler.upstream_status()
+        t = threading.Thread(target=reader)
+        t.start()
+        try:
+            for n in range(imdb_movie_crawler.FAILURES_KEPT + 50):
+                crawler.record_failure(f"https://www.imdb.com/title/tt{n:07d}/", "HTTP 503")
+        finally:
+            stop.set()
+            t.join()
+        status_now = crawler.upstream_status()
+        assert len(crawler.failures) == status_now["failing"] == imdb_movie_crawler.FAILURES_KEPT
+        assert status_now["recent"][0]["url"].endswith(f"tt{imdb_movie_crawler.FAILURES_KEPT + 49:07d}/")
+        assert "https://www.imdb.com/title/tt0000000/" not in crawler.failures   # oldest went first
+
+        # deadline: stop waiting, return what's missing, save again when the rest is done
+        with tempfile.TemporaryDirectory() as tmp:
+            imdb_movie_crawler.history = HistoryStore(os.path.join(tmp, "history.db"))
+            saved = []
+            slow = IMDbMovieCrawler()
+            slow.save_cache = lambda: saved.append(sum(1 for m in slow.movies if m.get("details_fetched")))
+            movies = [{"id": f"tt{i:07d}", "title": f"m{i}", "url": f"https://x/title/tt{i:07d}/"} for i in range(6)]
+            slow.publish(Dataset(movies))
+            def fetch_page(url):
+                time.sleep(0 if url < "https://x/title/tt0000003" else 0.8)   # half of them are slow
+                return TITLE_PAGE
+            slow.fetch_page = fetch_page
+            start = time.time()
+            missing = slow.fetch_movies_details_parallel(slow.movies, max_workers=6, deadline=time.time() + 0.6)
+            assert time.time() - start < 0.8 and [m["id"] for m in missing] == [m["id"] for m in movies[3:]]
+            assert saved == [6 - len(missing)]
+            deadline = time.time() + 5
+            while len(saved) < 2 and time.time() < deadline:
+                time.sleep(0.05)
+            assert saved[-1] == 6                            # the background queue finished the rest
+            print(f"  deadline: {6 - len(missing)}/6 in time, rest saved later")
+    finally:
+        imdb_movie_crawler.requests.get = real_get
+        imdb_movie_crawler.backoff = real_backoff
+        imdb_movie_crawler.history = real_history
+    print("✓ PASSED\n")
+
+def test_cache_file():
+    """atomic cache writes: checksum, fallback to the previous file, write-behind batching"""
+    print("\nTEST: crash-safe movies_cache.json ...")
+    saved = imdb_movie_crawler.CACHE_FILE, imdb_movie_crawler.history
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            path = imdb_movie_crawler.CACHE_FILE = os.path.join(tmp, "movies_cache.json")
+            imdb_movie_crawler.history = HistoryStore(os.path.join(tmp, "history.db"))
+            movies = [{"id": f"tt{i:07d}", "title": f"m{i}", "rating": 8.0} for i in range(5)]
+            crawler = IMDbMovieCrawler()
+            crawler.publish(Dataset(movies))
+            crawler.save_cache()
+            with open(path, encoding="utf-8") as f:
+                assert json.load(f)["checksum"] == payload_checksum(read_json_verified(path))
+            crawler.publish_movie(dict(movies[0], rating=9.9))
+            crawler.save_cache()
+            assert {"movies_cache.json", "movies_cache.json.bak"} <= set(os.listdir(tmp))
+            assert not [name for name in os.listdir(tmp) if name.endswith(".tmp")]   # no temp files left behind
+
+            # a torn write (or a flipped byte) is rejected, the previous file is used
+            with open(path, "r+", encoding="utf-8") as f:
+                f.truncate(100)
+            loaded = IMDbMovieCrawler()
+            assert loaded.load_cache() and loaded.movies_dict["tt0000000"]["rating"] == 8.0
+            with open(path + ".bak", encoding="utf-8") as f:
+                data = json.load(f)
+            data["movies"][1]["rating"] = 1.0
+            with open(path + ".bak", "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            assert read_json_verified(path + ".bak") is None and not IMDbMovieCrawler().load_cache()
+
+            # write-behind: a burst of publishes becomes one write, off the caller's thread
+            writes = []
+            real_save = crawler.save_cache
+            crawler.save_cache = lambda push=True: writes.append(len(crawler._dirty_ids)) or real_save(push)
+            crawler.cache_flush_interval = 0.2
+            start = time.time()
+            for m in movies:
+                crawler.publish_movie(dict(m, rating=7.0))
+            assert time.time() - start < 0.1 and not writes
+            deadline = time.time() + 3
+            while not writes and time.time() < deadline:
+                time.sleep(0.05)
+            time.sleep(0.1)
+            assert writes == [5] and not crawler._dirty_ids
+            reloaded = IMDbMovieCrawler()
+            assert reloaded.load_cache() and all(m["rating"] == 7.0 for m in reloaded.movies)
+            print(f"  {len(movies)} publishes -> {len(writes)} write")
+
+            # our own write isn't reloaded; someone else's is, keeping details we fetched meanwhile
+            crawler.cache_flush_interval = None
+            crawler.save_cache = real_save
+            crawler.save_cache()
+            before = crawler.data
+            assert crawler.reload_from_cache() == [] and crawler.data is before
+            crawler.publish_movie(dict(movies[1], details_fetched=True, director="Someone"))
+            other = IMDbMovieCrawler()
+            assert other.load_cache()
+            other.publish_movie(dict(movies[1], rating=6.5))
+            other.save_cache()
+            assert crawler.reload_from_cache() is not None
+            merged = crawler.movies_dict["tt0000001"]
+            assert merged["rating"] == 6.5 and merged["director"] == "Someone" and merged["details_fetched"]
+            assert crawler.cache_checksum == other.cache_checksum
+
+            # a crawl.py run writes the file between two write-behind saves: merged in, not overwritten
+            cli = IMDbMovieCrawler()
+            assert cli.load_cache()
+            cli.publish_movie(dict(cli.movies_dict["tt0000002"], rating=5.5))
+            cli.save_cache()
+            time.sleep(1.1)   # updated_at is in seconds: our details come after the file's copy
+            crawler.publish_movie(dict(crawler.movies_dict["tt0000003"], details_fetched=True,
+                                       groups=list(ALL_GROUPS), director="Later"))
+            crawler.save_cache()
+            on_disk = IMDbMovieCrawler()
+            assert on_disk.load_cache() and on_disk.movies_dict["tt0000002"]["rating"] == 5.5
+            assert on_disk.movies_dict["tt0000003"]["director"] == "Later"
+            assert crawler.cache_checksum == on_disk.cache_checksum
+        finally:
+            imdb_movie_crawler.CACHE_FILE, imdb_movie_crawler.history = saved
+    print("✓ PASSED\n")
+
+if __name__ == "__main__":
+    try:
+        test_detail_docs()
+        test_export()
+        test_json_provider()
+        test_people()
+        test_similar()
+        test_facets()
+        test_image_proxy()
+        test_avatars()
+        test_changes()
+        test_history()
+        test_trending()
+        test_new_arrivals()
+        test_apply_dataset()
+        test_single_flight()
+        test_crawl_priority()
+        test_snapshots()
+        test_charts()
+        test_field_groups()
+        test_fetch_resilience()
+        test_cache_file()
+    except KeyboardInterrupt:
+        print("\n\n✓ Test interrupted by user.\n")
+    except Exception as e:
+        print(f"\n✗ Test failed: {e}\n")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test the ASGI variant: same payloads as Flask, coalesced on-demand detail fetches
+"""
+import sys
+import os
+import asyncio
+import time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("CACHE_WRITE_BEHIND", "0")   # tests never rewrite the real movies_cache.json
+
+import httpx
+
+import asgi
+import main
+
+flask_client = main.app.test_client()
+
+def test_same_payloads():
+    """native and mounted routes answer exactly like the flask app"""
+    print("\nTEST: asgi payloads ...")
+
+    async def run():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for path in ["/movies/tt0111161", "/movies/tt0000000", "/movies/trending",
+                         "/movies/suggest?q=god", "/people/Christopher%20Nolan"]:
+                res = await client.get(path)
+                expected = flask_client.get(path)
+                assert res.status_code == expected.status_code, path
+                assert res.json() == expected.get_json(), path
+                print(f"  {path}: {res.status_code}")
+
+    asyncio.run(run())
+    print("✓ PASSED\n")
+
+def test_coalesced_fetch():
+    """concurrent requests for a movie without details share one IMDb download, with the background crawl too"""
+    print("\nTEST: asgi coalesced detail fetch ...")
+    crawler = main.get_crawler()
+    saved = crawler.snapshot()
+    movie = dict(crawler.movies[-1], details_fetched=False)
+    crawler.publish(saved.with_movie(movie, None))
+    calls = []
+
+    def slow_imdb(url):
+        calls.append(url)
+        time.sleep(0.2)
+        return None   # IMDb down
+
+    async def run():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            background = crawler.request_details(movie)   # the warm-up batch got there first
+            responses = await asyncio.gather(*(client.get(f"/movies/{movie['id']}") for _ in range(10)))
+            assert all(r.status_code == 200 and r.json()["title"] == movie["title"] for r in responses)
+            assert len(calls) == 1 and background.done() and not crawler._inflight
+            # the fetch failed, a retry right away goes to IMDb from neither app
+            await client.get(f"/movies/{movie['id']}")
+            flask_client.get(f"/movies/{movie['id']}")
+            assert len(calls) == 1 and crawler.fetch_failed_recently(movie["id"])
+
+    crawler.fetch_page = slow_imdb
+    try:
+        asyncio.run(run())
+    finally:
+        del crawler.fetch_page
+        crawler._failed_until.pop(movie["id"], None)
+        crawler.publish(saved)
+    print("✓ PASSED\n")
+
+if __name__ == "__main__":
+    try:
+        test_same_payloads()
+        test_coalesced_fetch()
+    except KeyboardInterrupt:
+        print("\n\n✓ Test interrupted by user.\n")
+    except Exception as e:
+        print(f"\n✗ Test failed: {e}\n")
+        import traceback
+        traceback.print_exc()
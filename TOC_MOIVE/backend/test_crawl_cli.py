@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test the crawl.py command line tool against a copy of the cache and a fake IMDb
+"""
+import sys
+import os
+import json
+import shutil
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import crawl
+import imdb_movie_crawler
+from imdb_movie_crawler import CHARTS, IMDbMovieCrawler
+from history_store import HistoryStore
+
+def test_details_resume_and_export():
+    """details fetches only what's missing, skips what the checkpoint already has, export dumps it"""
+    print("\nTEST: crawl.py details / export ...")
+    saved = imdb_movie_crawler.CACHE_FILE, imdb_movie_crawler.history, IMDbMovieCrawler.fetch_page
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = os.path.join(tmp, "movies_cache.json")
+        shutil.copy(saved[0], cache)
+        with open(cache, encoding="utf-8") as f:
+            data = json.load(f)
+        missing = [m["id"] for m in data["movies"][:3]]
+        for m in data["movies"][:3]:
+            m["details_fetched"] = False
+        with open(cache, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+        # an earlier run got as far as the first movie before it was killed
+        checkpoint = os.path.join(tmp, "crawl.ckpt")
+        with open(checkpoint, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"id": missing[0], "movie": dict(data["movies"][0], details_fetched=True)}) + "\n")
+            f.write('{"id": "tt00')   # torn write
+
+        fetched = []
+        def fake_page(self, url):
+            fetched.append(url)
+            return "<html></html>"
+
+        try:
+            imdb_movie_crawler.CACHE_FILE = cache
+            imdb_movie_crawler.history = HistoryStore(os.path.join(tmp, "history.db"))
+            IMDbMovieCrawler.fetch_page = fake_page
+            code = crawl.main(["--progress", "json", "details", "--concurrency", "4",
+                               "--rate", "50", "--checkpoint", checkpoint, "--no-images"])
+            assert code == 0
+            assert sorted(u.split("/")[-2] for u in fetched) == sorted(missing[1:])
+            assert not os.path.exists(checkpoint)
+            assert list(imdb_movie_crawler.history.crawls(0)) == []   # detail pages aren't a chart crawl, no history sample
+
+            crawler = IMDbMovieCrawler()
+            crawler.load_cache()
+            assert all(crawler.movies_dict[i]["details_fetched"] for i in missing)
+
+            out = os.path.join(tmp, "movies.ndjson")
+            assert crawl.main(["--progress", "json", "export", "-o", out]) == 0
+            with open(out, encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+            assert len(lines) == len(crawler.movies)
+        finally:
+            imdb_movie_crawler.CACHE_FILE, imdb_movie_crawler.history, IMDbMovieCrawler.fetch_page = saved
+    print("✓ PASSED\n")
+
+def page_of(items: list) -> str:
+    return '<script type="application/ld+json">%s</script>' % json.dumps({"itemListElement": items})
+
+def test_chart_then_export_since():
+    """records a chart crawl changed are stamped above the cache's generations (export --since finds them),
+    a title that left the primary chart loses its rank"""
+    print("\nTEST: crawl.py chart / export --since ...")
+    saved = imdb_movie_crawler.CACHE_FILE, imdb_movie_crawler.history, IMDbMovieCrawler.fetch_page
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = os.path.join(tmp, "movies_cache.json")
+        shutil.copy(saved[0], cache)
+        with open(cache, encoding="utf-8") as f:
+            data = json.load(f)
+        movies = data["movies"]
+        for n, m in enumerate(movies):
+            m["generation"] = 1000 + n   # a cache that has seen far more changes than one chart has titles
+        with open(cache, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        since = max(m["generation"] for m in movies)   # what a client last saw as X-Generation
+        items = [{"position": m["rank"], "item": {"name": m["title"], "url": f"/title/{m['id']}/",
+                                                  "aggregateRating": {"ratingValue": m["rating"]}}}
+                 for m in movies]
+        items[0]["item"]["aggregateRating"]["ratingValue"] = 1.0
+        page = page_of(items)
+        try:
+            imdb_movie_crawler.CACHE_FILE = cache
+            imdb_movie_crawler.history = HistoryStore(os.path.join(tmp, "history.db"))
+            IMDbMovieCrawler.fetch_page = lambda self, url: page
+            assert crawl.main(["--progress", "json", "chart", "--no-images"]) == 0
+
+            out = os.path.join(tmp, "changed.ndjson")
+            assert crawl.main(["--progress", "json", "export", "--since", str(since), "-o", out]) == 0
+            with open(out, encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+            assert [line["movie"]["id"] for line in lines] == [movies[0]["id"]]
+            assert lines[0]["movie"]["rating"] == 1.0 and lines[0]["generation"] > since
+
+            # a title that fell off the primary chart but is still on another one has no rank left
+            dropped = items.pop(1)
+            pages = {CHARTS["top"]: page_of(items), CHARTS["popular"]: page_of([dict(dropped, position=1)])}
+            IMDbMovieCrawler.fetch_page = lambda self, url: pages[url]
+            assert crawl.main(["--progress", "json", "chart", "--charts", "top,popular", "--no-images"]) == 0
+            crawler = IMDbMovieCrawler()
+            crawler.load_cache()
+            assert "rank" not in crawler.movies_dict[movies[1]["id"]] and crawler.charts["popular"] == (movies[1]["id"],)
+        finally:
+            imdb_movie_crawler.CACHE_FILE, imdb_movie_crawler.history, IMDbMovieCrawler.fetch_page = saved
+    print("✓ PASSED\n")
+
+if __name__ == "__main__":
+    try:
+        test_details_resume_and_export()
+        test_chart_then_export_since()
+    except KeyboardInterrupt:
+        print("\n\n✓ Test interrupted by user.\n")
+    except Exception as e:
+        print(f"\n✗ Test failed: {e}\n")
+        import traceback
+        traceback.print_exc()
@@ -54,9 +54,62 @@ def test_search():
     print("✅ Search functionality test completed!")
     print("="*90 + "\n")
 
+def test_fuzzy_search():
+    """Typos and people names should still find the right movie, best match first"""
+    print("\n" + "="*90)
+    print(" " * 27 + "FUZZY SEARCH (TRIGRAM INDEX)")
+    print("="*90 + "\n")
+    
+    crawler = IMDbMovieCrawler()
+    assert crawler.fetch_top_movies(), "Failed to fetch movies"
+    crawler.build_indexes()
+    
+    # (query, title expected as the top hit)
+    cases = [
+        ("godfathr",        "The Godfather"),
+        ("shawshnk",        "The Shawshank Redemption"),
+        ("frank darabont",  None),   # director, checked below
+        ("morgan freemn",   None),   # cast member with a typo
+    ]
+    for query, expected_title in cases:
+        results = crawler.search_by_name(query)
+        print(f"Search: '{query}' → {[m.get('title') for m in results[:3]]}")
+        assert results, f"No results for '{query}'"
+        if expected_title:
+            assert results[0].get('title') == expected_title
+    
+    by_people = crawler.search_by_name("morgan freemn")
+    assert any(
+        actor.get('name') == "Morgan Freeman"
+        for actor in by_people[0].get('cast', []) if isinstance(actor, dict)
+    )
+    
+    assert crawler.search_by_name("zzqxv") == []
+    print("\n✅ Fuzzy search test completed!\n")
+
+def test_suggest():
+    """Typeahead prefixes should hit any word of a title or a person's name"""
+    crawler = IMDbMovieCrawler()
+    assert crawler.fetch_top_movies(), "Failed to fetch movies"
+    crawler.build_indexes()
+    
+    titles = [s.get('title') for s in crawler.suggest_index.suggest("godf")]
+    print(f"Suggest: 'godf' → {titles}")
+    assert titles[0] == "The Godfather"
+    
+    names = [s.get('name') for s in crawler.suggest_index.suggest("morgan fr")]
+    assert names == ["Morgan Freeman"]
+    
+    # results are bounded no matter what the client asks for
+    assert len(crawler.suggest_index.suggest("t", limit=1000)) == crawler.suggest_index.max_limit
+    assert crawler.suggest_index.suggest("   ") == []
+    print("✅ Suggest test completed!\n")
+
 if __name__ == "__main__":
     try:
         test_search()
+        test_fuzzy_search()
+        test_suggest()
     except KeyboardInterrupt:
         print("\n\n✓ Test interrupted by user.\n")
     except Exception as e:
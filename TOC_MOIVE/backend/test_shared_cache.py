@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Test the shared cache tier: the backends, and two crawlers sharing one crawl through it
+"""
+import sys
+import os
+import json
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import imdb_movie_crawler
+from imdb_movie_crawler import CHARTS, IMDbMovieCrawler
+from history_store import HistoryStore
+from shared_cache import FakeRedis, RedisBackend, SQLiteBackend, SharedCatalog
+from crawl_scheduler import INTERACTIVE, VISIBLE
+
+CHART_PAGE = '<script type="application/ld+json">%s</script>' % json.dumps({"itemListElement": [
+    {"position": 1, "item": {"name": "The Shawshank Redemption", "url": "/title/tt0111161/",
+                             "aggregateRating": {"ratingValue": 9.3}}},
+    {"position": 2, "item": {"name": "The Godfather", "url": "/title/tt0068646/",
+                             "aggregateRating": {"ratingValue": 9.2}}},
+]})
+TITLE_PAGE = """<div data-testid="genres"><a class="ipc-chip"><span class="ipc-chip__text">Drama</span></a></div>
+<li data-testid="title-details-origin"><a>United States</a></li>"""
+
+class OtherProcess(SharedCatalog):
+    owner = b"other-host:1"   # lease holder id of a process on another host
+
+def test_backends():
+    """sqlite file and redis client (here the in-process stand-in) behave the same"""
+    print("\nTEST: shared cache backends ...")
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in [SQLiteBackend(os.path.join(tmp, "shared.db")), RedisBackend(FakeRedis())]:
+            name = type(backend).__name__
+            backend.set_many({"a": b"1", "b": b"2"})
+            backend.set_many({"short": b"x"}, ttl=0.1)
+            assert backend.get("a") == b"1" and backend.get("nope") is None
+            assert backend.get_many(["a", "b", "nope", "short"]) == {"a": b"1", "b": b"2", "short": b"x"}
+            assert backend.add("lease", b"me", ttl=0.1) and not backend.add("lease", b"you", ttl=0.1)
+            time.sleep(0.15)
+            assert backend.get("short") is None
+            assert backend.add("lease", b"you", ttl=10) and backend.get("lease") == b"you"   # expired, taken over
+            backend.push("q", b"1")
+            backend.push("q", b"2")
+            assert backend.drain("q") == [b"1", b"2"] and backend.drain("q") == []
+            print(f"  {name}: ok")
+
+        # wsgi.py's master: writes queue up without a flush thread, so nothing runs across the fork
+        catalog = SharedCatalog(RedisBackend(FakeRedis()), "t")
+        catalog.threads = False
+        catalog.put_movie({"id": "tt0111161", "title": "The Shawshank Redemption"})
+        assert catalog._pid is None and catalog.movie("tt0111161") is None
+        catalog.flush()
+        assert catalog.movie("tt0111161")["title"] == "The Shawshank Redemption"
+    print("✓ PASSED\n")
+
+def test_fleet_shares_one_crawl():
+    """one process crawls, the other loads its catalog and reads its details through, never calling IMDb"""
+    print("\nTEST: two processes, one crawl ...")
+    saved = imdb_movie_crawler.CACHE_FILE, imdb_movie_crawler.history
+    backend = RedisBackend(FakeRedis())
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            imdb_movie_crawler.CACHE_FILE = os.path.join(tmp, "movies_cache.json")
+            imdb_movie_crawler.history = HistoryStore(os.path.join(tmp, "history.db"))
+
+            a, b = IMDbMovieCrawler(), IMDbMovieCrawler()
+            a.shared, b.shared = SharedCatalog(backend, "t"), OtherProcess(backend, "t")
+            imdb = []
+            a.fetch_page = lambda url: imdb.append(url) or (CHART_PAGE if url == CHARTS["top"] else TITLE_PAGE)
+            def no_imdb(url):
+                raise AssertionError(f"b went to IMDb for {url}")
+            b.fetch_page = no_imdb
+
+            assert a.fetch_top_movies() and a.holds_crawl_lease()
+            a.shared.flush()
+            assert not b.holds_crawl_lease()
+            assert b.fetch_top_movies() and [m["id"] for m in b.movies] == ["tt0111161", "tt0068646"]
+
+            # a fetches details (write-behind), b gets them through the shared cache
+            movie = a.get_movie_details(a.movies[0])
+            assert movie["details_fetched"] and len(imdb) == 2
+            a.shared.flush()
+            got = b.get_movie_details(b.movies[0])
+            assert got["genres"] == ["Drama"] and got["generation"] == movie["generation"]
+            assert b.detail_docs["tt0111161"] == a.detail_docs["tt0111161"]
+
+            # a's next crawl result reaches b as a change set
+            a.publish_movie(dict(a.movies_dict["tt0068646"], rating=9.0))
+            a.save_cache()
+            a.shared.flush()
+            events = b.sync_shared()
+            assert {"type": "rating", "id": "tt0068646", "title": "The Godfather", "from": 9.2, "to": 9.0} in events
+            assert b.movies_dict["tt0068646"]["rating"] == 9.0 and b.sync_shared() is None
+            print(f"  IMDb requests: {len(imdb)} (all from a), b synced {len(events)} change(s)")
+
+            # generations are counted per process: a catalog with a lower one than b has seen is
+            # still news, and a record with a generation another doc was filed under doesn't get that doc
+            a.generation = 1
+            a.publish_movie(dict(a.movies_dict["tt0068646"], rating=8.9))
+            a.save_cache()
+            a.shared.flush()
+            assert a.movies_dict["tt0068646"]["generation"] <= b.generation
+            assert b.sync_shared() and b.movies_dict["tt0068646"]["rating"] == 8.9
+            clash = dict(a.movies_dict["tt0111161"], rating=1.0, generation=movie["generation"])
+            a.shared.put_movie(clash)   # its own doc is still on its way
+            a.shared.flush()
+            assert a.shared.movie_and_doc("tt0111161") == (clash, None)
+
+            # a crawl running past the lease length keeps the lease, it's renewed meanwhile
+            real_lease, imdb_movie_crawler.CRAWL_LEASE = imdb_movie_crawler.CRAWL_LEASE, 0.3
+            try:
+                renewing = a.renew_crawl_lease()
+                time.sleep(0.5)
+                assert not b.holds_crawl_lease()
+                renewing.set()
+                time.sleep(0.4)
+                assert b.holds_crawl_lease()   # crawl over, not renewed: it expires
+            finally:
+                imdb_movie_crawler.CRAWL_LEASE = real_lease
+
+            # b has the lease now and its refresh timer fires, but a's catalog is younger than
+            # the interval: no second crawl of the fleet
+            assert b.refresh(interval=3600) == []
+        finally:
+            imdb_movie_crawler.CACHE_FILE, imdb_movie_crawler.history = saved
+    print("✓ PASSED\n")
+
+def test_followers_hand_off_details():
+    """a worker that doesn't crawl hands detail fetches to the one that does and reads the result back"""
+    print("\nTEST: follower hands detail fetches to the crawler ...")
+    saved = imdb_movie_crawler.CACHE_FILE, imdb_movie_crawler.history
+    backend = RedisBackend(FakeRedis())
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            imdb_movie_crawler.CACHE_FILE = os.path.join(tmp, "movies_cache.json")
+            imdb_movie_crawler.history = HistoryStore(os.path.join(tmp, "history.db"))
+            crawler, follower = IMDbMovieCrawler(), IMDbMovieCrawler()
+            crawler.shared, follower.shared = SharedCatalog(backend, "t"), SharedCatalog(backend, "t")
+            imdb = []
+            crawler.fetch_page = lambda url: imdb.append(url) or (CHART_PAGE if url == CHARTS["top"] else TITLE_PAGE)
+            def no_imdb(url):
+                raise AssertionError(f"the follower went to IMDb for {url}")
+            follower.fetch_page = no_imdb
+            follower.crawls_details = False
+            assert crawler.fetch_top_movies()
+            crawler.shared.flush()
+            assert follower.load_shared()
+
+            # the grid's prefetch is only handed over, nobody waits on it
+            assert follower.request_details(follower.movies[1], VISIBLE).result(timeout=0.1) is follower.movies[1]
+            pending = follower.request_details(follower.movies[0], INTERACTIVE)
+            deadline = time.time() + 5
+            while not pending.done() and time.time() < deadline:
+                crawler.serve_hand_offs()   # wsgi.py's crawler worker does this every HAND_OFF_POLL
+                time.sleep(0.05)
+            movie = pending.result(timeout=0)
+            assert movie["details_fetched"] and movie["genres"] == ["Drama"]
+            assert follower.movies_dict["tt0111161"]["details_fetched"] and "tt0111161" in follower.detail_docs
+            print(f"  IMDb requests: {len(imdb)}, all from the crawler")
+        finally:
+            imdb_movie_crawler.CACHE_FILE, imdb_movie_crawler.history = saved
+    print("✓ PASSED\n")
+
+if __name__ == "__main__":
+    try:
+        test_backends()
+        test_fleet_shares_one_crawl()
+        test_followers_hand_off_details()
+    except KeyboardInterrupt:
+        print("\n\n✓ Test interrupted by user.\n")
+    except Exception as e:
+        print(f"\n✗ Test failed: {e}\n")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,79 @@
+import heapq
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from change_feed import chart_ranks
+
+HALF_LIFE = 3 * 86400      # a climb counts half as much after three days
+RANK_WEIGHT = 1.0          # per chart place gained
+RATING_WEIGHT = 20.0       # per rating point gained, 0.1 ≈ two chart places
+NEW_ENTRY_BOOST = 10.0     # just entered the chart
+
+
+def snapshot(movies: List[dict]) -> Dict[str, Tuple[int, float]]:
+    """id → (chart rank, rating) for one crawl."""
+    ranks = chart_ranks(movies)
+    out = {}
+    for m in movies:
+        if not m.get("id"):
+            continue
+        try:
+            rating = float(m.get("rating"))
+        except (TypeError, ValueError):
+            rating = None
+        out[m["id"]] = (ranks[m["id"]], rating)
+    return out
+
+
+class TrendingScores:
+    """Decayed rank / rating velocity per title, updated once per completed crawl.
+
+    Each crawl adds the places climbed and rating gained since the previous
+    crawl to an exponentially decaying score, then the top-k list is rebuilt,
+    so /movies/trending never sorts the catalog itself.
+    """
+
+    def __init__(self, k: int = 50, half_life: float = HALF_LIFE):
+        self.k = k
+        self.half_life = half_life
+        self.scores: Dict[str, float] = {}
+        self.top: List[Tuple[str, float]] = []
+        self.last: Optional[Dict[str, Tuple[int, float]]] = None
+        self.last_ts: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def update(self, snap: Dict[str, Tuple[int, float]], ts: Optional[float] = None):
+        """Fold one crawl into the scores."""
+        ts = ts if ts is not None else time.time()
+        with self._lock:
+            if self.last is None:
+                # first crawl seen: nothing to compare against yet
+                self.last, self.last_ts = snap, ts
+                return
+
+            decay = 0.5 ** (max(0.0, ts - self.last_ts) / self.half_life)
+            scores = {}
+            for movie_id, (rank, rating) in snap.items():
+                score = self.scores.get(movie_id, 0.0) * decay
+                prev = self.last.get(movie_id)
+                if prev is None:
+                    score += NEW_ENTRY_BOOST
+                else:
+                    score += RANK_WEIGHT * (prev[0] - rank)
+                    if rating is not None and prev[1] is not None:
+                        score += RATING_WEIGHT * (rating - prev[1])
+                scores[movie_id] = score   # titles that left the chart are dropped
+
+            self.scores = scores
+            self.last, self.last_ts = snap, ts
+            self.top = heapq.nlargest(self.k, ((i, s) for i, s in scores.items() if s > 0),
+                                      key=lambda x: x[1])
+
+    def replay(self, crawls: Iterable[Tuple[int, Dict[str, Tuple[int, float]]]]):
+        """Rebuild from stored (ts, snapshot) crawls, oldest first, e.g. after a restart."""
+        for ts, snap in crawls:
+            self.update(snap, ts)
+
+    def trending(self, limit: int = 10) -> List[Tuple[str, float]]:
+        return self.top[:limit]
@@ -0,0 +1,135 @@
+"""
+Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+
+The dataset is loaded once here, in the gunicorn master (preload_app), and the
+workers are forked from it, so every worker starts with the same movies, indexes
+and pre-rendered docs as copy-on-write pages instead of crawling on its own.
+The master only loads that snapshot: it starts no thread (a thread doesn't survive
+the fork, and one holding a lock at that moment leaves it locked in every worker),
+so the detail warm-up, the crawl scheduler and the write-behind start after the fork.
+
+Only one worker at a time holds the crawl lock: that one warms the details,
+re-crawls IMDb every REFRESH_INTERVAL seconds and saves movies_cache.json. The
+others never go to IMDb and never write the file: a title they need details for
+is handed to the crawler worker through the shared cache (SHARED_CACHE, or a
+host-local movies_cache.json.shared.db), and a detail page waits for the record to
+show up there. They watch the file and load the new dataset when its checksum
+changes (details they read on demand are kept until the file has them). With
+SHARED_CACHE set, the lock holder also picks up catalogs other hosts pushed and
+writes them to the file. It is also the only one appending to the change log,
+a table in history.db that /movies/changes reads in every worker.
+
+The pages are only shared until a worker's first reload, which comes as soon as
+the crawler worker writes the file (every CACHE_WRITE_BEHIND seconds while details
+arrive): from then on every worker rebuilds the indexes and holds a Dataset of its
+own, about 4.5 MB for the 150-title Top chart (tracemalloc, records plus indexes).
+Budget that per worker, not once; the readme says so too.
+"""
+import fcntl
+import gc
+import os
+import threading
+import time
+
+from imdb_movie_crawler import CACHE_FILE, CACHE_VERSION
+from image_cache import images
+from main import app, get_crawler, warm_details, CACHE_WRITE_BEHIND, REFRESH_INTERVAL
+from shared_cache import SQLiteBackend, SharedCatalog
+
+LOCK_FILE = CACHE_FILE + ".lock"
+SYNC_POLL = 10  # seconds between cache-file checks in follower workers
+HAND_OFF_POLL = 0.2  # seconds between the crawler worker's looks at the detail fetches followers handed it
+
+crawler = get_crawler(background=False)
+if crawler.shared is None:
+    # no SHARED_CACHE: the workers of this host still need one to hand detail fetches to the crawler worker
+    crawler.shared = SharedCatalog(SQLiteBackend(CACHE_FILE + ".shared.db"), CACHE_VERSION)
+crawler.crawls_details = False   # every worker starts as a follower, become_crawler() turns it on
+# objects created so far are never collected, so the gc doesn't write to (and copy) shared pages
+gc.freeze()
+
+
+def cache_mtime() -> float:
+    try:
+        return os.stat(CACHE_FILE).st_mtime
+    except OSError:
+        return 0.0
+
+
+def try_crawl_lock():
+    """Non-blocking exclusive lock; the open file is the lock, it is released when the worker exits."""
+    f = open(LOCK_FILE, "a")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return f
+    except OSError:
+        f.close()
+        return None
+
+
+def become_crawler():
+    """Everything the master didn't start: details the preload doesn't have, image prefetch,
+    and the write-behind of movies_cache.json and the change log, which only this worker writes.
+    """
+    print(f"Worker {os.getpid()} is the crawler")
+    crawler.cache_flush_interval = CACHE_WRITE_BEHIND or None
+    crawler.change_log.writer = True   # the other workers diff the same reloads, only we log them
+    crawler.crawls_details = True
+    crawler.images = images   # the crawler publishes, it keeps the image cache warm
+    images.prefetch_later(crawler.movies)
+    threading.Thread(target=warm_details, args=(crawler,), daemon=True).start()
+    threading.Thread(target=serve_hand_offs_forever, daemon=True).start()
+
+
+def serve_hand_offs_forever(poll: float = HAND_OFF_POLL):
+    while True:
+        try:
+            crawler.serve_hand_offs()
+        except Exception as e:
+            print(f"Reading handed-off detail fetches failed: {e}")
+        time.sleep(poll)
+
+
+def sync_forever(poll: int = SYNC_POLL):
+    seen = cache_mtime()
+    next_refresh = time.time() + REFRESH_INTERVAL
+    lock = try_crawl_lock()   # the first worker up takes it right away
+    if lock is not None:
+        become_crawler()
+    while True:
+        time.sleep(poll)
+        if lock is None:
+            # the previous crawler worker died or was recycled: take over
+            lock = try_crawl_lock()
+            if lock is not None:
+                become_crawler()
+
+        if lock is not None and crawler.shared is not None:
+            try:
+                crawler.sync_shared()
+            except Exception as e:
+                print(f"Shared cache sync failed: {e}")
+
+        if lock is not None and REFRESH_INTERVAL > 0 and time.time() >= next_refresh:
+            try:
+                crawler.refresh(interval=REFRESH_INTERVAL)
+            except Exception as e:
+                print(f"Refresh failed: {e}")
+            next_refresh = time.time() + REFRESH_INTERVAL
+
+        # mtime is the cheap check, the checksum tells our own writes (nothing to reload) from
+        # those of the crawler worker or a crawl.py run
+        mtime = cache_mtime()
+        if mtime != seen:
+            before = crawler.cache_checksum
+            events = crawler.reload_from_cache()
+            if events is not None:
+                # an unreadable file returns None, `seen` stays put and we retry next poll
+                seen = mtime
+                if crawler.cache_checksum != before:
+                    print(f"Worker {os.getpid()} reloaded {len(crawler.movies)} movies, {len(events)} changes")
+
+
+def start_worker_sync():
+    """Called from gunicorn's post_fork hook, threads must not be started before the fork."""
+    threading.Thread(target=sync_forever, daemon=True).start()